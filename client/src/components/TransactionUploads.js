@@ -2,6 +2,57 @@ import React, { useState, useRef } from 'react';
 import FileManager from './FileManager';
 import { authenticatedFetch } from '../utils/api';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_MAX_INTERVAL_MS = 5000;
+const JOB_TIMEOUT_MS = 30 * 60 * 1000;
+// Consecutive failed polls (network errors, 429, 5xx) tolerated before giving up
+const JOB_MAX_POLL_ERRORS = 5;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const isTransientStatus = (status) => status === 429 || status >= 500;
+
+const describeProgress = (job) => {
+  if (job.status === 'queued') return 'waiting to be processed...';
+  if (job.stage === 'transform' && job.llm_batches_total > 0) {
+    return `categorizing (${job.llm_batches_done}/${job.llm_batches_total} batches)...`;
+  }
+  if (job.stage === 'load') return `importing ${job.rows_read} transactions...`;
+  return `processing (${job.rows_read} rows read)...`;
+};
+
+const waitForJob = async (jobId, onProgress) => {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  let interval = JOB_POLL_INTERVAL_MS;
+  let errors = 0;
+  while (Date.now() < deadline) {
+    let response;
+    try {
+      response = await authenticatedFetch(`http://localhost:8000/jobs/${jobId}`);
+    } catch (err) {
+      // Network error: the server may be restarting
+      response = null;
+      if (++errors >= JOB_MAX_POLL_ERRORS) throw err;
+    }
+    if (response && !response.ok) {
+      if (!isTransientStatus(response.status) || ++errors >= JOB_MAX_POLL_ERRORS) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+      }
+    } else if (response) {
+      errors = 0;
+      const job = await response.json();
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      onProgress(job);
+    }
+    // Back off gradually (and after errors) so long jobs don't poll every second
+    await sleep(interval);
+    interval = Math.min(interval * 1.5, JOB_POLL_MAX_INTERVAL_MS);
+  }
+  throw new Error('Still processing after 30 minutes; check back later');
+};
+
 const TransactionUploads = ({ onReprocess }) => {
   const [creditCsvFile, setCreditCsvFile] = useState(null);
   const [debitCsvFile, setDebitCsvFile] = useState(null);
@@ -41,19 +92,23 @@ const TransactionUploads = ({ onReprocess }) => {
         throw new Error(errorData.error || `HTTP ${response.status}: ${response.statusText}`);
       }
 
-      const data = await response.json();
-      if (data.message) {
-        setUploadStatus(`${type === 'credit' ? 'Credit' : 'Debit'} upload successful! Processing...`);
-        if (type === 'credit') setCreditCsvFile(null);
-        if (type === 'debit') setDebitCsvFile(null);
-
-        // Wait a moment for ETL to process
-        setTimeout(() => {
-          setUploadStatus(`${type === 'credit' ? 'Credit' : 'Debit'} upload and processing complete!`);
-          if (onReprocess) {
-            onReprocess();
-          }
-        }, 3000);
+      const { job } = await response.json();
+      const label = type === 'credit' ? 'Credit' : 'Debit';
+      setUploadStatus(`${label} upload successful! Processing...`);
+      if (type === 'credit') setCreditCsvFile(null);
+      if (type === 'debit') setDebitCsvFile(null);
+
+      // The server processes the file in the background; poll the job until it finishes
+      const finished = await waitForJob(job.id, (progress) => {
+        setUploadStatus(`${label} upload: ${describeProgress(progress)}`);
+      });
+      if (finished.status === 'succeeded') {
+        setUploadStatus(`${label} upload and processing complete! ${finished.result?.message || ''}`);
+        if (onReprocess) {
+          onReprocess();
+        }
+      } else {
+        throw new Error(finished.error || 'Processing failed');
       }
     } catch (err) {
       console.error('Upload error:', err);
@@ -1,19 +1,32 @@
 """
 Main Flask application for FinSight.
 """
-from flask import Flask, request, jsonify
+import hashlib
+
+from flask import Flask, Response, request, jsonify, make_response, g, stream_with_context
 from flask_cors import CORS
 
-from config import API_HOST, API_PORT, DEBUG
-from services import TransactionService, UploadService, PipelineService, RuleService, ChatService
-from utils import transactions_to_json
+from config import API_HOST, API_PORT, DEBUG, TRANSACTIONS_MAX_LIMIT, TRANSACTIONS_PAGE_SIZE
+from services import (
+    TransactionService, UploadService, PipelineService, RuleService, RecategorizationService, ChatService,
+    SyncService, JobService
+)
+from services.sync_service import decode_watermark
+from services.job_service import JobQueueFull
+from utils import transactions_to_json, json_response, REGISTRY
+from utils.export import EXPORT_FORMATS, format_available, ndjson_chunks, csv_chunks, parquet_chunks
 from services.supabase_service import require_auth
+from models.rule import Rule
+from models.transaction import FIELD_COLUMNS
+from models.transaction_query import TransactionQuery
 
 
 def create_app():
     """Create and configure the Flask application."""
     app = Flask(__name__)
-    CORS(app)
+    # ETag is exposed so the frontend can send it back as If-None-Match;
+    # Location points 202 upload responses at their job
+    CORS(app, expose_headers=['ETag', 'Location'])
     
     # Initialize services
     # Note: Services are context-unaware until methods are called, so this is fine.
@@ -21,18 +34,49 @@ def create_app():
     transaction_service = TransactionService()
     upload_service = UploadService()
     pipeline_service = PipelineService()
-    rule_service = RuleService()
+    job_service = JobService(app, upload_service.pipeline_service)
+    recategorization_service = RecategorizationService()
+    # Rule edits recategorize the stored transactions they can affect, in a background job
+    rule_service = RuleService(
+        on_change=lambda old_rule, new_rule: recategorization_service.queue_rule_change(old_rule, new_rule, job_service)
+    )
     chat_service = ChatService()
+    sync_service = SyncService()
+    
+    def versioned(resource, build):
+        """
+        Serve build() with an ETag from the user's version counter for `resource`
+        (plus the query string), answering a matching If-None-Match with a 304.
+        The version is read before building, so a concurrent write can only make
+        the ETag stale (forcing a refetch), never newer than the body.
+        """
+        versions = sync_service.get_versions()
+        if versions is None:
+            return build()
+        
+        scope = hashlib.sha1(f"{g.user.id}?{request.query_string.decode('utf-8', 'replace')}".encode('utf-8'))
+        etag = f"{resource}-{versions[resource]}-{scope.hexdigest()[:16]}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(build())
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     @app.route('/rules', methods=['GET'])
     @require_auth
     def get_rules():
         """Get all rules and metadata."""
-        data = rule_service.get_data()
-        return jsonify({
-            'rules': [r.to_dict() for r in data['rules']],
-            'last_reprocessed': data['metadata'].get('last_reprocessed')
-        })
+        def build():
+            data = rule_service.get_data()
+            return jsonify({
+                'rules': [r.to_dict() for r in data['rules']],
+                'last_reprocessed': data['metadata'].get('last_reprocessed')
+            })
+        return versioned('rules', build)
 
     @app.route('/rules', methods=['POST'])
     @require_auth
@@ -41,10 +85,16 @@ def create_app():
         data = request.json
         if not data or 'content' not in data:
             return jsonify({'error': 'Rule content is required'}), 400
+        
+        try:
+            conditions = Rule.parse_conditions(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
         rule = rule_service.add_rule(
             data['content'], 
-            data.get('type', 'both')
+            data.get('type', 'both'),
+            conditions
         )
         return jsonify(rule.to_dict()), 201
         
@@ -55,11 +105,17 @@ def create_app():
         data = request.json
         if not data or 'content' not in data:
              return jsonify({'error': 'Rule content is required'}), 400
+        
+        try:
+            conditions = Rule.parse_conditions(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
              
         rule = rule_service.update_rule(
             rule_id, 
             data['content'],
-            data.get('type', 'both')
+            data.get('type', 'both'),
+            conditions
         )
         
         if rule:
@@ -95,6 +151,11 @@ def create_app():
             print(f"Error in chat endpoint: {e}")
             return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics (pipeline stages, LLM batches, Supabase requests)."""
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/health', methods=['GET'])
     def health_check():
         """Health check endpoint."""
@@ -103,7 +164,10 @@ def create_app():
     @app.route('/upload-csv', methods=['POST'])
     @require_auth
     def upload_csv():
-        """Handle CSV file uploads and trigger ETL processing."""
+        """
+        Accept a CSV upload and queue it for ETL processing.
+        Returns 202 with the job; poll GET /jobs/<id> (also in the Location header).
+        """
         try:
             # Get file and upload type from request
             if 'file' not in request.files:
@@ -115,21 +179,78 @@ def create_app():
             if not upload_type:
                 return jsonify({'error': 'Upload type is required'}), 400
             
-            # Upload and process file
-            success, message, data = upload_service.upload_file(file, upload_type)
-            
-            if success:
-                return jsonify({
-                    'message': message,
-                    **data
-                })
-            else:
+            success, message, job = upload_service.queue_file(file, upload_type, job_service)
+            if not success:
                 return jsonify({'error': message}), 400
-                
+            
+            response = jsonify({'message': message, 'job': job})
+            response.status_code = 202
+            response.headers['Location'] = f"/jobs/{job['id']}"
+            return response
+        
+        except JobQueueFull as e:
+            response = jsonify({'error': str(e)})
+            response.status_code = 503
+            response.headers['Retry-After'] = '30'
+            return response
         except Exception as e:
             return jsonify({'error': f'Server error: {str(e)}'}), 500
     
-        return jsonify({'status': 'healthy', 'service': 'FinSight API'})
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    @require_auth
+    def get_job(job_id):
+        """Status, stage and progress counters of an upload job; 'result' once it has finished."""
+        try:
+            job = job_service.get_job(job_id)
+            if job is None:
+                return jsonify({'error': 'Job not found'}), 404
+            return jsonify(job)
+        except Exception as e:
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
+    
+    @app.route('/jobs', methods=['GET'])
+    @require_auth
+    def list_jobs():
+        """The current user's recent upload jobs, newest first (?limit=, default 20)."""
+        try:
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+            return jsonify({'jobs': job_service.list_jobs(limit)})
+        except Exception as e:
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
+    
+    @app.route('/upload-batch', methods=['POST'])
+    @require_auth
+    def upload_batch():
+        """
+        Upload many statements at once: any number of 'files' parts, each a CSV
+        or a .zip/.gz archive of CSVs, plus the upload 'type'. All files are
+        queued as one batch job; returns 202 with the job like /upload-csv.
+        """
+        try:
+            files = request.files.getlist('files') + request.files.getlist('file')
+            if not files:
+                return jsonify({'error': 'No files provided'}), 400
+            
+            upload_type = request.form.get('type')
+            if not upload_type:
+                return jsonify({'error': 'Upload type is required'}), 400
+            
+            success, message, job = upload_service.queue_batch(files, upload_type, job_service)
+            if not success:
+                return jsonify({'error': message}), 400
+            
+            response = jsonify({'message': message, 'job': job})
+            response.status_code = 202
+            response.headers['Location'] = f"/jobs/{job['id']}"
+            return response
+        
+        except JobQueueFull as e:
+            response = jsonify({'error': str(e)})
+            response.status_code = 503
+            response.headers['Retry-After'] = '30'
+            return response
+        except Exception as e:
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
     
     @app.route('/upload/<upload_type>', methods=['POST'])
     def upload_file(upload_type):
@@ -198,18 +319,98 @@ def create_app():
     @app.route('/transactions', methods=['GET'])
     @require_auth
     def get_transactions():
-        """Get all transactions."""
-        transactions = transaction_service.get_all_transactions()
-        # Convert to dict
-        return jsonify({'transactions': [t.to_dict() for t in transactions]})
+        """
+        Get transactions, newest first.
+        Optional query args: start_date, end_date, category (comma-separated),
+        min_amount, max_amount, fields (comma-separated), limit and cursor.
+        With limit, the response includes next_cursor for the following page.
+        Supports If-None-Match (304 when nothing changed).
+        """
+        try:
+            query = TransactionQuery.from_args(request.args, TRANSACTIONS_MAX_LIMIT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def build():
+            result = transaction_service.query_transactions(query)
+            response = {'transactions': result['transactions']}
+            if query.limit:
+                response['next_cursor'] = result['next_cursor']
+            return json_response(response)
+        return versioned('transactions', build)
+    
+    @app.route('/transactions/export', methods=['GET'])
+    @require_auth
+    def export_transactions():
+        """
+        Stream every transaction as ?format=ndjson (default), csv or parquet.
+        Accepts the same filters and fields as GET /transactions (limit and
+        cursor are ignored). Rows are read and written one page at a time.
+        """
+        fmt = request.args.get('format', 'ndjson').lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        if not format_available(fmt):
+            return jsonify({'error': f'{fmt} export is not available on this server'}), 400
+        try:
+            query = TransactionQuery.from_args(request.args, TRANSACTIONS_MAX_LIMIT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        fields = query.fields or list(FIELD_COLUMNS)
+        pages = transaction_service.iter_transaction_pages(query)
+        if fmt == 'ndjson':
+            chunks = ndjson_chunks(pages)
+        elif fmt == 'csv':
+            chunks = csv_chunks(pages, fields)
+        else:
+            chunks = parquet_chunks(pages, fields)
+        
+        def generate():
+            try:
+                yield from chunks
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated body
+                print(f"Error streaming transaction export: {e}")
+        
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="transactions.{extension}"'
+        return response
+    
+    @app.route('/transactions/changes', methods=['GET'])
+    @require_auth
+    def get_transaction_changes():
+        """
+        Transactions inserted, updated or deleted since ?since=<watermark>
+        (omit it for a full sync). Returns inserted, updated, deleted (ids),
+        watermark and has_more; call again with the new watermark until
+        has_more is false.
+        """
+        try:
+            since = decode_watermark(request.args.get('since'))
+            limit = request.args.get('limit') or str(TRANSACTIONS_PAGE_SIZE)
+            if not limit.isdigit():
+                raise ValueError("limit must be an integer")
+            limit = min(int(limit), TRANSACTIONS_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            return json_response(sync_service.get_changes(since, limit))
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 501
+        except Exception as e:
+            return jsonify({'error': f'Server error: {str(e)}'}), 500
     
     @app.route('/categories', methods=['GET'])
     @require_auth
     def get_categories():
         """Get all available categories."""
         try:
-            categories = transaction_service.get_categories()
-            return jsonify(categories)
+            return versioned('categories', lambda: jsonify(transaction_service.get_categories()))
         except Exception as e:
             return jsonify({'error': f'Server error: {str(e)}'}), 500
 
@@ -252,9 +453,45 @@ def create_app():
     @app.route('/stats', methods=['GET'])
     @require_auth
     def get_stats():
-        """Get transaction statistics."""
-        stats = transaction_service.get_transaction_stats()
-        return jsonify(stats)
+        """
+        Get transaction statistics: totals, credit/debit counts, by_category and
+        by_month sums. Optional query args: start_date, end_date (ISO dates).
+        """
+        try:
+            query = TransactionQuery.from_args(
+                {k: request.args.get(k) for k in ('start_date', 'end_date')}, TRANSACTIONS_MAX_LIMIT
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        stats = transaction_service.get_transaction_stats(query.start_date, query.end_date)
+        return json_response(stats)
+
+    @app.route('/stats/monthly', methods=['GET'])
+    @require_auth
+    def get_monthly_stats():
+        """
+        Per (month, category) totals with credit/debit splits and min/max amounts.
+        Optional query args: start_date, end_date (ISO dates).
+        """
+        try:
+            query = TransactionQuery.from_args(
+                {k: request.args.get(k) for k in ('start_date', 'end_date')}, TRANSACTIONS_MAX_LIMIT
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        groups = transaction_service.get_monthly_rollup(query.start_date, query.end_date)
+        return json_response({'groups': groups})
+    
+    @app.route('/stats/rebuild', methods=['POST'])
+    @require_auth
+    def rebuild_stats():
+        """Recompute the current user's rollups from their transactions."""
+        result = transaction_service.rollup_service.rebuild()
+        if result is None:
+            return jsonify({'error': 'Failed to rebuild rollups'}), 500
+        return jsonify({'message': 'Rollups rebuilt', 'groups': result}), 200
     
     @app.route('/transactions/<transaction_id>', methods=['PATCH'])
     @require_auth
@@ -336,17 +573,26 @@ def create_app():
                 return jsonify({'error': 'No valid updates provided'}), 400
             
             # Use pipeline_service for bulk updates
-            success_count = pipeline_service.bulk_update_transactions(validated_updates)
+            result = pipeline_service.bulk_update_transactions(validated_updates)
+            updated = len(result['updated'])
+            body = {
+                'updated': result['updated'],
+                'not_found': result['not_found'],
+                'failed': result['failed']
+            }
             
-            if success_count > 0:
-                return jsonify({'message': f'{success_count} transactions updated successfully'}), 200
-            else:
-                # Fallback
-                success = transaction_service.bulk_update_transactions(updates)
-                if success:
-                    return jsonify({'message': 'Transactions updated successfully'}), 200
-                else:
-                    return jsonify({'error': 'Failed to update transactions'}), 500
+            if not result['failed'] and not result['not_found']:
+                return jsonify({'message': f'{updated} transactions updated successfully', **body}), 200
+            if updated:
+                # Partial success: report which ids didn't go through
+                return jsonify({
+                    'message': f"{updated} transactions updated, "
+                               f"{len(result['failed']) + len(result['not_found'])} not updated",
+                    **body
+                }), 207
+            if result['failed']:
+                return jsonify({'error': 'Failed to update transactions', **body}), 500
+            return jsonify({'error': 'Transactions not found', **body}), 404
                 
         except Exception as e:
             print(f"Error in bulk_update_transactions: {e}")
@@ -3,6 +3,10 @@ Configuration management for the FinSight Flask application.
 """
 import os
 from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables before any setting below reads them
+load_dotenv()
 
 # Base directory
 BASE_DIR = Path(__file__).parent
@@ -41,6 +45,89 @@ API_HOST = '0.0.0.0'
 API_PORT = 8000
 DEBUG = True
 
+# LLM categorization
+# Backend: 'gemini', 'fake' (offline, deterministic), 'record' or 'replay' (see etl/categorizer_backends.py)
+CATEGORIZER_BACKEND = os.getenv('CATEGORIZER_BACKEND', 'gemini')
+RECORDINGS_DIR = DATA_DIR / "recordings"
+FAKE_BACKEND_LATENCY_SECONDS = float(os.getenv('FAKE_BACKEND_LATENCY_SECONDS', 0.0))
+FAKE_BACKEND_ERROR_RATE = float(os.getenv('FAKE_BACKEND_ERROR_RATE', 0.0))
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', 1.0))
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', 4000))  # Estimated row tokens per request
+LLM_BATCH_MAX_ROWS = int(os.getenv('LLM_BATCH_MAX_ROWS', 150))
+
+# Categorization cache (skips the LLM for transactions we've already categorized)
+CATEGORIZATION_CACHE_FILE = GOLD_DIR / "categorization_cache.json"
+CATEGORIZATION_CACHE_MAX_ENTRIES = int(os.getenv('CATEGORIZATION_CACHE_MAX_ENTRIES', 50000))
+CATEGORIZATION_CACHE_TTL_DAYS = int(os.getenv('CATEGORIZATION_CACHE_TTL_DAYS', 90))
+
+# History categorizer (kNN over the user's own labeled transactions, tried before the LLM)
+HISTORY_MIN_CONFIDENCE = float(os.getenv('HISTORY_MIN_CONFIDENCE', 0.75))
+HISTORY_NEIGHBORS = int(os.getenv('HISTORY_NEIGHBORS', 5))
+HISTORY_MODEL_TTL_SECONDS = int(os.getenv('HISTORY_MODEL_TTL_SECONDS', 6 * 3600))
+HISTORY_MAX_USERS = int(os.getenv('HISTORY_MAX_USERS', 32))
+
+# Rows re-run through the categorizer per batch when a rule change is applied to stored data
+RECATEGORIZE_BATCH_SIZE = int(os.getenv('RECATEGORIZE_BATCH_SIZE', 500))
+
+# Auth: Supabase access tokens are verified locally when possible
+# (HS256 with the project's JWT secret, or RS256/ES256 via the JWKS endpoint),
+# falling back to a remote get_user call.
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWKS_URL = os.getenv('SUPABASE_JWKS_URL') or (
+    f"{os.getenv('SUPABASE_URL').rstrip('/')}/auth/v1/.well-known/jwks.json" if os.getenv('SUPABASE_URL') else None
+)
+SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+AUTH_CACHE_TTL_SECONDS = int(os.getenv('AUTH_CACHE_TTL_SECONDS', 300))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 1024))
+
+# Pool of per-token Supabase clients (reused until the token expires; LRU-evicted beyond the size)
+SUPABASE_CLIENT_POOL_SIZE = int(os.getenv('SUPABASE_CLIENT_POOL_SIZE', 64))
+SUPABASE_CLIENT_TTL_SECONDS = int(os.getenv('SUPABASE_CLIENT_TTL_SECONDS', 3600))  # When a token has no 'exp'
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv('SUPABASE_HTTP_MAX_CONNECTIONS', 32))
+
+# GET /transactions paging (PostgREST returns at most max-rows, 1000 by default, per request)
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('TRANSACTIONS_PAGE_SIZE', 1000))
+TRANSACTIONS_MAX_LIMIT = int(os.getenv('TRANSACTIONS_MAX_LIMIT', 1000))
+
+# Bulk transaction updates: ids per IN-update request, and parallel requests when
+# falling back to per-row updates (bulk_update_transactions RPC not deployed)
+BULK_UPDATE_CHUNK_SIZE = int(os.getenv('BULK_UPDATE_CHUNK_SIZE', 150))
+BULK_UPDATE_MAX_CONCURRENCY = int(os.getenv('BULK_UPDATE_MAX_CONCURRENCY', 8))
+
+# Import inserts: batches are cut at whichever limit is hit first and sent in parallel
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+IMPORT_BATCH_MAX_BYTES = int(os.getenv('IMPORT_BATCH_MAX_BYTES', 256 * 1024))
+IMPORT_MAX_CONCURRENCY = int(os.getenv('IMPORT_MAX_CONCURRENCY', 4))
+
+# Uploads at least this large are processed as a stream of chunks (constant memory):
+# each chunk is extracted, categorized and imported before the next is needed,
+# with at most PIPELINE_QUEUE_DEPTH chunks read ahead.
+PIPELINE_STREAM_MIN_BYTES = int(os.getenv('PIPELINE_STREAM_MIN_BYTES', 32 * 1024 * 1024))
+PIPELINE_CHUNK_ROWS = int(os.getenv('PIPELINE_CHUNK_ROWS', 50000))
+PIPELINE_QUEUE_DEPTH = int(os.getenv('PIPELINE_QUEUE_DEPTH', 2))
+
+# Batch uploads (many CSVs and/or .zip/.gz archives in one request): limits, and the
+# number of worker processes that extract files in parallel
+BATCH_UPLOAD_MAX_FILES = int(os.getenv('BATCH_UPLOAD_MAX_FILES', 100))
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv('BATCH_UPLOAD_MAX_BYTES', 512 * 1024 * 1024))  # After decompression
+BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', os.cpu_count() or 2))
+
+# Background upload jobs: POST /upload-csv stores the file, answers 202 with a job id and
+# a worker thread runs the pipeline. Jobs are recorded in SQLite so every API process can
+# answer GET /jobs/<id>; the caller's token is only ever held in memory.
+JOBS_DB_FILE = DATA_DIR / "jobs.sqlite3"
+JOBS_UPLOADS_DIR = UPLOADS_DIR / "jobs"
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 50))  # Queued + running jobs per process
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv('JOB_PROGRESS_INTERVAL_SECONDS', 0.5))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+
+# JSON responses at least this large are gzip/brotli-compressed when the client accepts it
+JSON_COMPRESS_MIN_BYTES = int(os.getenv('JSON_COMPRESS_MIN_BYTES', 1024))
+
 # Ensure directories exist
-for directory in [DATA_DIR, BRONZE_DIR, SILVER_DIR, GOLD_DIR, CREDIT_UPLOADS_DIR, DEBIT_UPLOADS_DIR, UPLOADS_DIR]:
+for directory in [DATA_DIR, BRONZE_DIR, SILVER_DIR, GOLD_DIR, CREDIT_UPLOADS_DIR, DEBIT_UPLOADS_DIR, UPLOADS_DIR, JOBS_UPLOADS_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,254 @@
+"""
+Persistent cache of AI categorization results.
+
+Entries are keyed by normalized description, an amount bucket and a
+fingerprint of the user's rules/categories the answer was produced under,
+so a rule change naturally invalidates every entry that depended on it.
+
+Several workers or processes can share the file: save() takes an exclusive
+file lock, merges what is on disk with this instance's changes and replaces
+the file atomically, so concurrent writers don't drop each other's entries.
+Lookups re-read the file when another process has replaced it, so
+long-running workers see each other's results without restarting.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX; saves are then only atomic, not serialized
+    fcntl = None
+
+# Rules mentioning any of these can depend on the transaction date
+# ("first e-transfer of each month"), so the date becomes part of the key.
+DATE_SENSITIVE_PATTERN = re.compile(
+    r'\b(day|days|week|weekly|month|monthly|year|yearly|first|last|date|'
+    r'jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|'
+    r'mon|tue|wed|thu|fri|sat|sun|weekend|weekday)\w*\b',
+    re.IGNORECASE
+)
+
+
+def normalize_description(description: Any) -> str:
+    """Uppercase and collapse whitespace so trivially different strings share a key."""
+    return re.sub(r'\s+', ' ', str(description)).strip().upper()
+
+
+def amount_bucket(amount: float, exact: bool) -> str:
+    """
+    Bucket an amount for cache keys.
+    Exact cents are used when rules may depend on the amount; otherwise the
+    sign and order of magnitude are enough to tell a purchase from a refund.
+    """
+    if exact:
+        return str(int(round(float(amount) * 100)))
+    if amount == 0:
+        return '0'
+    sign = '+' if amount > 0 else '-'
+    return f"{sign}{int(math.log10(abs(amount)))}"
+
+
+def rules_fingerprint(rules: Iterable[Any], categories: Iterable[str], scope: Optional[str] = None) -> str:
+    """Stable hash of the user, rules and categories a categorization was made under."""
+    payload = {
+        'scope': scope,
+        'rules': sorted(f"{r.rule_type}:{r.content}" for r in rules),
+        'categories': sorted(categories),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class CategorizationCache:
+    """LRU + TTL cache of categorization results persisted to a JSON file."""
+
+    def __init__(self, cache_file: Path, max_entries: int = 50000, ttl_days: int = 90):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self._lock = threading.Lock()
+        # Identity of the file version last read or written; checked before lookups
+        self._file_version = self._stat()
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = self._load()
+        self._dirty = False
+        # (scope or None for everything, time) of invalidate() calls not yet saved,
+        # so entries another process wrote before them aren't merged back in
+        self._invalidations: List[Tuple[Optional[str], float]] = []
+
+    @staticmethod
+    def make_key(fingerprint: str, description: str, bucket: str, date: Optional[str] = None) -> str:
+        """Build the cache key for a transaction."""
+        raw = f"{fingerprint}|{description}|{bucket}|{date or ''}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _load(self) -> 'OrderedDict[str, Dict[str, Any]]':
+        if not self.cache_file.exists():
+            return OrderedDict()
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            # Entries are stored oldest-first so the LRU order survives a restart
+            return OrderedDict(data.get('entries', []))
+        except Exception as e:
+            print(f"Error loading categorization cache: {e}")
+            return OrderedDict()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """(inode, mtime) of the cache file; saves replace the file, so either changes."""
+        try:
+            info = os.stat(self.cache_file)
+        except OSError:
+            return None
+        return info.st_ino, info.st_mtime_ns
+
+    def _reload_if_changed(self):
+        """Merge in entries other processes saved since we last read the file. Call under _lock."""
+        version = self._stat()
+        if version is None or version == self._file_version:
+            return
+        self._file_version = version
+        self._entries = self._merge(self._load(), self._entries, self._invalidations)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None on a miss/expired entry."""
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.get('ts', 0) > self.ttl_seconds:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, category: str, renamed: Optional[str] = None, scope: Optional[str] = None):
+        """Store a categorization result, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = {
+                'category': category,
+                'renamed': renamed,
+                'scope': scope,
+                'ts': time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def invalidate(self, scope: Optional[str] = None):
+        """
+        Drop cached entries.
+        With a scope (user id), only that user's entries are dropped, e.g. after
+        one of their rules changed; without one the whole cache is cleared.
+        """
+        with self._lock:
+            self._invalidations.append((scope, time.time()))
+            if scope is None:
+                self._entries.clear()
+            else:
+                stale = [k for k, v in self._entries.items() if v.get('scope') == scope]
+                for k in stale:
+                    del self._entries[k]
+            self._dirty = True
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock shared by every process saving this cache file."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.cache_file.with_name(self.cache_file.name + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge(self, on_disk: 'OrderedDict[str, Dict[str, Any]]', ours: 'OrderedDict[str, Dict[str, Any]]',
+               invalidations: List[Tuple[Optional[str], float]]) -> 'OrderedDict[str, Dict[str, Any]]':
+        """
+        Combine the file's entries with ours: the newer entry wins per key,
+        expired or invalidated disk entries are dropped, then the LRU limit applies.
+        """
+        now = time.time()
+        merged = OrderedDict()
+        for key, entry in on_disk.items():
+            ts = entry.get('ts', 0)
+            if now - ts > self.ttl_seconds:
+                continue
+            if any(scope in (None, entry.get('scope')) and ts <= at for scope, at in invalidations):
+                continue
+            merged[key] = entry
+        for key, entry in ours.items():
+            current = merged.get(key)
+            if current is None or current.get('ts', 0) <= entry.get('ts', 0):
+                merged[key] = entry
+                merged.move_to_end(key)
+        while len(merged) > self.max_entries:
+            merged.popitem(last=False)
+        return merged
+
+    def save(self):
+        """Merge this instance's changes into the cache file (under a file lock, atomically) if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = OrderedDict(self._entries)
+            invalidations = list(self._invalidations)
+            self._dirty = False
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                merged = self._merge(self._load(), entries, invalidations)
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_file.parent, prefix=self.cache_file.name, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump({'entries': list(merged.items())}, f)
+                    os.replace(tmp_path, self.cache_file)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+                version = self._stat()
+            with self._lock:
+                # Applied to the file now; later invalidations stay pending
+                del self._invalidations[:len(invalidations)]
+                # Adopt the merged file (other processes' entries included), keeping
+                # anything put or invalidated here while it was being written
+                self._entries = self._merge(merged, self._entries, self._invalidations)
+                self._file_version = version
+        except Exception as e:
+            print(f"Error saving categorization cache: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_cache: Optional[CategorizationCache] = None
+
+
+def get_categorization_cache() -> CategorizationCache:
+    """Process-wide cache instance configured from config.py."""
+    global _shared_cache
+    if _shared_cache is None:
+        from config import (
+            CATEGORIZATION_CACHE_FILE, CATEGORIZATION_CACHE_MAX_ENTRIES, CATEGORIZATION_CACHE_TTL_DAYS
+        )
+        _shared_cache = CategorizationCache(
+            CATEGORIZATION_CACHE_FILE,
+            max_entries=CATEGORIZATION_CACHE_MAX_ENTRIES,
+            ttl_days=CATEGORIZATION_CACHE_TTL_DAYS
+        )
+    return _shared_cache
@@ -0,0 +1,178 @@
+"""
+Pluggable LLM backends for transaction categorization.
+
+GeminiBackend talks to the real API. FakeBackend and RecordReplayBackend let
+the pipeline be benchmarked and regression-tested with no API key or network.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+from etl.prompt_codec import decode_rows, RESPONSE_HEADER
+
+
+@dataclass
+class BackendResponse:
+    """Text returned by a backend plus token usage, if the backend reports it."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+class CategorizerBackend(ABC):
+    """Base class for categorization backends."""
+
+    name = 'base'
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend can be called (e.g. has credentials)."""
+        return True
+
+    @abstractmethod
+    def generate(self, prompt: str) -> BackendResponse:
+        """Send a prompt and return the response. Raises on errors."""
+        pass
+
+
+class GeminiBackend(CategorizerBackend):
+    """Google Gemini backend. The client is configured on first use, not at import."""
+
+    name = 'gemini'
+
+    def __init__(self, model_name: str, api_key: Optional[str] = None, temperature: float = 0.1):
+        self.model_name = model_name
+        self.api_key = api_key if api_key is not None else os.getenv('GEMINI_API_KEY')
+        self.temperature = temperature
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_model(self):
+        """Lazily configure the SDK and create one model client shared by all threads."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str) -> BackendResponse:
+        # Lower temperature for determinism, but Flash is usually fast
+        response = self._get_model().generate_content(prompt, generation_config={"temperature": self.temperature})
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None and getattr(usage, 'prompt_token_count', None) is not None:
+            return BackendResponse(response.text, usage.prompt_token_count, usage.candidates_token_count or 0)
+        return BackendResponse(response.text)
+
+
+class FakeBackendError(Exception):
+    """Simulated transient API failure (looks like an HTTP 503 to the retry logic)."""
+    code = 503
+
+
+class FakeBackend(CategorizerBackend):
+    """
+    Deterministic offline backend.
+    Each row is assigned a category from a stable hash of its description, after
+    an optional simulated latency; a configurable fraction of calls fail.
+    """
+
+    name = 'fake'
+
+    def __init__(self, categories: List[str], latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.categories = categories or ['Uncategorized']
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _category_for(self, description: str) -> str:
+        digest = hashlib.sha1(description.upper().encode('utf-8')).digest()
+        return self.categories[int.from_bytes(digest[:4], 'big') % len(self.categories)]
+
+    def generate(self, prompt: str) -> BackendResponse:
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeBackendError("Simulated backend failure")
+        rows = decode_rows(prompt)
+        lines = [RESPONSE_HEADER] + [f"{r['id']}|{self._category_for(r['description'])}|" for r in rows]
+        return BackendResponse('\n'.join(lines))
+
+
+class RecordReplayBackend(CategorizerBackend):
+    """
+    Stores responses on disk keyed by a hash of the prompt.
+    In 'record' mode every call goes to the wrapped backend and is saved;
+    in 'replay' mode responses are served from disk only (a missing recording
+    raises LookupError, which is not retried).
+    """
+
+    name = 'record-replay'
+
+    def __init__(self, directory: Path, inner: Optional[CategorizerBackend] = None, mode: str = 'replay'):
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be 'record' or 'replay'")
+        if mode == 'record' and inner is None:
+            raise ValueError("record mode needs a backend to record from")
+        self.directory = Path(directory)
+        self.inner = inner
+        self.mode = mode
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def available(self) -> bool:
+        return self.mode == 'replay' or self.inner.available
+
+    def _path(self, prompt: str) -> Path:
+        return self.directory / f"{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}.json"
+
+    def generate(self, prompt: str) -> BackendResponse:
+        path = self._path(prompt)
+        if self.mode == 'replay':
+            if not path.exists():
+                raise LookupError(f"No recorded response for prompt ({path.name})")
+            with open(path, 'r') as f:
+                return BackendResponse(**json.load(f))
+
+        response = self.inner.generate(prompt)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(response), f)
+        os.replace(tmp_path, path)
+        return response
+
+
+def create_backend(name: Optional[str] = None, categories: Optional[List[str]] = None) -> CategorizerBackend:
+    """
+    Build the backend selected by `name` or CATEGORIZER_BACKEND:
+    'gemini' (default), 'fake', 'record' (Gemini, saving responses) or 'replay'.
+    """
+    from config import (
+        CATEGORIZER_BACKEND, GEMINI_MODEL, FAKE_BACKEND_LATENCY_SECONDS, FAKE_BACKEND_ERROR_RATE,
+        RECORDINGS_DIR
+    )
+    name = (name or CATEGORIZER_BACKEND).lower()
+    if name == 'gemini':
+        return GeminiBackend(GEMINI_MODEL)
+    if name == 'fake':
+        return FakeBackend(categories or [], FAKE_BACKEND_LATENCY_SECONDS, FAKE_BACKEND_ERROR_RATE)
+    if name == 'record':
+        return RecordReplayBackend(RECORDINGS_DIR, GeminiBackend(GEMINI_MODEL), mode='record')
+    if name == 'replay':
+        return RecordReplayBackend(RECORDINGS_DIR, mode='replay')
+    raise ValueError(f"Unknown categorizer backend: {name}")
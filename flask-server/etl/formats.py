@@ -0,0 +1,211 @@
+"""
+Declarative bank statement formats.
+
+Each BankFormat describes one CSV layout: whether it has a header row, which
+columns hold the date, description and amount (or outflow/inflow pair), the
+sign convention and the date format. detect_format() picks the first
+registered format that matches the first few KB of a file, and
+BankFormat.read() parses the file in a single read_csv pass that only
+materializes the needed columns. Supporting a new bank means adding an entry
+to FORMATS.
+
+The output of read() is the extractor contract: 'Transaction Date'
+(datetime64, parsed with the declared format), 'Description', 'Amount', with
+expenses positive for outflow/inflow layouts.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.dates import parse_dates
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 5
+OUTPUT_COLUMNS = ['Transaction Date', 'Description', 'Amount']
+
+
+def _looks_like_date(value: str, date_format: Optional[str]) -> bool:
+    value = value.strip()
+    if not value:
+        return False
+    if date_format:
+        try:
+            datetime.strptime(value, date_format)
+            return True
+        except ValueError:
+            pass
+    return not pd.isna(pd.to_datetime(value, errors='coerce'))
+
+
+@dataclass(frozen=True)
+class BankFormat:
+    """
+    One CSV layout.
+    Headerless formats name every column in `columns`; header formats list
+    the accepted header names for each role (the first one present wins).
+    Amount is `amount` * sign, or (`outflow` - `inflow`) * sign.
+    """
+    name: str
+    has_header: bool = True
+    columns: Tuple[str, ...] = ()  # headerless: names for every column, in order
+    date: Tuple[str, ...] = ('Transaction Date',)
+    description: Tuple[str, ...] = ('Description',)
+    amount: Tuple[str, ...] = ('Amount',)
+    outflow: Tuple[str, ...] = ()
+    inflow: Tuple[str, ...] = ()
+    required: Tuple[str, ...] = ()  # header names that must all be present to match
+    sign: int = 1
+    date_format: Optional[str] = None  # strptime format; None = common formats, then inference
+    upload_types: Tuple[str, ...] = ('credit', 'debit')
+    read_options: Dict[str, object] = field(default_factory=dict)
+
+    @staticmethod
+    def _pick(candidates: Sequence[str], header: Sequence[str]) -> Optional[str]:
+        return next((name for name in candidates if name in header), None)
+
+    def resolve(self, header: Sequence[str]) -> Optional[Dict[str, str]]:
+        """Map roles (date, description, amount / outflow, inflow) to column names, or None if they can't all be found."""
+        roles = {'date': self.date, 'description': self.description}
+        if self.outflow:
+            roles.update(outflow=self.outflow, inflow=self.inflow)
+        else:
+            roles['amount'] = self.amount
+        resolved = {role: self._pick(candidates, header) for role, candidates in roles.items()}
+        return None if None in resolved.values() else resolved
+
+    def matches(self, rows: List[List[str]], upload_type: Optional[str] = None) -> bool:
+        """Whether the first rows of a file look like this format."""
+        if not rows or (upload_type and upload_type not in self.upload_types):
+            return False
+        first = [cell.strip() for cell in rows[0]]
+        if self.has_header:
+            return all(name in first for name in self.required) and self.resolve(first) is not None
+        # Headerless: same width as the layout, and the date column holds a date
+        if len(first) != len(self.columns) or any(name in first for name in OUTPUT_COLUMNS):
+            return False
+        date_index = self.columns.index(self.date[0])
+        return _looks_like_date(first[date_index], self.date_format)
+
+    def _read_plan(self, header: Sequence[str]) -> Tuple[Dict[str, str], Dict[str, object]]:
+        """Column roles and read_csv options for a file whose first row is `header`."""
+        # Stripped name -> name as pandas will see it (skipinitialspace drops leading blanks)
+        names = {h.strip(): h.lstrip() for h in (header if self.has_header else self.columns)}
+        roles = self.resolve(list(names))
+        if roles is None:
+            raise ValueError(f"{self.name}: file does not have the expected columns")
+        roles = {role: names[name] for role, name in roles.items()}
+
+        options = dict(
+            usecols=list(dict.fromkeys(roles.values())),
+            dtype={roles['date']: str, roles['description']: str},
+            skipinitialspace=True,
+        )
+        if not self.has_header:
+            options.update(header=None, names=list(self.columns))
+        options.update(self.read_options)
+        return roles, options
+
+    def _standardize(self, df: pd.DataFrame, roles: Dict[str, str]) -> pd.DataFrame:
+        if self.outflow:
+            amount = (pd.to_numeric(df[roles['outflow']], errors='coerce').fillna(0)
+                      - pd.to_numeric(df[roles['inflow']], errors='coerce').fillna(0))
+        else:
+            amount = df[roles['amount']]
+        if self.sign != 1:
+            amount = pd.to_numeric(amount, errors='coerce') * self.sign
+
+        return pd.DataFrame({
+            'Transaction Date': parse_dates(df[roles['date']], self.date_format),
+            'Description': df[roles['description']],
+            'Amount': amount,
+        })
+
+    def read(self, file_path: Path, header: Sequence[str] = ()) -> pd.DataFrame:
+        """Parse the whole file once and return the standard columns."""
+        roles, options = self._read_plan(header)
+        return self._standardize(pd.read_csv(file_path, **options), roles)
+
+    def read_chunks(self, file_path: Path, header: Sequence[str] = (),
+                    chunk_rows: int = 50000) -> Iterator[pd.DataFrame]:
+        """Like read(), but yield the standard columns `chunk_rows` rows at a time."""
+        roles, options = self._read_plan(header)
+        with pd.read_csv(file_path, chunksize=chunk_rows, **options) as reader:
+            for chunk in reader:
+                yield self._standardize(chunk, roles)
+
+
+# Checked in order; the first match wins, so more specific layouts go first.
+FORMATS: List[BankFormat] = [
+    # TD Canada Trust: no header; date, description, withdrawal, deposit, balance.
+    # Credit cards call the amount columns debit/credit, chequing accounts outflow/inflow;
+    # either way the first is money spent (positive Amount).
+    BankFormat(
+        name='td',
+        has_header=False,
+        columns=('Transaction Date', 'Description', 'Outflow', 'Inflow', 'Balance'),
+        outflow=('Outflow',),
+        inflow=('Inflow',),
+        date_format='%m/%d/%Y',
+    ),
+    # Chase checking: rows carry a trailing delimiter the header doesn't, so the
+    # first column must not be taken as the index.
+    BankFormat(
+        name='chase_checking',
+        required=('Details', 'Posting Date'),
+        date=('Posting Date',),
+        upload_types=('debit',),
+        read_options={'index_col': False},
+    ),
+    # Anything with a date, description and signed amount column
+    BankFormat(
+        name='generic',
+        date=('Transaction Date', 'Date'),
+        description=('Description', 'Memo'),
+        amount=('Amount', 'Value'),
+    ),
+]
+
+
+def sniff_rows(file_path: Path, max_rows: int = SNIFF_ROWS) -> List[List[str]]:
+    """The first few CSV rows, read from at most SNIFF_BYTES of the file."""
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    # Only used for detection, so a character cut at the boundary doesn't matter
+    text = head.decode('utf-8-sig', errors='replace')
+    rows = []
+    for row in csv.reader(io.StringIO(text)):
+        if row:
+            rows.append(row)
+        if len(rows) >= max_rows:
+            break
+    return rows
+
+
+def detect_format(file_path: Path, upload_type: Optional[str] = None) -> Tuple[BankFormat, List[str]]:
+    """Return the matching format and the file's first row. Raises ValueError if none match."""
+    rows = sniff_rows(file_path)
+    for bank_format in FORMATS:
+        if bank_format.matches(rows, upload_type):
+            return bank_format, rows[0]
+    first = ', '.join(rows[0]) if rows else '(empty file)'
+    raise ValueError(f"Unrecognized statement format in {file_path} (first row: {first})")
+
+
+def read_statement(file_path: Path, upload_type: Optional[str] = None) -> pd.DataFrame:
+    """Detect the file's format and parse it in one pass."""
+    bank_format, first_row = detect_format(file_path, upload_type)
+    print(f"Detected {bank_format.name} format for {file_path}")
+    return bank_format.read(file_path, first_row)
+
+
+def iter_statement(file_path: Path, upload_type: Optional[str] = None,
+                   chunk_rows: int = 50000) -> Iterator[pd.DataFrame]:
+    """Detect the file's format and yield it in standardized chunks of `chunk_rows` rows."""
+    bank_format, first_row = detect_format(file_path, upload_type)
+    print(f"Detected {bank_format.name} format for {file_path}; reading {chunk_rows} rows at a time")
+    yield from bank_format.read_chunks(file_path, first_row, chunk_rows)
@@ -0,0 +1,135 @@
+"""
+Offline nearest-neighbour categorizer trained on a user's own labeled history.
+"""
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Labels that carry no information about the merchant
+IGNORED_LABELS = {None, '', 'Uncategorized', 'DELETE'}
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Character n-gram counts of a (normalized) description, padded at word boundaries."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class HistoryCategorizer:
+    """
+    Char-n-gram TF-IDF index with kNN voting.
+
+    Documents are merchant keys; each remembers the label of every transaction
+    that normalized to it, so a relabel (manual fix) is an O(1) update rather
+    than a rebuild. IDF weights and document norms are recomputed lazily on
+    the next query after the index changed.
+    """
+
+    def __init__(self, ngram_size: int = 3, neighbors: int = 5):
+        self.ngram_size = ngram_size
+        self.neighbors = neighbors
+        self._lock = threading.RLock()
+        self._doc_ids: Dict[str, int] = {}               # merchant key -> doc index
+        self._doc_keys: List[str] = []
+        self._doc_ngrams: List[Counter] = []
+        self._doc_labels: List[Dict[str, str]] = []      # per doc: transaction id -> category
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # ngram -> {doc: tf}
+        self._txn_doc: Dict[str, int] = {}               # transaction id -> doc index
+        self._idf: Dict[str, float] = {}
+        self._norms: List[float] = []
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._txn_doc)
+
+    def _doc_for(self, key: str) -> int:
+        doc = self._doc_ids.get(key)
+        if doc is None:
+            doc = len(self._doc_keys)
+            self._doc_ids[key] = doc
+            self._doc_keys.append(key)
+            grams = char_ngrams(key, self.ngram_size)
+            self._doc_ngrams.append(grams)
+            self._doc_labels.append({})
+            for gram, tf in grams.items():
+                self._postings[gram][doc] = tf
+            self._dirty = True
+        return doc
+
+    def upsert(self, transaction_id: str, key: str, category: Optional[str]):
+        """Add or relabel one transaction. Uninformative labels remove it."""
+        with self._lock:
+            previous = self._txn_doc.pop(transaction_id, None)
+            if previous is not None:
+                self._doc_labels[previous].pop(transaction_id, None)
+            if category in IGNORED_LABELS or not key:
+                return
+            doc = self._doc_for(key)
+            self._doc_labels[doc][transaction_id] = category
+            self._txn_doc[transaction_id] = doc
+
+    def upsert_many(self, examples: Iterable[Tuple[str, str, Optional[str]]]):
+        """Bulk upsert of (transaction id, merchant key, category) triples."""
+        with self._lock:
+            for transaction_id, key, category in examples:
+                self.upsert(transaction_id, key, category)
+
+    def _refresh_weights(self):
+        """Recompute IDF and document norms after the index changed."""
+        total = len(self._doc_keys)
+        self._idf = {
+            gram: math.log((1 + total) / (1 + len(docs))) + 1.0
+            for gram, docs in self._postings.items()
+        }
+        self._norms = [
+            math.sqrt(sum((tf * self._idf[g]) ** 2 for g, tf in grams.items())) or 1.0
+            for grams in self._doc_ngrams
+        ]
+        self._dirty = False
+
+    def _neighbors(self, key: str) -> List[Tuple[float, int]]:
+        """Top-k (cosine similarity, doc) pairs for a merchant key, labeled docs only."""
+        query = {g: tf * self._idf[g] for g, tf in char_ngrams(key, self.ngram_size).items() if g in self._idf}
+        if not query:
+            return []
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        scores: Dict[int, float] = defaultdict(float)
+        for gram, weight in query.items():
+            idf = self._idf[gram]
+            for doc, tf in self._postings[gram].items():
+                scores[doc] += weight * tf * idf
+        candidates = (
+            (score / (query_norm * self._norms[doc]), doc)
+            for doc, score in scores.items() if self._doc_labels[doc]
+        )
+        return heapq.nlargest(self.neighbors, candidates)
+
+    def predict(self, keys: List[str]) -> List[Tuple[Optional[str], float]]:
+        """
+        Predict (category, confidence) for each merchant key.
+        Confidence is the top neighbour's similarity scaled by the winning
+        category's share of the similarity-weighted vote, in [0, 1].
+        """
+        with self._lock:
+            if self._dirty:
+                self._refresh_weights()
+            results = []
+            for key in keys:
+                neighbors = self._neighbors(key)
+                if not neighbors:
+                    results.append((None, 0.0))
+                    continue
+                votes: Dict[str, float] = defaultdict(float)
+                for similarity, doc in neighbors:
+                    labels = Counter(self._doc_labels[doc].values())
+                    total = sum(labels.values())
+                    for category, count in labels.items():
+                        votes[category] += similarity * count / total
+                category, score = max(votes.items(), key=lambda item: item[1])
+                share = score / sum(votes.values())
+                results.append((category, min(1.0, neighbors[0][0] * share)))
+            return results
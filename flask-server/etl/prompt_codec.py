@@ -0,0 +1,139 @@
+"""
+Compact prompt encoding and token-budget batching for LLM categorization.
+
+Rows are sent as a header plus one pipe-delimited line per transaction with
+a short per-batch id, and the model answers in the same line format, which
+costs far fewer tokens than a JSON array with repeated key names.
+"""
+import json
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+ROW_HEADER = "id|date|amount|description"
+RESPONSE_HEADER = "id|category|renamed"
+
+# Rough output cost of one answer line ("1f|Food & Drink|")
+OUTPUT_TOKENS_PER_ROW = 8
+
+_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/ASCII text)."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def short_id(index: int) -> str:
+    """Base-36 id, so a 1,000-row batch needs at most two characters per id."""
+    if index == 0:
+        return '0'
+    digits = []
+    while index:
+        index, remainder = divmod(index, 36)
+        digits.append(_ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+def _clean(value: Any) -> str:
+    return re.sub(r'[|\r\n]+', ' ', str(value)).strip()
+
+
+def _format_amount(amount: Any) -> str:
+    try:
+        return f"{float(amount):.2f}".rstrip('0').rstrip('.')
+    except (TypeError, ValueError):
+        return _clean(amount)
+
+
+def encode_row(short: str, row: Dict[str, Any]) -> str:
+    """One compact line for a row with 'Transaction Date', 'Amount' and 'Description'."""
+    return f"{short}|{_clean(row['Transaction Date'])}|{_format_amount(row['Amount'])}|{_clean(row['Description'])}"
+
+
+def encode_batch(rows: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """
+    Encode rows as a header plus compact lines.
+    Returns the text and a map of short id -> the row's '_temp_id'.
+    """
+    id_map = {}
+    lines = [ROW_HEADER]
+    for index, row in enumerate(rows):
+        short = short_id(index)
+        id_map[short] = row['_temp_id']
+        lines.append(encode_row(short, row))
+    return '\n'.join(lines), id_map
+
+
+def decode_rows(text: str) -> List[Dict[str, str]]:
+    """Parse the compact row block back out of a prompt (used by offline backends)."""
+    rows = []
+    in_block = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line == ROW_HEADER:
+            in_block = True
+            continue
+        if not in_block:
+            continue
+        parts = line.split('|', 3)
+        if len(parts) != 4:
+            if rows:
+                break
+            continue
+        rows.append({'id': parts[0], 'date': parts[1], 'amount': parts[2], 'description': parts[3]})
+    return rows
+
+
+def parse_response(text: str, id_map: Dict[str, int]) -> List[Tuple[int, str, str]]:
+    """
+    Parse a model answer into (row id, category, renamed description) tuples.
+    Accepts the compact line format and, as a fallback, the JSON array format.
+    Lines with unknown ids are ignored.
+    """
+    results = []
+    for line in text.splitlines():
+        line = line.strip().strip('`')
+        if not line or line.lower() == RESPONSE_HEADER or '|' not in line:
+            continue
+        parts = [p.strip() for p in line.split('|')]
+        short = parts[0]
+        if short not in id_map or len(parts) < 2 or not parts[1]:
+            continue
+        renamed = parts[2] if len(parts) > 2 else ''
+        results.append((id_map[short], parts[1], renamed))
+    if results:
+        return results
+
+    # Fallback: the model ignored the format and answered in JSON
+    match = re.search(r'\[\s*{.*?}\s*\]', text, re.DOTALL)
+    if match:
+        try:
+            for item in json.loads(match.group(0)):
+                short = str(item.get('id'))
+                if short in id_map and item.get('Category'):
+                    results.append((id_map[short], item['Category'], item.get('RenamedDescription') or ''))
+        except (json.JSONDecodeError, AttributeError):
+            pass
+    return results
+
+
+def pack_batches(rows: List[Dict[str, Any]], token_budget: int, max_rows: int) -> List[List[Dict[str, Any]]]:
+    """
+    Greedily pack rows into batches whose estimated input + output tokens
+    stay within token_budget (the fixed prompt preamble is not included).
+    Every batch holds at least one row, and at most max_rows.
+    """
+    batches = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for row in rows:
+        cost = estimate_tokens(encode_row(short_id(len(current)), row)) + OUTPUT_TOKENS_PER_ROW
+        if current and (used + cost > token_budget or len(current) >= max_rows):
+            batches.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,91 @@
+"""
+Deterministic, vectorized application of structured user rules.
+"""
+import re
+import warnings
+from typing import List, Tuple
+
+import pandas as pd
+
+from models.rule import Rule
+from utils.dates import parse_dates
+
+
+class RuleEngine:
+    """
+    Compiles structured rules to pandas boolean masks and applies them to a
+    whole DataFrame at once. For each action the first matching rule in rule
+    order wins: a row's category comes from the first matching rule that sets
+    one, its new description from the first matching rule that renames.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = [r for r in rules if r.is_structured]
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    @staticmethod
+    def _compile_pattern(pattern: str) -> str:
+        """Validate a pattern as regex, falling back to a literal match if it isn't one."""
+        try:
+            re.compile(pattern)
+            return pattern
+        except re.error:
+            return re.escape(pattern)
+
+    def build_mask(self, rule: Rule, descriptions: pd.Series, amounts: pd.Series,
+                   dates: pd.Series = None) -> pd.Series:
+        """Boolean mask of the rows a single rule matches."""
+        mask = pd.Series(True, index=descriptions.index)
+        if rule.pattern:
+            with warnings.catch_warnings():
+                # User patterns may contain groups; only the match matters here
+                warnings.filterwarnings('ignore', 'This pattern is interpreted as a regular expression')
+                mask &= descriptions.str.contains(
+                    self._compile_pattern(rule.pattern), case=False, regex=True, na=False
+                )
+        if rule.min_amount is not None:
+            mask &= amounts >= rule.min_amount
+        if rule.max_amount is not None:
+            mask &= amounts <= rule.max_amount
+        if dates is not None:
+            if rule.start_date:
+                mask &= dates >= pd.Timestamp(rule.start_date)
+            if rule.end_date:
+                mask &= dates <= pd.Timestamp(rule.end_date)
+        return mask
+
+    def apply(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Apply rules to the DataFrame.
+        Renames are written to 'Description'; returns the DataFrame and a Series of
+        rule-assigned categories (NaN where no categorizing rule matched).
+        Rename-only rules don't assign a category, so those rows still need one.
+        """
+        categories = pd.Series(pd.NA, index=df.index, dtype='object')
+        if not self.rules or df.empty:
+            return df, categories
+
+        descriptions = df['Description'].astype(str)
+        amounts = pd.to_numeric(df['Amount'], errors='coerce')
+        dates = None
+        if any(r.start_date or r.end_date for r in self.rules):
+            dates = parse_dates(df['Transaction Date'])
+
+        categorized = pd.Series(False, index=df.index)
+        renamed = pd.Series(False, index=df.index)
+        new_descriptions = descriptions.copy()
+        for rule in self.rules:
+            mask = self.build_mask(rule, descriptions, amounts, dates)
+            if rule.rename is not None:
+                rename_mask = mask & ~renamed
+                new_descriptions[rename_mask] = rule.rename
+                renamed |= rename_mask
+            if rule.category is not None:
+                category_mask = mask & ~categorized
+                categories[category_mask] = rule.category
+                categorized |= category_mask
+
+        df['Description'] = new_descriptions
+        return df, categories
@@ -3,26 +3,117 @@ Transformers for cleaning, categorizing, and standardizing transaction data.
 """
 import pandas as pd
 import json
-import os
 import re
 from pathlib import Path
-from typing import List, Dict, Any
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import List, Dict, Any, Optional, Callable
+
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, HISTORY_MIN_CONFIDENCE,
+    LLM_BATCH_TOKEN_BUDGET, LLM_BATCH_MAX_ROWS
+)
+from utils.concurrency import BatchDispatcher
+from utils.dates import format_dates
+from utils.metrics import (
+    track, track_stage, LLM_BATCH_SECONDS, LLM_BATCH_ROWS, LLM_BATCH_BYTES
+)
+from etl.rule_engine import RuleEngine
+from etl.categorizer_backends import CategorizerBackend, create_backend
+from etl.prompt_codec import (
+    encode_batch, parse_response, pack_batches, estimate_tokens, ROW_HEADER, RESPONSE_HEADER
+)
+from etl.categorization_cache import (
+    CategorizationCache, get_categorization_cache, normalize_description,
+    amount_bucket, rules_fingerprint, DATE_SENSITIVE_PATTERN
+)
+
+# Merchant normalization: strip the store numbers, masked references and
+# trailing ids banks append, so e.g. "CHIPOTLE #2922" and "CHIPOTLE #1042"
+# or "SEND E-TFR ***FdY" and "SEND E-TFR ***U7k" share one merchant key.
+MERCHANT_KEY_SUBSTITUTIONS = [
+    (r'\*{2,}\S*', ' '),                                # masked references: ***FdY
+    (r'#\s*\d+', ' '),                                  # store numbers: #2922
+    (r'\.{2,}', ' '),                                    # truncation: "IVEY HB..."
+    (r'\b\d{3,}\b', ' '),                                # long numbers/dates: 008626, 2025
+    (r'\b(?=[A-Z0-9]*\d)(?=[A-Z0-9]*[A-Z])[A-Z0-9]{4,}\b', ' '),  # mixed ids: 7422QPS, R9K5K4
+    (r'[*#]', ' '),                                       # leftover separators: "UNVRS*"
+    (r'\s+', ' '),
+]
+
+# Words that carry no merchant information when matching free-text rules to rows
+RULE_STOPWORDS = {
+    'THE', 'AND', 'FOR', 'ARE', 'THAT', 'THIS', 'WITH', 'FROM', 'INTO', 'UNDER', 'OVER', 'ABOVE',
+    'BELOW', 'THAN', 'LESS', 'MORE', 'EACH', 'EVERY', 'ANY', 'ALL', 'SHOULD', 'MUST', 'WILL',
+    'THEY', 'THEM', 'THEIR', 'IT', 'ITS', 'BE', 'IS', 'AS', 'TO', 'OF', 'IN', 'ON', 'AT', 'BY',
+    'TRANSACTION', 'TRANSACTIONS', 'LABELLED', 'LABELED', 'CALLED', 'NAMED', 'CONTAINING',
+    'DESCRIPTION', 'CHANGE', 'CHANGED', 'RENAME', 'RENAMED', 'CATEGORY', 'CATEGORIZE',
+    'CATEGORIZED', 'CATEGORISE', 'CATEGORISED', 'ACCORDINGLY', 'DELETE', 'DELETED', 'REMOVE',
+    'AMOUNT', 'AMOUNTS', 'PAYMENT', 'PAYMENTS', 'DOLLARS', 'FIRST', 'LAST', 'MONTH', 'WEEK',
+    'YEAR', 'DAY', 'DATE', 'ANYTHING', 'EVERYTHING', 'ONLY', 'NOT', 'WHEN', 'THEN', 'MARK',
+    'MARKED', 'ASSIGN', 'EXPENSE', 'EXPENSES', 'PURCHASE', 'PURCHASES', 'CHARGE', 'CHARGES',
+}
+
+
+def merchant_keys(descriptions: pd.Series) -> pd.Series:
+    """Vectorized canonicalization of descriptions into merchant keys."""
+    keys = descriptions.astype(str).str.upper()
+    for pattern, replacement in MERCHANT_KEY_SUBSTITUTIONS:
+        keys = keys.str.replace(pattern, replacement, regex=True)
+    keys = keys.str.strip()
+    # Never collapse a description to nothing (e.g. a bare reference number)
+    fallback = descriptions.astype(str).map(normalize_description)
+    return keys.where(keys != '', fallback)
+
+
+def rule_tokens(rules: List[Any]) -> set:
+    """Merchant-ish words (alphanumerics only, uppercased) mentioned by free-text rules."""
+    tokens = set()
+    for rule in rules:
+        for word in re.findall(r'[A-Za-z][A-Za-z0-9&\'\-]{2,}', rule.content):
+            token = re.sub(r'[^A-Z0-9]', '', word.upper())
+            if len(token) >= 3 and token not in RULE_STOPWORDS:
+                tokens.add(token)
+    return tokens
+
+
+def rule_sensitive_mask(keys: pd.Series, rules: List[Any]) -> pd.Series:
+    """
+    Rows a free-text rule might apply to, by word overlap with the rule text.
+    This errs on the side of sending rows individually: a rule that names no
+    merchant at all (e.g. "delete anything under $1") makes every row sensitive.
+    """
+    if not rules:
+        return pd.Series(False, index=keys.index)
+    tokens = rule_tokens(rules)
+    if not tokens or any(not rule_tokens([r]) for r in rules):
+        return pd.Series(True, index=keys.index)
+    compact = keys.str.replace(r'[^A-Z0-9]', '', regex=True)
+    pattern = '|'.join(re.escape(t) for t in sorted(tokens))
+    return compact.str.contains(pattern, regex=True, na=False)
 
-# Load environment variables
-load_dotenv()
-api_key = os.getenv('GEMINI_API_KEY')
-if api_key:
-    genai.configure(api_key=api_key)
 
 class TransactionTransformer:
     """Handles transformation logic including AI categorization."""
     
-    def __init__(self, categories_file: Path, rule_service=None):
+    def __init__(self, categories_file: Path, rule_service=None, cache: Optional[CategorizationCache] = None,
+                 history_provider: Optional[Callable[[], Any]] = None,
+                 backend: Optional[CategorizerBackend] = None):
+        """
+        history_provider: optional callable returning the current user's
+        HistoryCategorizer (or None); it is only called when there are rows
+        left to categorize after rules and the cache.
+        backend: LLM backend; defaults to the one selected by CATEGORIZER_BACKEND.
+        """
         self.categories_file = categories_file
         self.rule_service = rule_service
+        self.cache = cache if cache is not None else get_categorization_cache()
+        self.history_provider = history_provider
         self.categories = self._load_categories()
+        self.backend = backend if backend is not None else create_backend(categories=self.categories)
+        self.dispatcher = BatchDispatcher(
+            max_workers=LLM_MAX_CONCURRENCY,
+            max_retries=LLM_MAX_RETRIES,
+            backoff_base=LLM_BACKOFF_BASE_SECONDS
+        )
         
     def _load_categories(self) -> List[str]:
         if not self.categories_file.exists():
@@ -31,50 +122,87 @@ class TransactionTransformer:
             data = json.load(f)
             return data.get('categories', [])
 
-    def transform(self, df: pd.DataFrame, transaction_type: str = 'both') -> pd.DataFrame:
-        """Apply all transformations to the DataFrame."""
+    def transform(self, df: pd.DataFrame, transaction_type: str = 'both',
+                  scope: Optional[str] = None, stats: Optional[Dict[str, Any]] = None,
+                  timings: Optional[Dict[str, float]] = None,
+                  progress: Optional[Callable[..., None]] = None) -> pd.DataFrame:
+        """
+        Apply all transformations to the DataFrame.
+        scope: user id the categorization cache entries belong to.
+        stats: optional dict filled with categorization counters for this run.
+        timings: optional dict filled with seconds per categorization sub-stage.
+        progress: optional callback, called with llm_batches_total=n before the
+        LLM batches are sent and llm_batches_done=1 as each one completes.
+        """
         df = df.copy()
         
         # 1. Clean Amounts
         df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
         df = df.dropna(subset=['Amount'])
         
-        # 2. Clean Descriptions
+        # 2. Clean Descriptions. The statement's own text is kept in _raw_description:
+        # rules and the LLM may rename 'Description', but the import signature
+        # must not change with them.
         df['Description'] = df['Description'].astype(str).str.strip()
+        if '_raw_description' not in df.columns:
+            df['_raw_description'] = df['Description']
         
         # 3. Filter out payments/transfers if needed (optional, based on config)
         # For now, we keep everything but maybe flag them?
         
         # 4. Categorize
-        df = self._categorize_transactions(df, transaction_type)
+        df = self._categorize_transactions(df, transaction_type, scope, stats if stats is not None else {},
+                                           timings=timings, progress=progress)
         
         # 5. Filter out transactions marked for deletion
         df = df[df['Category'] != 'DELETE']
         
         return df
 
-    def _categorize_transactions(self, df: pd.DataFrame, transaction_type: str) -> pd.DataFrame:
+    def categorize(self, df: pd.DataFrame, transaction_type: str = 'both', scope: Optional[str] = None,
+                   stats: Optional[Dict[str, Any]] = None, use_history: bool = True,
+                   timings: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        """
+        Categorize already-clean rows (e.g. stored transactions) without dropping
+        anything; rows a rule marks for deletion keep the category "DELETE".
+        use_history: whether the history model may be consulted.
+        """
+        return self._categorize_transactions(
+            df.copy(), transaction_type, scope, stats if stats is not None else {}, use_history, timings
+        )
+
+    def _categorize_transactions(self, df: pd.DataFrame, transaction_type: str,
+                                 scope: Optional[str], stats: Dict[str, Any],
+                                 use_history: bool = True,
+                                 timings: Optional[Dict[str, float]] = None,
+                                 progress: Optional[Callable[..., None]] = None) -> pd.DataFrame:
         """Categorize transactions using Gemini API with optional User Rules."""
-        if not api_key:
-            print("Warning: GEMINI_API_KEY not found. Skipping AI categorization.")
-            df['Category'] = 'Uncategorized'
-            return df
-            
         # Get user rules if available
         user_rules_text = ""
-        if self.rule_service:
-            rules = self.rule_service.get_rules()
-            # Filter rules by type
-            # 'credit' matches 'credit' and 'both'
-            # 'debit' matches 'debit' and 'both'
-            applicable_rules = [
-                r for r in rules 
-                if r.rule_type == 'both' or r.rule_type == transaction_type
-            ]
+        applicable_rules = []
+        with track_stage('transform.rules', timings) as span:
+            if self.rule_service:
+                rules = self.rule_service.get_rules()
+                # Filter rules by type
+                # 'credit' matches 'credit' and 'both'
+                # 'debit' matches 'debit' and 'both'
+                applicable_rules = [
+                    r for r in rules 
+                    if r.rule_type == 'both' or r.rule_type == transaction_type
+                ]
             
-            if applicable_rules:
-                rules_list = "\n".join([f"- {r.content}" for r in applicable_rules])
-                user_rules_text = f"""
+            # Structured rules are applied locally (vectorized) and never reach the LLM.
+            # Only free-text rules are pasted into the prompt.
+            engine = RuleEngine(applicable_rules)
+            df, rule_categories = engine.apply(df)
+            span.rows = len(df)
+        rule_matched = rule_categories.notna()
+        stats['rule_matches'] = int(rule_matched.sum())
+        llm_rules = [r for r in applicable_rules if not r.is_structured]
+        
+        if llm_rules:
+            rules_list = "\n".join([f"- {r.content}" for r in llm_rules])
+            user_rules_text = f"""
                 
                 USER DEFINED RULES (PRIORITY - THESE OVERRIDE EVERYTHING ELSE):
                 {rules_list}
@@ -85,55 +213,204 @@ class TransactionTransformer:
                 - IF THE RULE IMPLIES THE TRANSACTION SHOULD BE DELETED (e.g. "delete under $1"), ASSIGN THE CATEGORY "DELETE".
                 """
             
-        # Create a temporary ID for mapping back results if not present
-        # actually we can just iterate over the dataframe rows
-        # But we need to update the dataframe.
-        # Let's add a temporary '_temp_id' column
+        # Add a temporary '_temp_id' column for mapping results back
         df['_temp_id'] = range(len(df))
         
-        # Prepare transaction objects
-        # To save tokens, we can check if rules exist. 
-        # If NO rules exist, we can fallback to the cheaper unique description method?
-        # User wants rules content to apply. So we must use full context if rules are present.
-        # But to be safe and consistent, let's just use full context always or maybe grouping?
+        # Build the LLM payload units (rows already categorized by a rule are skipped).
+        # Rows that a free-text rule might apply to are sent individually with their
+        # date and amount, since rules can depend on both ("first $1020 payment of each month").
+        # Every other row is grouped by merchant key and amount bucket; only one
+        # representative per group is sent and its answer fans out to the whole group.
+        work = df.loc[~rule_matched, ['_temp_id', 'Transaction Date', 'Description', 'Amount']].copy()
+        # ISO strings for the prompt and cache keys, formatted once per distinct date
+        work['Transaction Date'] = format_dates(work['Transaction Date'])
+        work['_merchant'] = merchant_keys(work['Description'])
+        work['_bucket'] = work['Amount'].map(lambda a: amount_bucket(a, exact=False))
+        sensitive = rule_sensitive_mask(work['_merchant'], llm_rules)
         
-        # Optimization: Group by (Description, Amount, Date) to reduce duplicates
-        # But "Date" might be irrelevant for some rules, "Amount" for others.
-        # Safest is to pass every transaction that is distinct.
-        # Let's Group by (Description, Amount) as a middle ground? 
-        # Actually, "First $1020 payment of each month" implies Date matters.
-        # So we really need to pass (Description, Amount, Date).
+        fingerprint = rules_fingerprint(llm_rules, self.categories, scope)
+        date_sensitive = any(DATE_SENSITIVE_PATTERN.search(r.content) for r in llm_rules)
         
-        # Let's convert to dict records
-        records = df[['_temp_id', 'Transaction Date', 'Description', 'Amount']].to_dict('records')
+        # unit id (the representative's _temp_id) -> member _temp_ids / cache key
+        unit_members = {}
+        unit_keys = {}
+        sensitive_units = set()
+        units = []
+        for r in work[sensitive].to_dict('records'):
+            sensitive_units.add(r['_temp_id'])
+            unit_members[r['_temp_id']] = [r['_temp_id']]
+            unit_keys[r['_temp_id']] = CategorizationCache.make_key(
+                fingerprint,
+                normalize_description(r['Description']),
+                amount_bucket(r['Amount'], exact=True),
+                str(r['Transaction Date']) if date_sensitive else None
+            )
+            units.append(r)
         
-        # Batch process
-        batch_size = 30 # Reduced batch size as payloads are larger
+        grouped = work[~sensitive]
+        if not grouped.empty:
+            members = grouped.groupby(['_merchant', '_bucket'], sort=False)['_temp_id'].agg(list)
+            for r in grouped.drop_duplicates(subset=['_merchant', '_bucket']).to_dict('records'):
+                unit_members[r['_temp_id']] = members[(r['_merchant'], r['_bucket'])]
+                unit_keys[r['_temp_id']] = CategorizationCache.make_key(fingerprint, r['_merchant'], r['_bucket'])
+                units.append(r)
         
         # We need to map _temp_id -> Category, RenamedDescription
         id_to_category = {}
         id_to_new_desc = {}
         
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i+batch_size]
-            print(f"Categorizing batch {i//batch_size + 1} of {len(records)//batch_size + 1}...")
+        # Serve what we can from the categorization cache
+        misses = []
+        for r in units:
+            hit = self.cache.get(unit_keys[r['_temp_id']])
+            if hit:
+                self._apply_unit_result(
+                    unit_members[r['_temp_id']], hit['category'], hit.get('renamed'), id_to_category, id_to_new_desc
+                )
+            else:
+                misses.append(r)
+        
+        cache_hit_rows = len(work) - sum(len(unit_members[r['_temp_id']]) for r in misses)
+        
+        # Then the user's own labeled history (local kNN, no network). Rule-sensitive
+        # rows are left to the LLM since history can't know about renames/new rules.
+        history_rows = 0
+        if use_history and self.history_provider and misses:
+            with track_stage('transform.history', timings) as span:
+                history = self.history_provider()
+                if history is not None and len(history):
+                    candidates = [r for r in misses if r['_temp_id'] not in sensitive_units]
+                    predictions = history.predict([r['_merchant'] for r in candidates])
+                    confident = set()
+                    for r, (category, confidence) in zip(candidates, predictions):
+                        if category and confidence >= HISTORY_MIN_CONFIDENCE:
+                            self._apply_unit_result(unit_members[r['_temp_id']], category, None,
+                                                    id_to_category, id_to_new_desc)
+                            history_rows += len(unit_members[r['_temp_id']])
+                            confident.add(r['_temp_id'])
+                    misses = [r for r in misses if r['_temp_id'] not in confident]
+                    span.rows = len(candidates)
+        
+        miss_rows = sum(len(unit_members[r['_temp_id']]) for r in misses)
+        stats['rows'] = len(df)
+        stats['cache_hits'] = cache_hit_rows
+        stats['history_hits'] = history_rows
+        stats['llm_rows'] = miss_rows if self.backend.available else 0
+        stats['llm_payload_rows'] = len(misses) if self.backend.available else 0
+        print(f"Categorization: {len(work)} rows -> {len(units)} unique merchants/rule-sensitive rows, "
+              f"{cache_hit_rows} rows cached, {history_rows} rows from history, {len(misses)} to send")
+        
+        if misses and not self.backend.available:
+            print(f"Warning: {self.backend.name} backend is not available (GEMINI_API_KEY not found?). "
+                  "Skipping AI categorization.")
+            misses = []
+        records = misses
+        
+        # Pack rows into batches by estimated token cost rather than a fixed row count,
+        # and encode them compactly (header + one pipe-delimited line with a short id each).
+        batches = pack_batches(records, LLM_BATCH_TOKEN_BUDGET, LLM_BATCH_MAX_ROWS)
+        prompts = []
+        id_maps = []
+        for batch in batches:
+            rows_text, id_map = encode_batch(batch)
+            prompts.append(self._build_prompt(rows_text, user_rules_text))
+            id_maps.append(id_map)
+        
+        # Send all batches concurrently (bounded), then merge the answers in batch order
+        if prompts:
+            print(f"Categorizing {len(records)} transactions in {len(prompts)} batches "
+                  f"(up to {self.dispatcher.max_workers} in parallel)...")
+        results = []
+        if prompts:
+            if progress is not None:
+                progress(llm_batches_total=len(prompts))
+            on_result = (lambda result: progress(llm_batches_done=1)) if progress is not None else None
+            with track_stage('transform.llm', timings) as span:
+                results = self.dispatcher.run(self._generate, prompts, on_result=on_result)
+                span.rows = len(records)
+                span.bytes = sum(len(p.encode('utf-8')) for p in prompts) + sum(
+                    len(r.value.text.encode('utf-8')) for r in results if r.ok
+                )
+            LLM_BATCH_ROWS.inc(len(records), backend=self.backend.name)
+        
+        prompt_tokens = output_tokens = 0
+        usage_reported = bool(results)
+        for result, prompt, id_map in zip(results, prompts, id_maps):
+            if not result.ok:
+                print(f"Error calling {self.backend.name} (batch {result.index + 1}, {result.attempts} attempts): {result.error}")
+                prompt_tokens += estimate_tokens(prompt)
+                usage_reported = False
+                continue
             
-            # Minimize payload by only sending necessary fields
-            # We send _temp_id so Gemini can tell us which one is which, 
-            # BUT we don't need to ask Gemini to repeat the ID back if we maintain order?
-            # No, LLMs are not guaranteed to preserve order perfectly or return same count.
-            # Best to ask it to return `id` (which is our _temp_id).
+            response = result.value
+            response_text = response.text
+            if response.prompt_tokens is not None:
+                prompt_tokens += response.prompt_tokens
+                output_tokens += response.output_tokens or 0
+            else:
+                prompt_tokens += estimate_tokens(prompt)
+                output_tokens += estimate_tokens(response_text)
+                usage_reported = False
             
-            prompt_batch = []
-            for r in batch:
-                prompt_batch.append({
-                    "id": r['_temp_id'],
-                    "Date": r['Transaction Date'],
-                    "Description": r['Description'],
-                    "Amount": r['Amount']
-                })
+            answers = parse_response(response_text, id_map)
+            if not answers:
+                print(f"Warning: No categorizations found in {self.backend.name} response")
+                print(f"Response text preview: {response_text[:200]}...")
+                continue
+                
+            for t_id, category, renamed in answers:
+                renamed = renamed or None
+                self._apply_unit_result(unit_members[t_id], category, renamed, id_to_category, id_to_new_desc)
+                # Don't pin "unsure" answers; let them be retried next upload
+                if category != 'Uncategorized':
+                    self.cache.put(unit_keys[t_id], category, renamed=renamed, scope=scope)
+        
+        stats['llm_batches'] = len(prompts)
+        stats['llm_prompt_tokens'] = prompt_tokens
+        stats['llm_output_tokens'] = output_tokens
+        stats['llm_tokens_source'] = 'reported' if usage_reported else 'estimated'
+        stats['llm_tokens_per_row'] = round((prompt_tokens + output_tokens) / len(records), 1) if records else 0.0
+        if prompts:
+            print(f"LLM usage: {prompt_tokens} prompt + {output_tokens} output tokens "
+                  f"({stats['llm_tokens_per_row']} tokens/row, {stats['llm_tokens_source']})")
+        
+        self.cache.save()
+        
+        # Apply results back to DF (rule-assigned categories take precedence)
+        df['Category'] = rule_categories.combine_first(df['_temp_id'].map(id_to_category)).fillna('Uncategorized')
+        
+        # Apply renaming
+        if id_to_new_desc:
+            new_desc_series = df['_temp_id'].map(id_to_new_desc)
+            df['Description'] = new_desc_series.combine_first(df['Description'])
             
-            prompt = f"""
+        # Drop temp column
+        df = df.drop(columns=['_temp_id'])
+        
+        return df
+
+    @staticmethod
+    def _apply_unit_result(member_ids: List[int], category: str, renamed: Optional[str],
+                           id_to_category: Dict[int, str], id_to_new_desc: Dict[int, str]):
+        """Fan one payload unit's answer out to every row it represents."""
+        for member_id in member_ids:
+            id_to_category[member_id] = category
+        # Renames only come from rules, and rule-sensitive rows are always sent alone
+        if renamed and len(member_ids) == 1:
+            id_to_new_desc[member_ids[0]] = renamed
+
+    def _generate(self, prompt: str):
+        """Call the backend once, recording duration and bytes (every retry attempt is observed)."""
+        backend = self.backend.name
+        with track(LLM_BATCH_SECONDS, {'backend': backend}):
+            response = self.backend.generate(prompt)
+        LLM_BATCH_BYTES.inc(len(prompt.encode('utf-8')), backend=backend, direction='sent')
+        LLM_BATCH_BYTES.inc(len(response.text.encode('utf-8')), backend=backend, direction='received')
+        return response
+
+    def _build_prompt(self, rows_text: str, user_rules_text: str) -> str:
+        """Build the categorization prompt for one compactly encoded batch of transactions."""
+        return f"""
             As a professional financial accountant you are given a list of financial transactions.
             
             Your job is to assign each transaction to one of the following categories:
@@ -145,46 +422,12 @@ class TransactionTransformer:
             3. Only use "Uncategorized" if you are absolutely unsure.
             {user_rules_text}
             
-            Return your answer as a JSON array of objects. Each object MUST contain:
-            - "id": The exact id provided in the input.
-            - "Category": The assigned category.
-            - "RenamedDescription": (Optional) New description if a rule says to rename it.
+            The transactions are given one per line as: {ROW_HEADER}
+            Answer with exactly one line per transaction, no other text, as: {RESPONSE_HEADER}
+            - id: The exact id provided in the input.
+            - category: The assigned category.
+            - renamed: New description if a rule says to rename it, otherwise leave empty.
             
             Here are the Transactions:
-            {json.dumps(prompt_batch, indent=0)}
+{rows_text}
             """
-            
-            try:
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                # Lower temperature for determinism, but Flash is usually fast
-                response = model.generate_content(prompt, generation_config={"temperature": 0.1})
-                
-                # Check for Valid JSON
-                match = re.search(r'\[\s*{.*?}\s*\]', response.text, re.DOTALL)
-                if match:
-                    output_json = json.loads(match.group(0))
-                    for item in output_json:
-                        t_id = item.get('id')
-                        if t_id is not None:
-                            id_to_category[t_id] = item.get('Category', 'Uncategorized')
-                            if item.get('RenamedDescription'):
-                                id_to_new_desc[t_id] = item.get('RenamedDescription')
-                else:
-                    print("Warning: No JSON found in Gemini response")
-                    print(f"Response text preview: {response.text[:200]}...")
-                    
-            except Exception as e:
-                print(f"Error calling Gemini: {e}")
-        
-        # Apply results back to DF
-        df['Category'] = df['_temp_id'].map(id_to_category).fillna('Uncategorized')
-        
-        # Apply renaming
-        if id_to_new_desc:
-            new_desc_series = df['_temp_id'].map(id_to_new_desc)
-            df['Description'] = new_desc_series.combine_first(df['Description'])
-            
-        # Drop temp column
-        df = df.drop(columns=['_temp_id'])
-        
-        return df
@@ -0,0 +1,13 @@
+-- Structured (deterministic) rule fields.
+-- Rules with a match condition plus a category and/or rename are applied
+-- locally by etl/rule_engine.py instead of being sent to the LLM.
+alter table public.rules
+    add column if not exists pattern text,
+    add column if not exists min_amount numeric,
+    add column if not exists max_amount numeric,
+    add column if not exists start_date date,
+    add column if not exists end_date date,
+    add column if not exists category text,
+    add column if not exists rename text,
+    -- Rules apply in creation order (first match wins); ties are broken by id
+    add column if not exists created_at timestamptz not null default now();
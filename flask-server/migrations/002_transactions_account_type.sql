@@ -0,0 +1,8 @@
+-- Remember which upload type (credit/debit) a transaction came from, so a
+-- typed rule change only recategorizes rows of that type.
+alter table public.transactions
+    add column if not exists account_type text
+        check (account_type in ('credit', 'debit'));
+
+create index if not exists transactions_user_account_type_idx
+    on public.transactions (user_id, account_type, transaction_date);
@@ -0,0 +1,35 @@
+-- Server-side aggregation for /stats: one row per (month, category) for the
+-- calling user, optionally limited to a date window. Runs as the caller so
+-- RLS still applies; the API derives totals from these groups.
+create or replace function public.transaction_rollup(p_start date default null, p_end date default null)
+returns table (
+    month text,
+    category text,
+    txn_count bigint,
+    credit_count bigint,
+    debit_count bigint,
+    total numeric,
+    credits numeric,
+    debits numeric
+)
+language sql
+stable
+security invoker
+as $$
+    select
+        to_char(date_trunc('month', t.transaction_date), 'YYYY-MM') as month,
+        coalesce(nullif(trim(t.category), ''), 'Uncategorized') as category,
+        count(*) as txn_count,
+        count(*) filter (where t.amount > 0) as credit_count,
+        count(*) filter (where t.amount < 0) as debit_count,
+        coalesce(sum(t.amount), 0) as total,
+        coalesce(sum(t.amount) filter (where t.amount > 0), 0) as credits,
+        coalesce(sum(t.amount) filter (where t.amount < 0), 0) as debits
+    from public.transactions t
+    where t.user_id = auth.uid()
+      and (p_start is null or t.transaction_date >= p_start)
+      and (p_end is null or t.transaction_date <= p_end)
+    group by 1, 2
+$$;
+
+grant execute on function public.transaction_rollup(date, date) to authenticated;
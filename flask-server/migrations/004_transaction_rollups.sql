@@ -0,0 +1,139 @@
+-- Materialized user x month x category x sign rollup of transactions.
+-- Maintained incrementally by the API (services/rollup_service.py) through
+-- apply_rollup_deltas; rebuild_transaction_rollups recomputes a user's rows
+-- from scratch (scripts/rebuild_rollups.py, POST /stats/rebuild). The end of
+-- this migration backfills every user's rollups from existing transactions,
+-- so re-running it also repairs drift.
+create table if not exists public.transaction_rollups (
+    user_id uuid not null default auth.uid() references auth.users (id) on delete cascade,
+    month date not null,                 -- first day of the month
+    category text not null,
+    sign smallint not null check (sign in (-1, 0, 1)),
+    txn_count bigint not null default 0,
+    total numeric not null default 0,
+    min_amount numeric,
+    max_amount numeric,
+    primary key (user_id, month, category, sign)
+);
+
+alter table public.transaction_rollups enable row level security;
+
+drop policy if exists "Users manage their own rollups" on public.transaction_rollups;
+create policy "Users manage their own rollups" on public.transaction_rollups
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+-- Apply a batch of deltas:
+--   [{month, category, sign, count, total, min, max, removed_min, removed_max}, ...]
+-- count/total are net changes. min/max (extremes of the added amounts) widen
+-- the group's range; removed_min/removed_max (extremes of the removed amounts)
+-- trigger a recompute of min/max from the transactions table when a removed
+-- row held the group's current extreme (e.g. an amount edit within the group).
+create or replace function public.apply_rollup_deltas(p_deltas jsonb)
+returns void
+language plpgsql
+security invoker
+as $$
+declare
+    d jsonb;
+    v_month date;
+    v_category text;
+    v_sign smallint;
+begin
+    for d in select * from jsonb_array_elements(p_deltas)
+    loop
+        v_month := date_trunc('month', (d->>'month')::date)::date;
+        v_category := d->>'category';
+        v_sign := (d->>'sign')::smallint;
+
+        insert into public.transaction_rollups as r
+            (user_id, month, category, sign, txn_count, total, min_amount, max_amount)
+        values (
+            auth.uid(), v_month, v_category, v_sign,
+            (d->>'count')::bigint, (d->>'total')::numeric,
+            (d->>'min')::numeric, (d->>'max')::numeric
+        )
+        on conflict (user_id, month, category, sign) do update set
+            txn_count = r.txn_count + excluded.txn_count,
+            total = r.total + excluded.total,
+            -- least/greatest ignore nulls, so groups with nothing added keep their range
+            min_amount = least(r.min_amount, excluded.min_amount),
+            max_amount = greatest(r.max_amount, excluded.max_amount);
+
+        if (d->>'removed_min') is not null or (d->>'count')::bigint < 0 then
+            update public.transaction_rollups r set
+                min_amount = s.min_amount,
+                max_amount = s.max_amount
+            from (
+                select min(t.amount) as min_amount, max(t.amount) as max_amount
+                from public.transactions t
+                where t.user_id = auth.uid()
+                  and t.transaction_date >= v_month
+                  and t.transaction_date < (v_month + interval '1 month')
+                  and coalesce(nullif(trim(t.category), ''), 'Uncategorized') = v_category
+                  and sign(t.amount)::smallint = v_sign
+            ) s
+            where r.user_id = auth.uid() and r.month = v_month
+              and r.category = v_category and r.sign = v_sign
+              and ((d->>'removed_min') is null
+                   or r.min_amount is null or r.max_amount is null
+                   or (d->>'removed_min')::numeric <= r.min_amount
+                   or (d->>'removed_max')::numeric >= r.max_amount);
+        end if;
+    end loop;
+
+    delete from public.transaction_rollups
+    where user_id = auth.uid() and txn_count <= 0;
+end;
+$$;
+
+-- Recompute the calling user's rollups from their transactions.
+create or replace function public.rebuild_transaction_rollups()
+returns bigint
+language plpgsql
+security invoker
+as $$
+declare
+    v_groups bigint;
+begin
+    delete from public.transaction_rollups where user_id = auth.uid();
+
+    insert into public.transaction_rollups
+        (user_id, month, category, sign, txn_count, total, min_amount, max_amount)
+    select
+        t.user_id,
+        date_trunc('month', t.transaction_date)::date,
+        coalesce(nullif(trim(t.category), ''), 'Uncategorized'),
+        sign(coalesce(t.amount, 0))::smallint,
+        count(*), coalesce(sum(t.amount), 0), min(t.amount), max(t.amount)
+    from public.transactions t
+    where t.user_id = auth.uid()
+    group by 1, 2, 3, 4;
+
+    get diagnostics v_groups = row_count;
+    return v_groups;
+end;
+$$;
+
+-- Backfill every user's rollups from their existing transactions. Writes are
+-- blocked while this runs, so no delta is counted twice or lost.
+begin;
+lock table public.transactions in share mode;
+lock table public.transaction_rollups in exclusive mode;
+
+delete from public.transaction_rollups;
+
+insert into public.transaction_rollups
+    (user_id, month, category, sign, txn_count, total, min_amount, max_amount)
+select
+    t.user_id,
+    date_trunc('month', t.transaction_date)::date,
+    coalesce(nullif(trim(t.category), ''), 'Uncategorized'),
+    sign(coalesce(t.amount, 0))::smallint,
+    count(*), coalesce(sum(t.amount), 0), min(t.amount), max(t.amount)
+from public.transactions t
+group by 1, 2, 3, 4;
+commit;
+
+grant select, insert, update, delete on public.transaction_rollups to authenticated;
+grant execute on function public.apply_rollup_deltas(jsonb) to authenticated;
+grant execute on function public.rebuild_transaction_rollups() to authenticated;
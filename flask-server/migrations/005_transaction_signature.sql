@@ -0,0 +1,60 @@
+-- Database-enforced import idempotency.
+-- signature = date | normalized description | amount in cents, fixed when the
+-- row is inserted (later renames/recategorizations don't change it). The app
+-- signs the statement's description, before any rule renames it. Imports
+-- upsert with on_conflict (user_id, signature) and ignore duplicates, so
+-- overlapping or concurrent uploads can't double-insert.
+-- Must match models.transaction.transaction_signature.
+create or replace function public.transaction_signature(p_date date, p_description text, p_amount numeric)
+returns text
+language sql
+immutable
+as $$
+    select to_char(p_date, 'YYYY-MM-DD')
+        || '|' || upper(btrim(regexp_replace(coalesce(p_description, ''), '\s+', ' ', 'g')))
+        || '|' || round(coalesce(p_amount, 0) * 100)::bigint::text
+$$;
+
+alter table public.transactions add column if not exists signature text;
+
+-- Rows inserted without a signature (e.g. by other clients) get one computed
+create or replace function public.transactions_set_signature()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.signature is null then
+        new.signature := public.transaction_signature(new.transaction_date, new.description, new.amount);
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists transactions_set_signature on public.transactions;
+create trigger transactions_set_signature
+    before insert on public.transactions
+    for each row execute function public.transactions_set_signature();
+
+-- Backfill. Existing duplicates keep a null signature (nulls don't conflict)
+-- rather than being deleted.
+with ranked as (
+    select id,
+           public.transaction_signature(transaction_date, description, amount) as sig,
+           row_number() over (
+               partition by user_id, public.transaction_signature(transaction_date, description, amount)
+               order by id
+           ) as rn
+    from public.transactions
+    where signature is null
+)
+update public.transactions t
+set signature = ranked.sig
+from ranked
+where t.id = ranked.id and ranked.rn = 1
+  and not exists (
+      select 1 from public.transactions o
+      where o.user_id = t.user_id and o.signature = ranked.sig
+  );
+
+create unique index if not exists transactions_user_signature_key
+    on public.transactions (user_id, signature);
@@ -0,0 +1,19 @@
+-- Apply many heterogeneous transaction updates in one request.
+-- p_updates: [{"id": "...", "category": "...", "description": "...", "amount": 1.23}, ...]
+-- Only keys present in an element are changed. Runs as the caller (RLS applies);
+-- returns the rows that were updated.
+create or replace function public.bulk_update_transactions(p_updates jsonb)
+returns setof public.transactions
+language sql
+security invoker
+as $$
+    update public.transactions t set
+        category = case when u.value ? 'category' then u.value->>'category' else t.category end,
+        description = case when u.value ? 'description' then u.value->>'description' else t.description end,
+        amount = case when u.value ? 'amount' then (u.value->>'amount')::numeric else t.amount end
+    from jsonb_array_elements(p_updates) as u(value)
+    where t.id = (u.value->>'id')::uuid
+    returning t.*
+$$;
+
+grant execute on function public.bulk_update_transactions(jsonb) to authenticated;
@@ -0,0 +1,188 @@
+-- Delta sync and conditional GETs.
+-- Every write to a user's transactions, categories or rules bumps a per-user
+-- counter in user_data_versions (once per statement for transactions). The
+-- counter row is locked until the writing transaction commits, so for a given
+-- user the numbers are handed out in commit order and can be used as a sync
+-- watermark without missing rows:
+--   * transactions.change_seq   = counter value of the row's last insert/update
+--   * transactions.created_seq  = counter value when the row was inserted
+--   * transaction_tombstones    = deleted ids with the counter value of the delete
+-- GET /transactions/changes?since=N returns everything with a seq > N;
+-- GET /transactions, /categories and /rules use the counters as ETags.
+create table if not exists public.user_data_versions (
+    user_id uuid primary key references auth.users (id) on delete cascade,
+    transactions bigint not null default 0,
+    categories bigint not null default 0,
+    rules bigint not null default 0
+);
+
+alter table public.user_data_versions enable row level security;
+
+drop policy if exists "Users read their own versions" on public.user_data_versions;
+create policy "Users read their own versions" on public.user_data_versions
+    for select using (auth.uid() = user_id);
+
+create table if not exists public.transaction_tombstones (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    change_seq bigint not null,
+    transaction_id uuid not null,
+    deleted_at timestamptz not null default now(),
+    primary key (user_id, change_seq)
+);
+
+alter table public.transaction_tombstones enable row level security;
+
+drop policy if exists "Users read their own tombstones" on public.transaction_tombstones;
+create policy "Users read their own tombstones" on public.transaction_tombstones
+    for select using (auth.uid() = user_id);
+
+alter table public.transactions
+    add column if not exists updated_at timestamptz not null default now(),
+    add column if not exists change_seq bigint not null default 0,
+    add column if not exists created_seq bigint not null default 0;
+
+create index if not exists transactions_user_change_seq_idx
+    on public.transactions (user_id, change_seq);
+
+-- Number existing rows 1..n per user (before the triggers exist, so this
+-- doesn't count as a change) and start each user's counter after them.
+-- Seqs must be unique per user for paging by watermark.
+with numbered as (
+    select id, row_number() over (partition by user_id order by transaction_date, id) as seq
+    from public.transactions
+    where change_seq = 0
+)
+update public.transactions t
+set change_seq = numbered.seq, created_seq = numbered.seq
+from numbered
+where t.id = numbered.id;
+
+insert into public.user_data_versions (user_id, transactions)
+select user_id, max(change_seq) from public.transactions group by user_id
+on conflict (user_id) do nothing;
+
+-- Increment one of the user's counters by p_count and return the new value;
+-- the caller owns the p_count values ending at it.
+-- Security definer: callers can read but not write user_data_versions directly.
+drop function if exists public.bump_user_data_version(uuid, text);
+create or replace function public.bump_user_data_version(p_user_id uuid, p_resource text, p_count bigint default 1)
+returns bigint
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_version bigint;
+begin
+    if p_resource not in ('transactions', 'categories', 'rules') then
+        raise exception 'Unknown resource %', p_resource;
+    end if;
+
+    insert into public.user_data_versions (user_id)
+    values (p_user_id)
+    on conflict (user_id) do nothing;
+
+    execute format(
+        'update public.user_data_versions set %1$I = %1$I + $2 where user_id = $1 returning %1$I',
+        p_resource
+    ) into v_version using p_user_id, p_count;
+    return v_version;
+end;
+$$;
+
+-- Statement-level: runs once per insert/update/delete statement over the rows
+-- that actually landed (an upsert's ignored duplicates aren't in the
+-- transition table), bumping each affected user's counter once by the row
+-- count and numbering the rows from the reserved range. Users are locked in
+-- user_id order so multi-user statements can't deadlock.
+create or replace function public.transactions_track_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    r record;
+    v_last bigint;
+begin
+    if tg_op = 'DELETE' then
+        for r in select user_id, count(*) as n from old_rows group by user_id order by user_id loop
+            v_last := public.bump_user_data_version(r.user_id, 'transactions', r.n);
+            insert into public.transaction_tombstones (user_id, change_seq, transaction_id)
+            select r.user_id, v_last - r.n + row_number() over (order by id), id
+            from old_rows
+            where user_id = r.user_id;
+        end loop;
+        return null;
+    end if;
+
+    -- The seq update below is itself an update of transactions
+    if pg_trigger_depth() > 1 then
+        return null;
+    end if;
+
+    for r in select user_id, count(*) as n from new_rows group by user_id order by user_id loop
+        v_last := public.bump_user_data_version(r.user_id, 'transactions', r.n);
+        update public.transactions t
+        set change_seq = numbered.seq,
+            created_seq = case when tg_op = 'INSERT' then numbered.seq else t.created_seq end,
+            updated_at = now()
+        from (
+            select id, v_last - r.n + row_number() over (order by id) as seq
+            from new_rows
+            where user_id = r.user_id
+        ) numbered
+        where t.id = numbered.id;
+    end loop;
+    return null;
+end;
+$$;
+
+-- Transition tables can't be declared on multi-event triggers, hence three
+drop trigger if exists transactions_track_changes on public.transactions;
+drop trigger if exists transactions_track_inserts on public.transactions;
+create trigger transactions_track_inserts
+    after insert on public.transactions
+    referencing new table as new_rows
+    for each statement execute function public.transactions_track_changes();
+
+drop trigger if exists transactions_track_updates on public.transactions;
+create trigger transactions_track_updates
+    after update on public.transactions
+    referencing new table as new_rows
+    for each statement execute function public.transactions_track_changes();
+
+drop trigger if exists transactions_track_deletes on public.transactions;
+create trigger transactions_track_deletes
+    after delete on public.transactions
+    referencing old table as old_rows
+    for each statement execute function public.transactions_track_changes();
+
+-- categories and rules only need their counter bumped (for ETags)
+create or replace function public.bump_version_on_change()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    perform public.bump_user_data_version(
+        case when tg_op = 'DELETE' then old.user_id else new.user_id end, tg_argv[0]
+    );
+    return null;
+end;
+$$;
+
+drop trigger if exists categories_bump_version on public.categories;
+create trigger categories_bump_version
+    after insert or update or delete on public.categories
+    for each row execute function public.bump_version_on_change('categories');
+
+drop trigger if exists rules_bump_version on public.rules;
+create trigger rules_bump_version
+    after insert or update or delete on public.rules
+    for each row execute function public.bump_version_on_change('rules');
+
+grant select on public.user_data_versions to authenticated;
+grant select on public.transaction_tombstones to authenticated;
+revoke execute on function public.bump_user_data_version(uuid, text, bigint) from public, anon, authenticated;
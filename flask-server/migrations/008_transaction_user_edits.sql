@@ -0,0 +1,22 @@
+-- Remember which transactions the user categorized or renamed by hand, so a
+-- rule change doesn't overwrite those edits when it recategorizes stored rows.
+alter table public.transactions
+    add column if not exists user_edited boolean not null default false;
+
+-- bulk_update_transactions (migration 006), now also setting user_edited
+create or replace function public.bulk_update_transactions(p_updates jsonb)
+returns setof public.transactions
+language sql
+security invoker
+as $$
+    update public.transactions t set
+        category = case when u.value ? 'category' then u.value->>'category' else t.category end,
+        description = case when u.value ? 'description' then u.value->>'description' else t.description end,
+        amount = case when u.value ? 'amount' then (u.value->>'amount')::numeric else t.amount end,
+        user_edited = case when u.value ? 'user_edited' then (u.value->>'user_edited')::boolean else t.user_edited end
+    from jsonb_array_elements(p_updates) as u(value)
+    where t.id = (u.value->>'id')::uuid
+    returning t.*
+$$;
+
+grant execute on function public.bulk_update_transactions(jsonb) to authenticated;
@@ -2,5 +2,6 @@
 Data models for the FinSight application.
 """
 from .transaction import Transaction
+from .transaction_query import TransactionQuery
 
-__all__ = ['Transaction']
+__all__ = ['Transaction', 'TransactionQuery']
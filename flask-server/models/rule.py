@@ -2,34 +2,102 @@
 Rule data model.
 """
 from dataclasses import dataclass
-from typing import Optional
+from datetime import date
+from typing import Optional, Dict, Any
+import re
 import uuid
 
+# Optional structured conditions/actions that make a rule deterministic
+STRUCTURED_FIELDS = ['pattern', 'min_amount', 'max_amount', 'start_date', 'end_date', 'category', 'rename']
+
 @dataclass
 class Rule:
     """Represents a user-defined categorization rule."""
     content: str
     rule_id: Optional[str] = None
     rule_type: str = 'both'  # 'credit', 'debit', or 'both'
-    
+    # Structured form (all optional). Free-text rules are handed to the LLM;
+    # structured ones are applied locally by etl.rule_engine.RuleEngine.
+    pattern: Optional[str] = None        # Case-insensitive regex matched against the description
+    min_amount: Optional[float] = None   # Inclusive
+    max_amount: Optional[float] = None   # Inclusive
+    start_date: Optional[str] = None     # ISO date, inclusive
+    end_date: Optional[str] = None       # ISO date, inclusive
+    category: Optional[str] = None       # Target category ("DELETE" drops the transaction)
+    rename: Optional[str] = None         # New description
+
     def __post_init__(self):
         """Generate ID if not provided."""
         if not self.rule_id:
             self.rule_id = str(uuid.uuid4())
-            
+
+    @property
+    def has_conditions(self) -> bool:
+        """Whether the rule has any structured match condition."""
+        return any(v is not None for v in (
+            self.pattern, self.min_amount, self.max_amount, self.start_date, self.end_date
+        ))
+
+    @property
+    def is_structured(self) -> bool:
+        """Whether the rule can be applied deterministically without the LLM."""
+        return self.has_conditions and (self.category is not None or self.rename is not None)
+
     def to_dict(self) -> dict:
         """Convert rule to dictionary."""
-        return {
+        data = {
             'id': self.rule_id,
             'content': self.content,
             'type': self.rule_type
         }
-    
+        for field in STRUCTURED_FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
     @classmethod
     def from_dict(cls, data: dict) -> 'Rule':
         """Create Rule from dictionary."""
         return cls(
             content=data.get('content', ''),
             rule_id=data.get('id'),
-            rule_type=data.get('type', 'both')
+            rule_type=data.get('type', 'both'),
+            **cls.parse_conditions(data, strict=False)
         )
+
+    @staticmethod
+    def parse_conditions(data: Dict[str, Any], strict: bool = True) -> Dict[str, Any]:
+        """
+        Extract and normalize the structured fields present in `data`.
+        Only keys present in `data` are returned, so partial updates stay partial.
+        With strict=True invalid values raise ValueError; otherwise they are dropped.
+        """
+        conditions = {}
+        for field in STRUCTURED_FIELDS:
+            if field not in data:
+                continue
+            value = data[field]
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == '':
+                conditions[field] = None
+                continue
+            try:
+                if field in ('min_amount', 'max_amount'):
+                    value = float(value)
+                elif field in ('start_date', 'end_date'):
+                    value = date.fromisoformat(str(value)[:10]).isoformat()
+                elif field == 'pattern':
+                    re.compile(value)
+                conditions[field] = value
+            except (TypeError, ValueError, re.error) as e:
+                if strict:
+                    raise ValueError(f"Invalid {field}: {value!r} ({e})")
+
+        if strict:
+            low, high = conditions.get('min_amount'), conditions.get('max_amount')
+            if low is not None and high is not None and low > high:
+                raise ValueError("min_amount cannot be greater than max_amount")
+            start, end = conditions.get('start_date'), conditions.get('end_date')
+            if start and end and start > end:
+                raise ValueError("start_date cannot be after end_date")
+        return conditions
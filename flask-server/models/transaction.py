@@ -4,8 +4,29 @@ Transaction data model.
 from dataclasses import dataclass
 from typing import Optional
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+import re
 import uuid
 
+# API field name -> database column
+FIELD_COLUMNS = {
+    'Transaction Date': 'transaction_date',
+    'Description': 'description',
+    'Category': 'category',
+    'Amount': 'amount',
+    'Transaction ID': 'id',
+}
+
+
+def transaction_signature(transaction_date: str, description: str, amount) -> str:
+    """
+    Import identity of a transaction: 'YYYY-MM-DD|NORMALIZED DESCRIPTION|cents'.
+    Must match the transaction_signature SQL function (migrations/005).
+    """
+    normalized = re.sub(r'\s+', ' ', str(description or '').strip()).upper()
+    cents = (Decimal(str(amount or 0)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return f"{transaction_date}|{normalized}|{int(cents)}"
+
 
 @dataclass
 class Transaction:
@@ -65,6 +86,25 @@ class Transaction:
             'Transaction ID': self.transaction_id
         }
     
+    @staticmethod
+    def row_to_dict(row: dict, fields: Optional[list] = None) -> dict:
+        """
+        Convert a database row straight to the to_dict() shape, optionally
+        projected to `fields` (API names), without building a Transaction.
+        """
+        result = {}
+        for name in fields or FIELD_COLUMNS:
+            value = row.get(FIELD_COLUMNS[name])
+            if name == 'Amount':
+                try:
+                    value = float(value) if value not in (None, '') else 0.0
+                except (TypeError, ValueError):
+                    value = 0.0
+            elif name == 'Category' and (not value or not str(value).strip()):
+                value = 'Uncategorized'
+            result[name] = value
+        return result
+
     @classmethod
     def from_dict(cls, data: dict) -> 'Transaction':
         """Create Transaction from dictionary."""
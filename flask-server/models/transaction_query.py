@@ -0,0 +1,109 @@
+"""
+Query parameters for listing transactions (filters, projection, keyset cursor).
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.transaction import FIELD_COLUMNS
+
+# Accepted spellings in ?fields= (API names, column names, or short names)
+FIELD_ALIASES = {
+    **{name.lower(): name for name in FIELD_COLUMNS},
+    **{column: name for name, column in FIELD_COLUMNS.items()},
+    'date': 'Transaction Date',
+    'transaction_id': 'Transaction ID',
+}
+
+
+def encode_cursor(transaction_date: str, transaction_id: str) -> str:
+    """Opaque cursor for the position after (transaction_date, id)."""
+    raw = json.dumps([transaction_date, transaction_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        transaction_date, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        date.fromisoformat(transaction_date)
+        return str(transaction_date), str(transaction_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+@dataclass
+class TransactionQuery:
+    """
+    Filters for GET /transactions. Results are ordered newest first by
+    (transaction_date, id); `cursor` continues after the last row of a page.
+    Without `limit`, every matching row is returned.
+    """
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    categories: List[str] = field(default_factory=list)
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    fields: List[str] = field(default_factory=list)  # API field names; empty = all
+    limit: Optional[int] = None
+    cursor: Optional[Tuple[str, str]] = None
+
+    @property
+    def columns(self) -> str:
+        """Columns to select; the cursor columns are always included."""
+        names = self.fields or list(FIELD_COLUMNS)
+        columns = [FIELD_COLUMNS[n] for n in names]
+        for required in ('transaction_date', 'id'):
+            if required not in columns:
+                columns.append(required)
+        return ', '.join(columns)
+
+    @classmethod
+    def from_args(cls, args: Dict[str, Any], max_limit: int) -> 'TransactionQuery':
+        """Parse request query args. Raises ValueError with a user-facing message."""
+        query = cls()
+
+        for key in ('start_date', 'end_date'):
+            value = args.get(key)
+            if value:
+                try:
+                    setattr(query, key, date.fromisoformat(value).isoformat())
+                except ValueError:
+                    raise ValueError(f"{key} must be an ISO date (YYYY-MM-DD)")
+
+        for key in ('min_amount', 'max_amount'):
+            value = args.get(key)
+            if value not in (None, ''):
+                try:
+                    setattr(query, key, float(value))
+                except ValueError:
+                    raise ValueError(f"{key} must be a number")
+
+        if args.get('category'):
+            query.categories = [c.strip() for c in args['category'].split(',') if c.strip()]
+
+        if args.get('fields'):
+            for name in args['fields'].split(','):
+                name = name.strip()
+                resolved = FIELD_ALIASES.get(name) or FIELD_ALIASES.get(name.lower())
+                if not resolved:
+                    raise ValueError(f"Unknown field: {name}")
+                if resolved not in query.fields:
+                    query.fields.append(resolved)
+
+        if args.get('limit'):
+            try:
+                limit = int(args['limit'])
+            except ValueError:
+                raise ValueError("limit must be an integer")
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            query.limit = min(limit, max_limit)
+
+        if args.get('cursor'):
+            query.cursor = decode_cursor(args['cursor'])
+
+        return query
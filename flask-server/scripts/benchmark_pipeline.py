@@ -0,0 +1,98 @@
+"""
+Benchmark PipelineService.process_file offline.
+
+Runs extract + transform (no Supabase import) with a fake or replayed
+categorizer backend, so throughput can be measured and regression-tested
+without an API key or network access.
+
+Examples:
+    python scripts/benchmark_pipeline.py data/bronze/credit/credit_td.csv --type credit
+    python scripts/benchmark_pipeline.py big.csv --type debit --latency 0.8 --error-rate 0.05 --repeat 3
+    python scripts/benchmark_pipeline.py big.csv --type debit --backend replay --profile
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from services.pipeline_service import PipelineService
+from etl.categorizer_backends import FakeBackend, create_backend
+from etl.categorization_cache import CategorizationCache
+
+
+def build_backend(args, categories):
+    if args.backend == 'fake':
+        return FakeBackend(categories, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    return create_backend(args.backend, categories)
+
+
+def benchmark(args):
+    file_path = Path(args.file)
+    if not file_path.exists():
+        print(f"File not found: {file_path}")
+        return 1
+
+    # A throwaway cache per run keeps repeats comparable unless --warm-cache is given
+    cache_dir = tempfile.mkdtemp(prefix='finsight-bench-')
+    cache = CategorizationCache(Path(cache_dir) / 'cache.json')
+
+    app = Flask(__name__)
+    with app.app_context():
+        service = PipelineService(cache=cache)
+        service.transformer.backend = build_backend(args, service.transformer.categories)
+        print(f"Backend: {service.transformer.backend.name}")
+
+        timings = []
+        for run in range(args.repeat):
+            if not args.warm_cache:
+                cache.invalidate()
+            started = time.perf_counter()
+            result = service.process_file(file_path, args.type, dry_run=True)
+            elapsed = time.perf_counter() - started
+            timings.append(elapsed)
+
+            if not result['success']:
+                print(f"Run {run + 1} failed: {result.get('error')}")
+                return 1
+            rows = result['stats']['rows']
+            print(f"Run {run + 1}: {rows} rows in {elapsed:.3f}s "
+                  f"({rows / elapsed if elapsed else 0:.0f} rows/s) {result.get('categorization', {})}")
+            print(f"  timings: {result.get('timings', {})}")
+
+        best = min(timings)
+        print(f"\nBest of {len(timings)}: {best:.3f}s, mean: {sum(timings) / len(timings):.3f}s")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL pipeline without network access.")
+    parser.add_argument('file', help="CSV statement to process")
+    parser.add_argument('--type', choices=['credit', 'debit'], default='credit')
+    parser.add_argument('--backend', choices=['fake', 'replay'], default='fake')
+    parser.add_argument('--latency', type=float, default=0.0, help="Fake backend latency per call (seconds)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fake backend failure rate (0-1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--warm-cache', action='store_true', help="Keep the categorization cache between runs")
+    parser.add_argument('--profile', action='store_true', help="Print a cProfile summary")
+    args = parser.parse_args()
+
+    if not args.profile:
+        return benchmark(args)
+
+    profiler = cProfile.Profile()
+    code = profiler.runcall(benchmark, args)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Rebuild the transaction_rollups table for a user from their transactions.
+
+Use to repair rollups that drifted, e.g. after rows were edited directly in
+the database (migration 004 backfills existing history itself).
+
+Example:
+    python scripts/rebuild_rollups.py
+"""
+import os
+import sys
+from getpass import getpass
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, g
+from services.supabase_service import SupabaseService
+from services.rollup_service import RollupService
+
+
+def rebuild_rollups():
+    """Log in and rebuild the user's rollups."""
+    print("=== FinSight Rollup Rebuild ===")
+
+    email = input("Enter Supabase Email: ")
+    password = getpass("Enter Supabase Password: ")
+
+    try:
+        session = SupabaseService.get_client().auth.sign_in_with_password({"email": email, "password": password})
+        user = session.user
+        token = session.session.access_token
+        print(f"Successfully logged in as {user.email}")
+    except Exception as e:
+        print(f"Login failed: {e}")
+        return 1
+
+    app = Flask(__name__)
+    with app.app_context():
+        g.user = user
+        g.token = token
+
+        groups = RollupService().rebuild()
+        if groups is None:
+            print("Rebuild failed (is migration 004 applied?)")
+            return 1
+        print(f"Rebuilt {groups} rollup groups")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(rebuild_rollups())
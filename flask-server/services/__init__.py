@@ -5,5 +5,13 @@ from .transaction_service import TransactionService
 from .upload_service import UploadService
 from .pipeline_service import PipelineService
 from .rule_service import RuleService
+from .history_service import HistoryService
+from .recategorization_service import RecategorizationService
+from .rollup_service import RollupService
+from .sync_service import SyncService
+from .job_service import JobService
 
-__all__ = ['TransactionService', 'UploadService', 'PipelineService', 'RuleService']
+__all__ = [
+    'TransactionService', 'UploadService', 'PipelineService', 'RuleService', 'HistoryService',
+    'RecategorizationService', 'RollupService', 'SyncService', 'JobService'
+]
@@ -0,0 +1,106 @@
+"""
+Service that maintains per-user history categorizers built from Supabase.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from flask import g
+
+from services.supabase_service import SupabaseService
+from etl.history_categorizer import HistoryCategorizer
+from etl.transformers import merchant_keys
+from utils.metrics import track_supabase, json_size
+from config import HISTORY_NEIGHBORS, HISTORY_MODEL_TTL_SECONDS, HISTORY_MAX_USERS
+
+
+class HistoryService:
+    """
+    Builds, caches and incrementally updates a HistoryCategorizer per user.
+    Models are shared process-wide (LRU over users) and rebuilt from the
+    database only when they expire; label changes made through
+    TransactionService are applied in place via record().
+    """
+
+    _models: 'OrderedDict[str, tuple]' = OrderedDict()  # user_id -> (model, built_at)
+    _lock = threading.Lock()
+    PAGE_SIZE = 1000
+
+    def get_client(self):
+        if 'token' not in g:
+            raise Exception("No authenticated user found")
+        return SupabaseService.get_auth_client(g.token)
+
+    def _fetch_labeled(self) -> List[Dict[str, Any]]:
+        """Fetch every categorized transaction for the current user, page by page."""
+        client = self.get_client()
+        rows = []
+        start = 0
+        while True:
+            with track_supabase('transactions', 'select_history') as span:
+                response = client.table('transactions')\
+                    .select('id, description, category')\
+                    .neq('category', 'Uncategorized')\
+                    .order('id')\
+                    .range(start, start + self.PAGE_SIZE - 1)\
+                    .execute()
+                span.rows = len(response.data)
+                span.bytes = json_size(response.data)
+            rows.extend(response.data)
+            if len(response.data) < self.PAGE_SIZE:
+                return rows
+            start += self.PAGE_SIZE
+
+    @staticmethod
+    def _examples(rows: List[Dict[str, Any]]):
+        """Turn DB rows into (transaction id, merchant key, category) triples."""
+        rows = [r for r in rows if r.get('id') and r.get('description') is not None]
+        if not rows:
+            return []
+        keys = merchant_keys(pd.Series([r['description'] for r in rows]))
+        return [(str(r['id']), key, r.get('category')) for r, key in zip(rows, keys)]
+
+    def get_model(self) -> Optional[HistoryCategorizer]:
+        """Return the current user's model, building it on first use or after expiry."""
+        user_id = SupabaseService.get_user_id()
+        if not user_id:
+            return None
+
+        with self._lock:
+            cached = self._models.get(user_id)
+            if cached and time.time() - cached[1] < HISTORY_MODEL_TTL_SECONDS:
+                self._models.move_to_end(user_id)
+                return cached[0]
+
+        try:
+            started = time.time()
+            model = HistoryCategorizer(neighbors=HISTORY_NEIGHBORS)
+            model.upsert_many(self._examples(self._fetch_labeled()))
+            print(f"Built history model for {user_id}: {len(model)} labeled transactions "
+                  f"in {time.time() - started:.2f}s")
+        except Exception as e:
+            print(f"Error building history model: {e}")
+            return None
+
+        with self._lock:
+            self._models[user_id] = (model, time.time())
+            self._models.move_to_end(user_id)
+            while len(self._models) > HISTORY_MAX_USERS:
+                self._models.popitem(last=False)
+        return model
+
+    def record(self, rows: List[Dict[str, Any]]):
+        """
+        Apply new/changed labels (DB rows with id, description, category) to the
+        current user's cached model, if one is built. Never raises.
+        """
+        try:
+            user_id = SupabaseService.get_user_id()
+            with self._lock:
+                cached = self._models.get(user_id)
+            if cached and rows:
+                cached[0].upsert_many(self._examples(rows))
+        except Exception as e:
+            print(f"Error updating history model: {e}")
@@ -0,0 +1,346 @@
+"""
+Background upload jobs.
+
+An accepted upload is saved under JOBS_UPLOADS_DIR and recorded in a SQLite
+job table, and a small pool of worker threads runs PipelineService.process_file
+(or process_files, for a batch staged in its own directory) for it inside an
+app context with the uploader's g.user/g.token. Other per-user background work
+(e.g. recategorizing after a rule change) goes through submit_task. Workers write
+their stage and counters back to the table (throttled), so GET /jobs/<id> can
+be answered by any API process on this host without touching the pipeline.
+
+The job table is a local SQLite file (JOBS_DB_FILE), so every API process
+serving /jobs must run on the same host and see the same file; SQLite
+locking is not reliable on network filesystems. Deployments spread over
+several hosts need sticky routing per user or a shared job store.
+
+The caller's access token is never written to disk: it lives in this
+process's memory until the job finishes. A job whose process dies is
+therefore marked failed the next time the service starts rather than retried.
+"""
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import g
+
+from utils.json_utils import dumps
+from config import (
+    JOBS_DB_FILE, JOB_WORKERS, JOB_MAX_PENDING, JOB_PROGRESS_INTERVAL_SECONDS, JOB_RETENTION_DAYS
+)
+
+# What a job's work returns: (succeeded, result dict or None, error message or None)
+Outcome = Tuple[bool, Optional[Dict[str, Any]], Optional[str]]
+
+# Counters workers report through the progress callback
+COUNTERS = ('rows_read', 'rows_processed', 'llm_batches_done', 'llm_batches_total')
+
+SCHEMA = """
+create table if not exists jobs (
+    id text primary key,
+    user_id text not null,
+    owner text not null,
+    status text not null,
+    stage text,
+    upload_type text not null,  -- 'credit'/'debit', or a task's job type
+    filename text,
+    file_path text,
+    rows_read integer not null default 0,
+    rows_processed integer not null default 0,
+    llm_batches_done integer not null default 0,
+    llm_batches_total integer not null default 0,
+    result text,
+    error text,
+    created_at text not null,
+    started_at text,
+    finished_at text
+);
+create index if not exists jobs_user_created_idx on jobs (user_id, created_at);
+"""
+
+
+class JobQueueFull(RuntimeError):
+    """JOB_MAX_PENDING jobs are already queued or running in this process."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class _ProgressReporter:
+    """
+    The progress callback handed to the pipeline for one job. Counters are
+    incremented in memory; the row is written on stage changes and at most
+    every JOB_PROGRESS_INTERVAL_SECONDS otherwise.
+    """
+
+    def __init__(self, service: 'JobService', job_id: str):
+        self.service = service
+        self.job_id = job_id
+        self.stage: Optional[str] = None
+        self.counters = {name: 0 for name in COUNTERS}
+        self._lock = threading.Lock()
+        self._written = 0.0
+
+    def __call__(self, stage: Optional[str] = None, **increments: int):
+        with self._lock:
+            for name, value in increments.items():
+                if name in self.counters:
+                    self.counters[name] += int(value)
+            stage_changed = stage is not None and stage != self.stage
+            if stage_changed:
+                self.stage = stage
+            if not stage_changed and time.monotonic() - self._written < JOB_PROGRESS_INTERVAL_SECONDS:
+                return
+            self._written = time.monotonic()
+            fields = dict(self.counters, stage=self.stage)
+        try:
+            self.service._update(self.job_id, **fields)
+        except sqlite3.Error as e:
+            # Progress is best-effort; the final update carries the totals
+            print(f"Error recording progress for job {self.job_id}: {e}")
+
+
+class JobService:
+    """Queues uploads (and other per-user tasks) for background processing and reports on them."""
+
+    def __init__(self, app, pipeline_service=None, db_path: Path = JOBS_DB_FILE, workers: int = JOB_WORKERS):
+        """
+        app: the Flask app whose context jobs run in.
+        pipeline_service: shared PipelineService (a new one by default).
+        """
+        if pipeline_service is None:
+            from services import PipelineService  # Lazy import
+            pipeline_service = PipelineService()
+        self.app = app
+        self.pipeline_service = pipeline_service
+        self.db_path = Path(db_path)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='upload-job')
+        # job id -> (token, user) for jobs this process has accepted and not finished
+        self._pending: Dict[str, Any] = {}
+        self._pending_lock = threading.Lock()
+        self._init_db()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            # WAL lets GET /jobs/<id> read while a worker writes
+            conn.execute('pragma journal_mode=wal')
+            conn.executescript(SCHEMA)
+        self._recover()
+
+    def _recover(self):
+        """Fail jobs left queued/running by dead processes on this host, and drop old finished jobs."""
+        host = socket.gethostname()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=JOB_RETENTION_DAYS)).isoformat(timespec='seconds')
+        with self._connect() as conn:
+            rows = conn.execute(
+                "select id, owner, file_path from jobs where status in ('queued', 'running')"
+            ).fetchall()
+            for row in rows:
+                owner_host, _, pid = row['owner'].rpartition(':')
+                if owner_host != host or (pid.isdigit() and _process_alive(int(pid)) and row['owner'] != self.owner):
+                    continue
+                conn.execute(
+                    "update jobs set status = 'failed', error = ?, finished_at = ? where id = ?",
+                    ('The server restarted before the job finished; please try again.', _now(), row['id'])
+                )
+                self._remove_upload(row['file_path'])
+                print(f"Marked interrupted job {row['id']} as failed")
+            conn.execute("delete from jobs where status in ('succeeded', 'failed') and finished_at < ?", (cutoff,))
+
+    def _update(self, job_id: str, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"update jobs set {assignments} where id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _remove_upload(file_path: Optional[str]):
+        """Delete a job's saved upload (a file, or a batch's directory)."""
+        if file_path:
+            try:
+                if Path(file_path).is_dir():
+                    shutil.rmtree(file_path)
+                else:
+                    Path(file_path).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing job upload {file_path}: {e}")
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {
+            'id': row['id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'type': row['upload_type'],
+            'filename': row['filename'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'result': json.loads(row['result']) if row['result'] else None,
+        }
+        job.update({name: row[name] for name in COUNTERS})
+        return job
+
+    def submit(self, file_path: Path, upload_type: str, filename: Optional[str] = None,
+               files: Optional[Sequence[Tuple[str, Path]]] = None) -> Dict[str, Any]:
+        """
+        Queue a saved upload for the current user (request context required).
+        files: (name, path) pairs to import as one batch; file_path is then
+        the directory holding them.
+        The job owns file_path from here on and deletes it when done.
+        Raises JobQueueFull when this process already has JOB_MAX_PENDING jobs.
+        """
+        def work(progress: _ProgressReporter) -> Outcome:
+            if files:
+                result = self.pipeline_service.process_files(
+                    [path for _, path in files], upload_type,
+                    names=[name for name, _ in files], progress=progress
+                )
+            else:
+                result = self.pipeline_service.process_file(file_path, upload_type, progress=progress)
+            if result['success']:
+                return True, self._summarize(result), None
+            partial = {key: result[key] for key in ('stats', 'files') if result.get(key)} or None
+            return False, partial, f"Processing failed: {result.get('error')}"
+
+        return self._enqueue(upload_type, filename or Path(file_path).name, work, file_path)
+
+    def submit_task(self, job_type: str, label: str, task: Callable[[_ProgressReporter], Outcome]) -> Dict[str, Any]:
+        """
+        Queue other background work for the current user (request context required).
+        task(progress) runs in an app context with the user's g.user/g.token and
+        returns (succeeded, result dict or None, error message or None).
+        Raises JobQueueFull like submit().
+        """
+        return self._enqueue(job_type, label, task)
+
+    def _enqueue(self, job_type: str, label: str, work: Callable[[_ProgressReporter], Outcome],
+                 file_path: Optional[Path] = None) -> Dict[str, Any]:
+        with self._pending_lock:
+            if len(self._pending) >= JOB_MAX_PENDING:
+                raise JobQueueFull("Too many jobs are being processed; try again shortly")
+            job_id = uuid.uuid4().hex
+            self._pending[job_id] = (g.token, g.user)
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "insert into jobs (id, user_id, owner, status, stage, upload_type, filename, file_path, created_at) "
+                    "values (?, ?, ?, 'queued', 'queued', ?, ?, ?, ?)",
+                    (job_id, g.user.id, self.owner, job_type, label,
+                     str(file_path) if file_path else None, _now())
+                )
+            self.executor.submit(self._run, job_id, work, file_path)
+        except Exception:
+            with self._pending_lock:
+                self._pending.pop(job_id, None)
+            raise
+        print(f"Queued {job_type} job {job_id} ({label})")
+        return self.get_job(job_id, user_id=g.user.id)
+
+    @staticmethod
+    def _summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+        """The stored result of a successful pipeline run."""
+        stats = result.get('stats', {})
+        message = f"Imported: {stats.get('imported', 0)}, Duplicates: {stats.get('duplicates', 0)}"
+        if stats.get('errors', 0) > 0:
+            message += f", Errors: {stats.get('errors')}"
+        if 'files' in result:
+            processed = sum(1 for f in result['files'] if f['success'])
+            message = f"{processed} of {len(result['files'])} files processed. {message}"
+        else:
+            message = f"File processed successfully. {message}"
+        summary = {
+            'message': message,
+            'stats': stats,
+            'categorization': result.get('categorization', {}),
+            'timings': result.get('timings', {})
+        }
+        for key in ('chunks', 'files'):
+            if key in result:
+                summary[key] = result[key]
+        return summary
+
+    def _run(self, job_id: str, work: Callable[[_ProgressReporter], Outcome], file_path: Optional[Path] = None):
+        """Worker thread: run one job and record the outcome."""
+        token, user = self._pending[job_id]
+        try:
+            expires_at = getattr(user, 'expires_at', None)
+            if expires_at is not None and expires_at <= time.time():
+                raise PermissionError("Your session expired before the job started; please try again.")
+
+            self._update(job_id, status='running', stage='starting', started_at=_now())
+            reporter = _ProgressReporter(self, job_id)
+            with self.app.app_context():
+                g.user = user
+                g.token = token
+                succeeded, result, error = work(reporter)
+
+            fields = dict(reporter.counters, stage='done', finished_at=_now(),
+                          result=dumps(result).decode('utf-8') if result else None)
+            if succeeded:
+                self._update(job_id, status='succeeded', **fields)
+            else:
+                self._update(job_id, status='failed', error=error, **fields)
+            print(f"Job {job_id} finished: {'succeeded' if succeeded else 'failed'}")
+
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            try:
+                self._update(job_id, status='failed', stage='done', error=str(e), finished_at=_now())
+            except sqlite3.Error as db_error:
+                print(f"Error recording failure of job {job_id}: {db_error}")
+        finally:
+            self._remove_upload(str(file_path) if file_path else None)
+            with self._pending_lock:
+                self._pending.pop(job_id, None)
+
+    def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """A job as a dict, or None if it doesn't exist (or belongs to another user)."""
+        user_id = user_id or g.user.id
+        with self._connect() as conn:
+            row = conn.execute("select * from jobs where id = ? and user_id = ?", (job_id, user_id)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """The current user's most recent jobs, newest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "select * from jobs where user_id = ? order by created_at desc, rowid desc limit ?",
+                (g.user.id, limit)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
@@ -1,55 +1,384 @@
 """
 Pipeline Service for orchestrating the ETL process via Supabase.
 """
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, Iterator, List, Optional, Sequence, Tuple
 import pandas as pd
 import shutil
 
-from etl.extractors import CreditExtractor, DebitExtractor
+from etl.extractors import CreditExtractor, DebitExtractor, extract_file
 from etl.transformers import TransactionTransformer
 from services.transaction_service import TransactionService
-from config import CATEGORIES_FILE
+from services.supabase_service import SupabaseService
+from models.transaction import transaction_signature
+from utils.dates import format_dates
+from utils.metrics import track_stage, UPLOADS_TOTAL
+from utils.concurrency import prefetch
+from config import (
+    CATEGORIES_FILE, PIPELINE_STREAM_MIN_BYTES, PIPELINE_CHUNK_ROWS, PIPELINE_QUEUE_DEPTH, BATCH_EXTRACT_WORKERS
+)
+
+Progress = Optional[Callable[..., None]]
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Shared pool for CPU-bound extraction. Spawned, not forked: the server process has threads."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max(1, BATCH_EXTRACT_WORKERS), mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _merge_counts(total: Dict[str, Any], part: Dict[str, Any]):
+    """Add a chunk's numeric counters into the running totals (other values: last one wins)."""
+    for key, value in part.items():
+        if isinstance(value, int) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+        else:
+            total[key] = value
 
 class PipelineService:
     """Orchestrates the ETL pipeline -> Supabase."""
     
-    def __init__(self):
-        from services import RuleService  # Lazy import
+    def __init__(self, backend=None, cache=None):
+        """
+        backend/cache: optional categorizer backend and categorization cache
+        overrides (e.g. a FakeBackend for offline benchmarking).
+        """
+        from services import RuleService, HistoryService  # Lazy import
         self.rule_service = RuleService()
+        self.history_service = HistoryService()
         self.credit_extractor = CreditExtractor()
         self.debit_extractor = DebitExtractor()
-        self.transformer = TransactionTransformer(CATEGORIES_FILE, self.rule_service)
+        self.transformer = TransactionTransformer(
+            CATEGORIES_FILE, self.rule_service, cache=cache,
+            history_provider=self.history_service.get_model, backend=backend
+        )
         self.transaction_service = TransactionService()
         
-    def process_file(self, file_path: Path, upload_type: str) -> Dict[str, Any]:
+    def process_file(self, file_path: Path, upload_type: str, dry_run: bool = False,
+                     chunk_rows: Optional[int] = None, progress: Progress = None) -> Dict[str, Any]:
         """
         Process a single new file and import to Supabase.
+        dry_run: extract and transform only, skipping the Supabase import.
+        chunk_rows: stream the file through the pipeline this many rows at a time
+        (default: only for files of at least PIPELINE_STREAM_MIN_BYTES).
+        progress: optional callback for background jobs, called with stage='extract'
+        / 'transform' / 'load' as stages start and with counter increments
+        (rows_read, rows_processed, llm_batches_total, llm_batches_done).
+        The result includes 'timings': seconds per stage and sub-stage for this upload.
         """
+        if chunk_rows is None:
+            path = Path(file_path)
+            if path.exists() and path.stat().st_size >= PIPELINE_STREAM_MIN_BYTES:
+                chunk_rows = PIPELINE_CHUNK_ROWS
+        if chunk_rows:
+            return self._process_stream(file_path, upload_type, dry_run, chunk_rows, progress)
+        
+        report = progress or (lambda **_: None)
+        timings = {}
         try:
-            # 1. Extract
-            extractor = self.credit_extractor if upload_type == 'credit' else self.debit_extractor
-            df = extractor.extract(file_path)
-            
-            if df.empty:
-                return {'success': False, 'error': 'No data extracted'}
+            with track_stage('total', timings):
+                # 1. Extract
+                report(stage='extract')
+                with track_stage('extract', timings) as span:
+                    extractor = self.credit_extractor if upload_type == 'credit' else self.debit_extractor
+                    df = extractor.extract(file_path)
+                    span.rows = len(df)
+                    span.bytes = Path(file_path).stat().st_size
+                report(rows_read=len(df))
                 
-            # 2. Transform
-            df = self.transformer.transform(df, transaction_type=upload_type)
-            
-            # 3. Load (Import to Supabase)
-            stats = self.transaction_service.import_transactions(df)
+                if df.empty:
+                    UPLOADS_TOTAL.inc(type=upload_type, outcome='empty')
+                    return {'success': False, 'error': 'No data extracted', 'timings': timings}
+                    
+                # 2. Transform
+                categorization = {}
+                report(stage='transform')
+                with track_stage('transform', timings) as span:
+                    df = self.transformer.transform(
+                        df,
+                        transaction_type=upload_type,
+                        scope=SupabaseService.get_user_id(),
+                        stats=categorization,
+                        timings=timings,
+                        progress=progress
+                    )
+                    span.rows = len(df)
+                
+                # 3. Load (Import to Supabase)
+                if dry_run:
+                    stats = {'rows': len(df), 'dry_run': True}
+                else:
+                    report(stage='load')
+                    with track_stage('load', timings) as span:
+                        stats = self.transaction_service.import_transactions(
+                            df, account_type=upload_type, timings=timings
+                        )
+                        span.rows = stats.get('imported', 0)
+                report(rows_processed=len(df))
             
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='success')
             return {
                 'success': True,
-                'stats': stats
+                'stats': stats,
+                'categorization': categorization,
+                'timings': timings
             }
             
         except Exception as e:
             print(f"Pipeline processing failed: {e}")
             import traceback
             traceback.print_exc()
-            return {'success': False, 'error': str(e)}
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='error')
+            return {'success': False, 'error': str(e), 'timings': timings}
+
+    def _extract_chunks(self, file_path: Path, upload_type: str, chunk_rows: int,
+                        timings: Dict[str, float]) -> Iterator[pd.DataFrame]:
+        """Yield extracted chunks, timing each read under 'extract'."""
+        extractor = self.credit_extractor if upload_type == 'credit' else self.debit_extractor
+        chunks = iter(extractor.extract_chunks(file_path, chunk_rows))
+        first = True
+        while True:
+            with track_stage('extract', timings) as span:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    span.rows = len(chunk)
+                if first:
+                    span.bytes = Path(file_path).stat().st_size
+                    first = False
+            if chunk is None:
+                return
+            yield chunk
+
+    def _process_stream(self, file_path: Path, upload_type: str, dry_run: bool,
+                        chunk_rows: int, progress: Progress = None) -> Dict[str, Any]:
+        """
+        process_file for large files: chunks are read on a background thread
+        (at most PIPELINE_QUEUE_DEPTH ahead) while the current chunk is
+        categorized and imported, so memory is bounded by a few chunks rather
+        than the file size. Stats and timings are summed over chunks.
+        """
+        report = progress or (lambda **_: None)
+        timings = {}
+        stats = {'rows': 0, 'dry_run': True} if dry_run else {'imported': 0, 'duplicates': 0, 'errors': 0}
+        categorization = {}
+        rows_read = 0
+        chunk_count = 0
+        try:
+            with track_stage('total', timings):
+                scope = SupabaseService.get_user_id()
+                report(stage='extract')
+                chunks = prefetch(self._extract_chunks(file_path, upload_type, chunk_rows, timings),
+                                  PIPELINE_QUEUE_DEPTH)
+                for chunk in chunks:
+                    rows_read += len(chunk)
+                    chunk_count += 1
+                    report(stage='transform', rows_read=len(chunk))
+                    
+                    chunk_categorization = {}
+                    with track_stage('transform', timings) as span:
+                        chunk = self.transformer.transform(
+                            chunk,
+                            transaction_type=upload_type,
+                            scope=scope,
+                            stats=chunk_categorization,
+                            timings=timings,
+                            progress=progress
+                        )
+                        span.rows = len(chunk)
+                    _merge_counts(categorization, chunk_categorization)
+                    
+                    if dry_run:
+                        stats['rows'] += len(chunk)
+                        report(rows_processed=len(chunk))
+                        continue
+                    report(stage='load')
+                    with track_stage('load', timings) as span:
+                        part = self.transaction_service.import_transactions(
+                            chunk, account_type=upload_type, timings=timings
+                        )
+                        span.rows = part.get('imported', 0)
+                    _merge_counts(stats, part)
+                    report(rows_processed=len(chunk))
+                    print(f"Chunk {chunk_count}: {rows_read} rows read, {stats['imported']} imported so far")
+            
+            if rows_read == 0:
+                UPLOADS_TOTAL.inc(type=upload_type, outcome='empty')
+                return {'success': False, 'error': 'No data extracted', 'timings': timings}
+            
+            payload_rows = categorization.get('llm_payload_rows', 0)
+            if payload_rows:
+                tokens = categorization.get('llm_prompt_tokens', 0) + categorization.get('llm_output_tokens', 0)
+                categorization['llm_tokens_per_row'] = round(tokens / payload_rows, 1)
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='success')
+            return {
+                'success': True,
+                'stats': stats,
+                'categorization': categorization,
+                'chunks': chunk_count,
+                'timings': timings
+            }
+            
+        except Exception as e:
+            print(f"Pipeline processing failed after {chunk_count} chunks: {e}")
+            import traceback
+            traceback.print_exc()
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='error')
+            # Chunks already imported stay imported (re-uploading is idempotent)
+            return {'success': False, 'error': str(e), 'stats': stats, 'timings': timings}
+
+    @staticmethod
+    def _extract_many(paths: Sequence[Path], upload_type: str) -> List[Tuple[Optional[pd.DataFrame], Optional[str]]]:
+        """
+        Extract files in parallel on the process pool; (frame, None) or (None, error) per file,
+        in input order. Falls back to extracting in-process if the pool is unavailable.
+        """
+        results: List[Tuple[Optional[pd.DataFrame], Optional[str]]] = []
+        if len(paths) > 1:
+            try:
+                futures = [_get_process_pool().submit(extract_file, str(p), upload_type) for p in paths]
+                for future in futures:
+                    try:
+                        results.append((future.result(), None))
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        results.append((None, str(e)))
+                return results
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                print(f"Process pool unavailable ({e}); extracting in-process")
+                _reset_process_pool()
+                results = []
+        for path in paths:
+            try:
+                results.append((extract_file(str(path), upload_type), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    @staticmethod
+    def _drop_cross_file_duplicates(frames: List[pd.DataFrame]) -> Tuple[pd.DataFrame, int]:
+        """
+        Concatenate extracted frames, dropping rows whose import signature already
+        appeared in an earlier file (overlapping statement periods). Duplicates
+        within a single file are left for import_transactions to count as before.
+        """
+        keyed = []
+        for index, frame in enumerate(frames):
+            amounts = pd.to_numeric(frame['Amount'], errors='coerce').fillna(0.0)
+            signatures = [
+                transaction_signature(d, desc, a) if d is not None else None
+                for d, desc, a in zip(format_dates(frame['Transaction Date']),
+                                      frame['Description'].astype(str), amounts)
+            ]
+            keyed.append(frame.assign(_signature=signatures, _file=index))
+        merged = pd.concat(keyed, ignore_index=True)
+
+        first_file = merged.groupby('_signature', sort=False)['_file'].transform('min')
+        duplicate = merged['_signature'].notna() & (merged['_file'] != first_file)
+        merged = merged.loc[~duplicate].drop(columns=['_signature', '_file']).reset_index(drop=True)
+        return merged, int(duplicate.sum())
+
+    def process_files(self, file_paths: Sequence[Path], upload_type: str, dry_run: bool = False,
+                      names: Optional[Sequence[str]] = None, progress: Progress = None) -> Dict[str, Any]:
+        """
+        Process several statement files as one import: files are extracted in
+        parallel worker processes, merged and de-duplicated across files, then
+        categorized once and loaded with one import_transactions call.
+        names: display names for the per-file results (default: file names).
+        progress: optional job progress callback (see process_file).
+        Files that fail to extract are reported in 'files' and skipped.
+        """
+        report = progress or (lambda **_: None)
+        timings = {}
+        names = list(names) if names is not None else [Path(p).name for p in file_paths]
+        files = []
+        try:
+            with track_stage('total', timings):
+                report(stage='extract')
+                with track_stage('extract', timings) as span:
+                    extracted = self._extract_many(list(file_paths), upload_type)
+                    frames = []
+                    for name, path, (frame, error) in zip(names, file_paths, extracted):
+                        if error is not None:
+                            files.append({'file': name, 'success': False, 'error': error})
+                        else:
+                            files.append({'file': name, 'success': True, 'rows': len(frame)})
+                            if not frame.empty:
+                                frames.append(frame)
+                    span.rows = sum(len(f) for f in frames)
+                    span.bytes = sum(Path(p).stat().st_size for p in file_paths if Path(p).exists())
+                report(rows_read=sum(len(f) for f in frames))
+                
+                if not frames:
+                    UPLOADS_TOTAL.inc(type=upload_type, outcome='empty')
+                    return {'success': False, 'error': 'No data extracted', 'files': files, 'timings': timings}
+                
+                with track_stage('transform.merge', timings):
+                    df, cross_file_duplicates = self._drop_cross_file_duplicates(frames)
+                    del frames
+                
+                categorization = {}
+                report(stage='transform')
+                with track_stage('transform', timings) as span:
+                    df = self.transformer.transform(
+                        df,
+                        transaction_type=upload_type,
+                        scope=SupabaseService.get_user_id(),
+                        stats=categorization,
+                        timings=timings,
+                        progress=progress
+                    )
+                    span.rows = len(df)
+                
+                if dry_run:
+                    stats = {'rows': len(df), 'dry_run': True}
+                else:
+                    report(stage='load')
+                    with track_stage('load', timings) as span:
+                        stats = self.transaction_service.import_transactions(
+                            df, account_type=upload_type, timings=timings
+                        )
+                        span.rows = stats.get('imported', 0)
+                report(rows_processed=len(df))
+                stats['cross_file_duplicates'] = cross_file_duplicates
+                if not dry_run:
+                    stats['duplicates'] = stats.get('duplicates', 0) + cross_file_duplicates
+            
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='success')
+            return {
+                'success': True,
+                'stats': stats,
+                'categorization': categorization,
+                'files': files,
+                'timings': timings
+            }
+            
+        except Exception as e:
+            print(f"Batch pipeline processing failed: {e}")
+            import traceback
+            traceback.print_exc()
+            UPLOADS_TOTAL.inc(type=upload_type, outcome='error')
+            return {'success': False, 'error': str(e), 'files': files, 'timings': timings}
 
     # Deprecated methods needed to keep generic calls happy for now?
     # Or strict rewrite? Strict rewrite is cleaner.
@@ -58,6 +387,6 @@ class PipelineService:
         """Proxy to TransactionService."""
         return self.transaction_service.update_transaction(transaction_id, updates)
 
-    def bulk_update_transactions(self, updates: List[Dict[str, Any]]) -> int:
+    def bulk_update_transactions(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Proxy to TransactionService."""
         return self.transaction_service.bulk_update_transactions(updates)
@@ -0,0 +1,292 @@
+"""
+Service for recategorizing stored transactions after a rule changes.
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+from flask import g
+
+from services.supabase_service import SupabaseService
+from services.transaction_service import TransactionService
+from etl.transformers import TransactionTransformer, rule_tokens
+from etl.rule_engine import RuleEngine
+from models.rule import Rule
+from utils.dates import parse_dates, ISO_DATE_FORMAT
+from config import CATEGORIES_FILE, RECATEGORIZE_BATCH_SIZE
+
+
+def token_regex(token: str) -> str:
+    """
+    POSIX regex matching a compacted rule token in a raw description, allowing
+    punctuation/spaces between characters (so ETRANSFER matches "E-TRANSFER").
+    """
+    return '[^A-Za-z0-9]*'.join(re.escape(c) for c in token)
+
+
+def merchant_tokens(rule: Rule, categories: Sequence[str] = ()) -> set:
+    """
+    Merchant words a free-text rule names: its rule tokens minus the words of
+    category names and of its own targets ("Starbucks is Coffee" -> STARBUCKS).
+    """
+    targets = ' '.join([*categories, rule.category or '', rule.rename or ''])
+    return rule_tokens([rule]) - rule_tokens([Rule(content=targets)])
+
+
+def merchant_pattern(tokens) -> str:
+    """
+    Regex (valid in both Postgres and Python) matching any of the tokens as a
+    whole word of a description, so BAR doesn't match "BARNES & NOBLE".
+    """
+    words = '|'.join(token_regex(t) for t in sorted(tokens))
+    return f'(?:^|[^A-Za-z0-9])(?:{words})(?:[^A-Za-z0-9]|$)'
+
+
+class RecategorizationService:
+    """
+    Recategorizes only the stored transactions a rule change can affect.
+
+    The affected set is computed from the old and new versions of the rule
+    (type, pattern, amount and date constraints, rename target) and pushed
+    down into the Supabase query, then narrowed to the rows either version
+    actually matches; those rows are re-run through the categorizer in
+    batches and only rows whose category/description actually changed are
+    written back with a bulk update. Rows the user edited by hand are left
+    alone. Rule edits run this as a background job (queue_rule_change).
+
+    Free-text rules select rows by the merchant words they name (whole words,
+    never the category they assign). A free-text rule naming no merchant can
+    apply to any row; those rows keep the history model, so labels it learned
+    for merchants outside the rule survive.
+    """
+
+    PAGE_SIZE = 1000
+    COLUMNS = 'id, transaction_date, description, amount, category, account_type'
+
+    def __init__(self):
+        from services import RuleService  # Lazy import
+        self.rule_service = RuleService()
+        self.transaction_service = TransactionService()
+        self.transformer = TransactionTransformer(CATEGORIES_FILE, self.rule_service)
+
+    def get_client(self):
+        if 'token' not in g:
+            raise Exception("No authenticated user found")
+        return SupabaseService.get_auth_client(g.token)
+
+    def _base_query(self, rule: Rule):
+        query = self.get_client().table('transactions').select(self.COLUMNS)
+        # Typed rules only touch rows imported through that upload type
+        if rule.rule_type in ('credit', 'debit'):
+            query = query.eq('account_type', rule.rule_type)
+        if TransactionService._user_edited_available:
+            query = query.eq('user_edited', False)
+        return query
+
+    def _fetch_pages(self, build_query) -> List[Dict[str, Any]]:
+        rows = []
+        start = 0
+        while True:
+            response = build_query().order('id').range(start, start + self.PAGE_SIZE - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < self.PAGE_SIZE:
+                return rows
+            start += self.PAGE_SIZE
+
+    def _fetch_affected(self, rule: Rule) -> List[Dict[str, Any]]:
+        """Stored rows the given rule could apply to (a superset is fine, never a subset)."""
+        queries = []
+
+        if rule.is_structured:
+            def structured(with_pattern=True):
+                query = self._base_query(rule)
+                if rule.pattern and with_pattern:
+                    query = query.filter('description', 'imatch', rule.pattern)
+                if rule.min_amount is not None:
+                    query = query.gte('amount', rule.min_amount)
+                if rule.max_amount is not None:
+                    query = query.lte('amount', rule.max_amount)
+                if rule.start_date:
+                    query = query.gte('transaction_date', rule.start_date)
+                if rule.end_date:
+                    query = query.lte('transaction_date', rule.end_date)
+                return query
+            queries.append(structured)
+        else:
+            tokens = merchant_tokens(rule, self.transformer.categories)
+            if tokens:
+                pattern = merchant_pattern(tokens)
+                queries.append(lambda with_pattern=True: self._base_query(rule).filter('description', 'imatch', pattern)
+                               if with_pattern else self._base_query(rule))
+            else:
+                # A free-text rule naming no merchant can touch any row of its type
+                queries.append(lambda with_pattern=True: self._base_query(rule))
+
+        # Rows the rule renamed no longer match its pattern; find them by the new name
+        if rule.rename:
+            queries.append(lambda with_pattern=True: self._base_query(rule).eq('description', rule.rename))
+
+        rows = {}
+        for build in queries:
+            for row in self._fetch_query(build):
+                rows[row['id']] = row
+        return list(rows.values())
+
+    def _fetch_query(self, build) -> List[Dict[str, Any]]:
+        try:
+            return self._fetch_pages(build)
+        except Exception as e:
+            if TransactionService._user_edited_available and 'user_edited' in str(e):
+                TransactionService._user_edited_available = False
+                print("transactions.user_edited not deployed (migration 008); recategorizing hand-edited rows too")
+                return self._fetch_query(build)
+            # e.g. a Python-only regex construct Postgres can't compile: widen the query
+            print(f"Affected-row query failed ({e}); retrying without the pattern filter")
+            return self._fetch_pages(lambda: build(with_pattern=False))
+
+    @staticmethod
+    def _matches(rule: Rule, df: pd.DataFrame, categories: Sequence[str] = ()) -> pd.Series:
+        """
+        Rows of df (stored transactions) the rule applies to, or that carry its
+        rename target. Free-text rules match on the merchant words they name
+        (every row, if they name none); categories are never merchant words.
+        """
+        descriptions = df['description'].fillna('').astype(str)
+        if rule.is_structured:
+            mask = RuleEngine([rule]).build_mask(
+                rule, descriptions, pd.to_numeric(df['amount'], errors='coerce'),
+                parse_dates(df['transaction_date'], ISO_DATE_FORMAT)
+            )
+        else:
+            tokens = merchant_tokens(rule, categories)
+            if tokens:
+                mask = descriptions.str.contains(merchant_pattern(tokens), case=False, regex=True)
+            else:
+                mask = pd.Series(True, index=df.index)
+        if rule.rename:
+            mask |= descriptions == rule.rename
+        if rule.rule_type in ('credit', 'debit'):
+            mask &= df['account_type'] == rule.rule_type
+        return mask
+
+    def on_rule_changed(self, old_rule: Optional[Rule], new_rule: Optional[Rule],
+                        progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """
+        Recategorize the rows affected by a rule being added (old_rule=None),
+        updated, or deleted (new_rule=None). Returns counters for the run.
+        progress: optional job progress callback (rows_read, rows_processed).
+        """
+        report = progress or (lambda **_: None)
+        stats = {'affected': 0, 'unmatched': 0, 'updated': 0, 'unchanged': 0, 'unresolved': 0, 'failed': 0,
+                 'delete_skipped': 0, 'batches': 0}
+        try:
+            report(stage='fetch')
+            affected = {}
+            for rule in (old_rule, new_rule):
+                if rule is not None:
+                    for row in self._fetch_affected(rule):
+                        affected[row['id']] = row
+            if not affected:
+                return stats
+
+            # The queries return a superset; keep the rows either version of the rule matches.
+            # Rows matched only because a free-text rule names no merchant are not targeted.
+            categories = self.transformer.categories
+            candidates = pd.DataFrame(list(affected.values()))
+            matched = pd.Series(False, index=candidates.index)
+            targeted = pd.Series(False, index=candidates.index)
+            for rule in (old_rule, new_rule):
+                if rule is not None:
+                    mask = self._matches(rule, candidates, categories)
+                    matched |= mask
+                    if rule.is_structured or merchant_tokens(rule, categories):
+                        targeted |= mask
+            rows = [dict(row, _targeted=bool(target))
+                    for row, keep, target in zip(affected.values(), matched, targeted) if keep]
+            stats['affected'] = len(rows)
+            stats['unmatched'] = len(affected) - len(rows)
+            report(stage='recategorize', rows_read=len(rows))
+
+            for i in range(0, len(rows), RECATEGORIZE_BATCH_SIZE):
+                batch = rows[i:i + RECATEGORIZE_BATCH_SIZE]
+                self._recategorize_batch(batch, stats)
+                stats['batches'] += 1
+                report(rows_processed=len(batch))
+
+            print(f"Recategorization after rule change: {stats}")
+            return stats
+
+        except Exception as e:
+            print(f"Error recategorizing after rule change: {e}")
+            import traceback
+            traceback.print_exc()
+            stats['error'] = str(e)
+            return stats
+
+    def _recategorize_batch(self, rows: List[Dict[str, Any]], stats: Dict[str, Any]):
+        df = pd.DataFrame(rows).rename(columns={
+            'transaction_date': 'Transaction Date',
+            'description': 'Description',
+            'amount': 'Amount',
+            'category': 'Category',
+        })
+        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0.0)
+        df['Transaction Date'] = parse_dates(df['Transaction Date'], ISO_DATE_FORMAT)
+        df['account_type'] = df['account_type'].fillna('both')
+        if '_targeted' not in df.columns:
+            df['_targeted'] = True
+
+        updates = []
+        for (account_type, targeted), group in df.groupby(['account_type', '_targeted'], sort=False):
+            previous = group[['id', 'Category', 'Description']].copy()
+            result = self.transformer.categorize(
+                group[['Transaction Date', 'Description', 'Amount']],
+                transaction_type=account_type,
+                scope=SupabaseService.get_user_id(),
+                # History was learned partly from the rule's own past output, so rows
+                # the rule names skip it; the rest keep their learned labels
+                use_history=not targeted
+            )
+            for tx_id, old_category, old_desc, new_category, new_desc in zip(
+                previous['id'], previous['Category'], previous['Description'],
+                result['Category'], result['Description']
+            ):
+                if new_category == 'DELETE':
+                    # Never delete stored history because a rule was edited
+                    stats['delete_skipped'] += 1
+                    continue
+                changes = {}
+                if new_category == 'Uncategorized' and old_category != 'Uncategorized':
+                    # Don't wipe a known category because the LLM was unsure or unavailable
+                    stats['unresolved'] += 1
+                elif new_category != old_category:
+                    changes['category'] = new_category
+                if new_desc != old_desc:
+                    changes['description'] = new_desc
+                if changes:
+                    updates.append({'id': tx_id, 'updates': changes})
+                else:
+                    stats['unchanged'] += 1
+
+        if updates:
+            result = self.transaction_service.bulk_update_transactions(updates, user_edit=False)
+            stats['updated'] += len(result['updated'])
+            stats['failed'] += len(result['failed'])
+
+    def queue_rule_change(self, old_rule: Optional[Rule], new_rule: Optional[Rule], job_service) -> Dict[str, Any]:
+        """
+        Run on_rule_changed as a background job for the current user, so the
+        rule edit returns without waiting for it. Returns the queued job.
+        Raises JobQueueFull when the job queue is at capacity.
+        """
+        rule = new_rule or old_rule
+        action = 'added' if old_rule is None else 'deleted' if new_rule is None else 'updated'
+
+        def task(progress):
+            stats = self.on_rule_changed(old_rule, new_rule, progress)
+            message = f"Recategorized {stats['updated']} of {stats['affected']} matching transactions"
+            if 'error' in stats:
+                return False, {'stats': stats}, f"Recategorization failed: {stats['error']}"
+            return True, {'message': message, 'stats': stats}, None
+
+        return job_service.submit_task('recategorize', f"Rule {action}: {(rule.content or rule.pattern or '')[:80]}", task)
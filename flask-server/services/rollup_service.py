@@ -0,0 +1,192 @@
+"""
+Service that maintains the per user x month x category x sign rollup table.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import g
+
+from services.supabase_service import SupabaseService
+from utils.metrics import track_supabase, json_size
+
+
+def _month_start(value: Any) -> Optional[str]:
+    """'YYYY-MM-01' for a 'YYYY-MM-DD...' date string (None if unparseable)."""
+    try:
+        return date.fromisoformat(str(value)[:10]).replace(day=1).isoformat()
+    except ValueError:
+        return None
+
+
+def _sign(amount: float) -> int:
+    return (amount > 0) - (amount < 0)
+
+
+def _group_key(row: Dict[str, Any]) -> Optional[Tuple[str, str, int, float]]:
+    month = _month_start(row.get('transaction_date'))
+    if month is None:
+        return None
+    try:
+        amount = float(row.get('amount') or 0)
+    except (TypeError, ValueError):
+        amount = 0.0
+    category = str(row.get('category') or '').strip() or 'Uncategorized'
+    return month, category, _sign(amount), amount
+
+
+def compute_deltas(added: Iterable[Dict[str, Any]] = (),
+                   removed: Iterable[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+    """
+    Rollup deltas for transaction rows (with transaction_date, category, amount)
+    that were added and/or removed. An update is a removal of the old row plus
+    an addition of the new one; groups with nothing added or removed are dropped.
+    min/max are the extremes of the added amounts and removed_min/removed_max
+    those of the removed ones, so the database knows when a group's stored
+    extreme may have left and must be recomputed.
+    """
+    groups: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+    for rows, direction in ((added, 1), (removed, -1)):
+        for row in rows:
+            key = _group_key(row)
+            if key is None:
+                continue
+            month, category, sign, amount = key
+            delta = groups.setdefault((month, category, sign), {
+                'month': month, 'category': category, 'sign': sign,
+                'count': 0, 'total': 0.0, 'min': None, 'max': None,
+                'removed_min': None, 'removed_max': None
+            })
+            delta['count'] += direction
+            delta['total'] += direction * amount
+            low, high = ('min', 'max') if direction > 0 else ('removed_min', 'removed_max')
+            delta[low] = amount if delta[low] is None else min(delta[low], amount)
+            delta[high] = amount if delta[high] is None else max(delta[high], amount)
+
+    deltas = []
+    for delta in groups.values():
+        if delta['min'] is None and delta['removed_min'] is None:
+            continue
+        delta['total'] = round(delta['total'], 2)
+        deltas.append(delta)
+    return deltas
+
+
+class RollupService:
+    """
+    Keeps transaction_rollups in step with writes (via apply_rollup_deltas)
+    and serves stats from it. Every method is best-effort: failures are logged
+    and the rollups can be repaired with rebuild().
+    """
+
+    _available = True  # False once the table/RPCs turn out not to be deployed
+
+    def get_client(self):
+        if 'token' not in g:
+            raise Exception("No authenticated user found")
+        return SupabaseService.get_auth_client(g.token)
+
+    @staticmethod
+    def _missing(error: Exception) -> bool:
+        message = str(error)
+        return any(marker in message for marker in ('PGRST202', 'PGRST205', '42P01', 'Could not find'))
+
+    def apply(self, added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = ()):
+        """Apply the deltas for added/removed rows. Never raises."""
+        if not RollupService._available:
+            return
+        deltas = compute_deltas(added, removed)
+        if not deltas:
+            return
+        try:
+            with track_supabase('transaction_rollups', 'apply_deltas') as span:
+                span.rows = len(deltas)
+                span.bytes = json_size(deltas)
+                self.get_client().rpc('apply_rollup_deltas', {'p_deltas': deltas}).execute()
+        except Exception as e:
+            if self._missing(e):
+                RollupService._available = False
+                print("Rollup table not deployed (migration 004); stats will aggregate on demand")
+                return
+            print(f"Error applying rollup deltas, rebuilding: {e}")
+            self.rebuild()
+
+    def rebuild(self) -> Optional[int]:
+        """Recompute the current user's rollups from their transactions. Returns the group count."""
+        try:
+            with track_supabase('transaction_rollups', 'rebuild'):
+                response = self.get_client().rpc('rebuild_transaction_rollups', {}).execute()
+            RollupService._available = True
+            return response.data
+        except Exception as e:
+            print(f"Error rebuilding rollups: {e}")
+            return None
+
+    @staticmethod
+    def covers(start_date: Optional[str], end_date: Optional[str]) -> bool:
+        """Whether a date window falls on month boundaries (so monthly rollups answer it exactly)."""
+        if start_date and date.fromisoformat(start_date).day != 1:
+            return False
+        if end_date and (date.fromisoformat(end_date) + timedelta(days=1)).day != 1:
+            return False
+        return True
+
+    def _has_rollups(self) -> bool:
+        """Whether the current user has any rollup rows at all."""
+        with track_supabase('transaction_rollups', 'select_any') as span:
+            response = self.get_client().table('transaction_rollups').select('month').limit(1).execute()
+            span.rows = len(response.data)
+        return bool(response.data)
+
+    def get_groups(self, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Per (month, category) groups in the shape of the transaction_rollup RPC,
+        read from the rollup table. Returns None when the rollups can't answer
+        (not deployed, window not month-aligned, not built for this user yet,
+        or an error).
+        """
+        if not RollupService._available or not self.covers(start_date, end_date):
+            return None
+        try:
+            query = self.get_client().table('transaction_rollups')\
+                .select('month, category, sign, txn_count, total, min_amount, max_amount')
+            if start_date:
+                query = query.gte('month', start_date)
+            if end_date:
+                query = query.lte('month', end_date)
+            with track_supabase('transaction_rollups', 'select') as span:
+                response = query.execute()
+                span.rows = len(response.data)
+                span.bytes = json_size(response.data)
+            if not response.data and not self._has_rollups():
+                # Never built for this user (e.g. history imported before migration 004)
+                return None
+        except Exception as e:
+            if self._missing(e):
+                RollupService._available = False
+            print(f"Error reading rollups: {e}")
+            return None
+
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in response.data:
+            key = (str(row['month'])[:7], row['category'])
+            group = groups.setdefault(key, {
+                'month': key[0], 'category': key[1], 'txn_count': 0, 'credit_count': 0,
+                'debit_count': 0, 'total': 0.0, 'credits': 0.0, 'debits': 0.0,
+                'min_amount': None, 'max_amount': None
+            })
+            count = int(row['txn_count'])
+            total = float(row['total'])
+            group['txn_count'] += count
+            group['total'] += total
+            if row['sign'] > 0:
+                group['credit_count'] += count
+                group['credits'] += total
+            elif row['sign'] < 0:
+                group['debit_count'] += count
+                group['debits'] += total
+            for field, pick in (('min_amount', min), ('max_amount', max)):
+                if row.get(field) is not None:
+                    value = float(row[field])
+                    group[field] = value if group[field] is None else pick(group[field], value)
+        return list(groups.values())
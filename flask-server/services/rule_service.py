@@ -1,27 +1,55 @@
 """
 Service for managing user-defined rules via Supabase.
 """
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Callable
 from flask import g
 from services.supabase_service import SupabaseService
 from models.rule import Rule
+from etl.categorization_cache import get_categorization_cache
+from utils.metrics import track_supabase, json_size
 
 class RuleService:
     """Service for managing categorization rules via Supabase."""
     
-    def __init__(self):
-        pass
+    # False once we know rules.created_at is missing (migration 001 predates it)
+    _created_at_available = True
+    
+    def __init__(self, on_change: Optional[Callable[[Optional[Rule], Optional[Rule]], Any]] = None):
+        """
+        on_change: optional callback(old_rule, new_rule) run after a rule is
+        added (old_rule=None), updated, or deleted (new_rule=None).
+        """
+        self.on_change = on_change
     
     def get_client(self):
         if 'token' not in g:
             raise Exception("No authenticated user found")
         return SupabaseService.get_auth_client(g.token)
         
+    def _notify(self, old_rule: Optional[Rule], new_rule: Optional[Rule]):
+        """Run the change callback; its failures never fail the rule edit itself."""
+        if not self.on_change:
+            return
+        try:
+            self.on_change(old_rule, new_rule)
+        except Exception as e:
+            print(f"Error handling rule change: {e}")
+
+    def _invalidate_cache(self):
+        """Drop the user's cached categorizations; they were made under the old rules."""
+        user_id = SupabaseService.get_user_id()
+        if user_id:
+            cache = get_categorization_cache()
+            cache.invalidate(scope=user_id)
+            cache.save()
+        
     def get_data(self):
         """Get all rules and metadata (metadata is just legacy now)."""
         try:
-            client = self.get_client()
-            response = client.table('rules').select('*').execute()
+            with track_supabase('rules', 'select') as span:
+                response = self._select_ordered()
+                span.rows = len(response.data)
+                span.bytes = json_size(response.data)
             rules = [Rule.from_dict(r) for r in response.data]
             
             # Supabase doesn't easily store random metadata.
@@ -33,10 +61,40 @@ class RuleService:
             print(f"Error loading rules: {e}")
             return {'rules': [], 'metadata': {}}
             
+    def _select_ordered(self):
+        """
+        Select the user's rules in application order (oldest first, then id).
+        PostgREST's default order is undefined, which would let overlapping rules
+        take turns winning.
+        """
+        query = self.get_client().table('rules').select('*')
+        if RuleService._created_at_available:
+            try:
+                return query.order('created_at').order('id').execute()
+            except Exception as e:
+                if 'created_at' not in str(e):
+                    raise
+                RuleService._created_at_available = False
+                print("rules.created_at missing (re-apply migration 001); ordering rules by id")
+                query = self.get_client().table('rules').select('*')
+        return query.order('id').execute()
+    
     def get_rules(self) -> List[Rule]:
         """Get all rules."""
         return self.get_data()['rules']
 
+    def get_rule(self, rule_id: str) -> Optional[Rule]:
+        """Get a single rule by ID."""
+        try:
+            client = self.get_client()
+            response = client.table('rules').select('*').eq('id', rule_id).execute()
+            if response.data:
+                return Rule.from_dict(response.data[0])
+            return None
+        except Exception as e:
+            print(f"Error loading rule {rule_id}: {e}")
+            return None
+
     def get_last_reprocessed(self) -> Optional[str]:
         """Get last reprocessed timestamp. (Not implemented in DB yet)"""
         return None
@@ -45,18 +103,28 @@ class RuleService:
         """Set last reprocessed timestamp. (Not implemented in DB yet)"""
         pass
             
-    def add_rule(self, content: str, rule_type: str = 'both') -> Rule:
-        """Add a new rule."""
+    def add_rule(self, content: str, rule_type: str = 'both',
+                 conditions: Optional[Dict[str, Any]] = None) -> Rule:
+        """
+        Add a new rule.
+        conditions: optional structured fields (see models.rule.STRUCTURED_FIELDS).
+        """
         try:
             client = self.get_client()
-            response = client.table('rules').insert({
+            row = {
                 'content': content, 
                 'type': rule_type,
                 'user_id': g.user.id
-            }).execute()
+            }
+            # Only send structured columns that are set
+            row.update({k: v for k, v in (conditions or {}).items() if v is not None})
+            response = client.table('rules').insert(row).execute()
             
             if response.data:
-                return Rule.from_dict(response.data[0])
+                self._invalidate_cache()
+                rule = Rule.from_dict(response.data[0])
+                self._notify(None, rule)
+                return rule
             raise Exception("Insert failed")
             
         except Exception as e:
@@ -67,24 +135,38 @@ class RuleService:
         """Delete a rule by ID."""
         try:
             client = self.get_client()
+            old_rule = self.get_rule(rule_id) if self.on_change else None
             # Supabase RLS ensures they can only delete their own
             client.table('rules').delete().eq('id', rule_id).execute()
+            self._invalidate_cache()
+            if old_rule:
+                self._notify(old_rule, None)
             return True
         except Exception as e:
             print(f"Error deleting rule: {e}")
             return False
         
-    def update_rule(self, rule_id: str, content: str, rule_type: str) -> Optional[Rule]:
-        """Update a rule."""
+    def update_rule(self, rule_id: str, content: str, rule_type: str,
+                    conditions: Optional[Dict[str, Any]] = None) -> Optional[Rule]:
+        """
+        Update a rule.
+        conditions: structured fields to change; keys set to None are cleared.
+        """
         try:
             client = self.get_client()
-            response = client.table('rules').update({
+            old_rule = self.get_rule(rule_id) if self.on_change else None
+            changes = {
                 'content': content,
                 'type': rule_type
-            }).eq('id', rule_id).execute()
+            }
+            changes.update(conditions or {})
+            response = client.table('rules').update(changes).eq('id', rule_id).execute()
             
             if response.data:
-                return Rule.from_dict(response.data[0])
+                self._invalidate_cache()
+                rule = Rule.from_dict(response.data[0])
+                self._notify(old_rule, rule)
+                return rule
             return None
         except Exception as e:
             print(f"Error updating rule: {e}")
@@ -1,14 +1,129 @@
 
+import hashlib
 import os
-from supabase import create_client, Client
+import threading
+import time
+from collections import OrderedDict
+from supabase import create_client, Client, ClientOptions
 from flask import request, abort, g
 from functools import wraps
+from typing import List, Optional, Tuple
+
+from services.token_verifier import TokenVerifier, AuthUser, unverified_expiry
+from utils.metrics import SUPABASE_CLIENT_POOL_TOTAL
+
+try:
+    import httpx
+except ImportError:  # Installed with supabase-py; without it clients use their own sessions
+    httpx = None
+
+
+if httpx is not None:
+    class _SharedTransport(httpx.BaseTransport):
+        """Per-client view of the shared transport: closing a client must not close the shared pool."""
+
+        def __init__(self, transport: 'httpx.BaseTransport'):
+            self._transport = transport
+
+        def handle_request(self, request: 'httpx.Request') -> 'httpx.Response':
+            return self._transport.handle_request(request)
+
+        def close(self):
+            pass
+
+
+def _close_client(client: Client):
+    """
+    Close the HTTP sessions a Supabase client owns (PostgREST, auth, and storage/
+    functions if they were used). Sessions over the shared transport only drop
+    their wrapper; sessions the library created itself release their connections.
+    """
+    components = [getattr(client, name, None) for name in ('_postgrest', '_auth', 'auth', '_storage', '_functions')]
+    for component in {id(c): c for c in components if c is not None}.values():
+        for attr in ('session', '_http_client', 'http_client'):
+            close = getattr(getattr(component, attr, None), 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"Error closing Supabase client session: {e}")
+                break
+
+
+class AuthClientPool:
+    """
+    Bounded LRU pool of Supabase clients keyed by access token.
+    A client is reused until its token expires, so a request (and every
+    service it touches) builds at most one client per token.
+    Evicted and expired clients are closed once they haven't been handed out
+    for `close_grace` seconds, so callers still holding one can finish with it.
+    """
+
+    def __init__(self, factory, max_size: int = 64, default_ttl: float = 3600,
+                 closer=_close_client, close_grace: float = 300):
+        self._factory = factory
+        self._closer = closer
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.close_grace = close_grace
+        # token digest -> (client, valid_until, last handed out)
+        self._clients: 'OrderedDict[str, Tuple[Client, float, float]]' = OrderedDict()
+        self._retired: List[Tuple[Client, float]] = []  # (client, last handed out)
+        self._lock = threading.Lock()
+
+    def _close_retired(self, now: float):
+        """Close retired clients past their grace period (outside the lock)."""
+        with self._lock:
+            if not self._retired:
+                return
+            due = [client for client, used in self._retired if now - used >= self.close_grace]
+            self._retired = [(client, used) for client, used in self._retired if now - used < self.close_grace]
+        for client in due:
+            self._closer(client)
+
+    def get(self, token: str, expires_at: Optional[float] = None) -> Client:
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        now = time.time()
+        self._close_retired(now)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._clients[key] = (entry[0], entry[1], now)
+                    self._clients.move_to_end(key)
+                    SUPABASE_CLIENT_POOL_TOTAL.inc(result='hit')
+                    return entry[0]
+                del self._clients[key]
+                self._retired.append((entry[0], entry[2]))
+                SUPABASE_CLIENT_POOL_TOTAL.inc(result='expired')
+            else:
+                SUPABASE_CLIENT_POOL_TOTAL.inc(result='miss')
+
+        # Build outside the lock; a concurrent miss for the same token just builds twice
+        client = self._factory(token)
+        valid_until = expires_at if expires_at is not None else now + self.default_ttl
+        with self._lock:
+            replaced = self._clients.get(key)
+            if replaced is not None:
+                self._retired.append((replaced[0], replaced[2]))
+            self._clients[key] = (client, valid_until, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                _, (evicted, _, used) = self._clients.popitem(last=False)
+                self._retired.append((evicted, used))
+        return client
+
+    def __len__(self):
+        return len(self._clients)
+
 
 class SupabaseService:
     _instance = None
     _client: Client = None
+    _instance_lock = threading.Lock()
 
     def __init__(self):
+        from config import SUPABASE_CLIENT_POOL_SIZE, SUPABASE_CLIENT_TTL_SECONDS
         url: str = os.environ.get("SUPABASE_URL")
         key: str = os.environ.get("SUPABASE_KEY")
         if not url or not key:
@@ -19,6 +134,53 @@ class SupabaseService:
         # Actually initializing with the ANON key by default as per instruction.
         # If we had a SERVICE_ROLE key we would use it for admin tasks.
         self._client = create_client(url, key)
+        self._transport = self._create_transport()
+        self._auth_clients = AuthClientPool(
+            self._create_auth_client, SUPABASE_CLIENT_POOL_SIZE, SUPABASE_CLIENT_TTL_SECONDS
+        )
+
+    @staticmethod
+    def _get_instance() -> 'SupabaseService':
+        if SupabaseService._instance is None:
+            with SupabaseService._instance_lock:
+                if SupabaseService._instance is None:
+                    SupabaseService._instance = SupabaseService()
+        return SupabaseService._instance
+
+    @staticmethod
+    def _create_transport():
+        """One keep-alive connection pool shared by every per-token client (None if httpx is unavailable)."""
+        from config import SUPABASE_HTTP_MAX_CONNECTIONS
+        if httpx is None:
+            return None
+        try:
+            return httpx.HTTPTransport(limits=httpx.Limits(
+                max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_HTTP_MAX_CONNECTIONS
+            ))
+        except Exception as e:
+            print(f"Shared HTTP transport unavailable: {e}")
+            return None
+
+    def _client_options(self, token: str):
+        """Options carrying the user's token; requests go out with it and no session is stored."""
+        kwargs = {
+            'headers': {'Authorization': f"Bearer {token}"},
+            'auto_refresh_token': False,
+            'persist_session': False,
+        }
+        # Newer supabase-py versions accept an httpx client. Each token gets its own
+        # httpx.Client (the library sets headers on it) over the shared transport, so
+        # connections and TLS sessions are reused across users without sharing headers.
+        fields = getattr(ClientOptions, '__dataclass_fields__', {})
+        if self._transport is not None and 'httpx_client' in fields:
+            kwargs['httpx_client'] = httpx.Client(transport=_SharedTransport(self._transport))
+        return ClientOptions(**{k: v for k, v in kwargs.items() if not fields or k in fields})
+
+    def _create_auth_client(self, token: str) -> Client:
+        client = create_client(self._url, self._key, options=self._client_options(token))
+        client.postgrest.auth(token)
+        return client
 
     @staticmethod
     def get_client() -> Client:
@@ -26,43 +188,26 @@ class SupabaseService:
         Get the base Supabase client (usually initialized with Anon key).
         For user actions, you should authentication matches the user.
         """
-        if SupabaseService._instance is None:
-            SupabaseService._instance = SupabaseService()
-        return SupabaseService._instance._client
+        return SupabaseService._get_instance()._client
     
     @staticmethod
     def get_auth_client(token: str) -> Client:
         """
-        Creates a new Supabase client instance authenticated with the user's token.
-        This ensures RLS policies are applied correctly.
+        Get a Supabase client authenticated with the user's token, so RLS
+        policies apply. Clients are pooled per token until the token expires.
         """
-        if SupabaseService._instance is None:
-            SupabaseService._instance = SupabaseService()
-        
-        # Create a fresh client or clone/configure options with the header
-        # Using the existing client and overriding headers for the request is cleaner if supported,
-        # but create_client is cheap enough.
-        # Note: supabase-py `create_client` doesn't easily support just adding headers to a shared instance 
-        # without affecting others if we aren't careful.
-        # Safest is to instantiate a new client for the request scope or use `replace_headers`.
-        
-        options = {"headers": {"Authorization": f"Bearer {token}"}}
-        # We re-create the client for this specific user context
+        service = SupabaseService._get_instance()
         try:
-             # supabase-py doesn't take dict options in create_client easily in all versions, 
-             # checking standard usage: create_client(url, key, options=ClientOptions(...))
-             # simpler: use the client's auth helper
-             
-             client = create_client(SupabaseService._instance._url, SupabaseService._instance._key)
-             client.auth.set_session(token, "refresh_token_not_needed_for_api_calls") 
-             # Note: set_session might require refresh token. 
-             # Alternative: Just set the header manually on the postgrest client?
-             client.postgrest.auth(token)
-             return client
+            expires_at = None
+            if 'user' in g and g.get('token') == token:
+                expires_at = getattr(g.user, 'expires_at', None)
+            if expires_at is None:
+                expires_at = unverified_expiry(token)
+            return service._auth_clients.get(token, expires_at)
         except Exception as e:
             # Fallback: Just return generic client, but RLS will fail
             print(f"Error creating auth client: {e}")
-            return SupabaseService._instance._client
+            return service._client
 
     @staticmethod
     def get_user_id():
@@ -71,6 +216,46 @@ class SupabaseService:
             return g.user.id
         return None
 
+def _remote_verify(token: str) -> Optional[AuthUser]:
+    """Ask Supabase "Who is this?" using the shared base client (one HTTP round trip)."""
+    try:
+        user_response = SupabaseService.get_client().auth.get_user(token)
+    except Exception as e:
+        print(f"Auth Error: {e}")
+        return None
+    if not user_response or not user_response.user:
+        return None
+    user = user_response.user
+    return AuthUser(
+        id=user.id,
+        email=getattr(user, 'email', None),
+        role=getattr(user, 'role', None),
+        expires_at=unverified_expiry(token)
+    )
+
+
+_token_verifier: Optional[TokenVerifier] = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    """Process-wide verifier (its signing keys and token cache are shared by all requests)."""
+    global _token_verifier
+    if _token_verifier is None:
+        from config import (
+            SUPABASE_JWT_SECRET, SUPABASE_JWKS_URL, SUPABASE_JWT_AUDIENCE,
+            AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES
+        )
+        _token_verifier = TokenVerifier(
+            jwt_secret=SUPABASE_JWT_SECRET,
+            jwks_url=SUPABASE_JWKS_URL,
+            audience=SUPABASE_JWT_AUDIENCE,
+            cache_ttl=AUTH_CACHE_TTL_SECONDS,
+            max_entries=AUTH_CACHE_MAX_ENTRIES,
+            remote_verify=_remote_verify
+        )
+    return _token_verifier
+
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -80,17 +265,15 @@ def require_auth(f):
         
         try:
             token = auth_header.split(" ")[1]
-            service = SupabaseService()
-            # Verify token by getting user
-            # We use the generic client but with this token to ask Supabase "Who is this?"
-            client = service.get_client()
-            user_response = client.auth.get_user(token)
+            # Verified locally against the JWT secret/JWKS and cached per token;
+            # only falls back to a Supabase round trip when that isn't possible
+            user = get_token_verifier().verify(token)
             
-            if not user_response or not user_response.user:
+            if not user:
                  return abort(401, description="Invalid Token")
                  
             # Store user in flask global context
-            g.user = user_response.user
+            g.user = user
             g.token = token
             
         except Exception as e:
@@ -0,0 +1,124 @@
+"""
+Service for per-user data versions (ETags) and transaction delta sync.
+"""
+from typing import Any, Dict, List, Optional
+
+from flask import g
+
+from services.supabase_service import SupabaseService
+from models.transaction import Transaction, FIELD_COLUMNS
+from utils.metrics import track_supabase, json_size
+
+RESOURCES = ('transactions', 'categories', 'rules')
+
+
+def encode_watermark(seq: int) -> str:
+    return str(seq)
+
+
+def decode_watermark(watermark: Optional[str]) -> int:
+    """Parse a ?since= watermark; missing means "from the beginning" (0). Raises ValueError."""
+    if watermark in (None, ''):
+        return 0
+    try:
+        seq = int(watermark)
+    except ValueError:
+        raise ValueError("since must be a watermark returned by a previous sync")
+    if seq < 0:
+        raise ValueError("since must be a watermark returned by a previous sync")
+    return seq
+
+
+class SyncService:
+    """
+    Reads the counters maintained by migration 007. When the migration isn't
+    deployed, get_versions() returns None (no ETags) and get_changes() raises.
+    """
+
+    _available = True
+
+    def get_client(self):
+        if 'token' not in g:
+            raise Exception("No authenticated user found")
+        return SupabaseService.get_auth_client(g.token)
+
+    @staticmethod
+    def _missing(error: Exception) -> bool:
+        message = str(error)
+        return any(marker in message for marker in ('PGRST205', '42P01', '42703', 'Could not find'))
+
+    def get_versions(self) -> Optional[Dict[str, int]]:
+        """The current user's {resource: version}, or None if versions aren't available."""
+        if not SyncService._available:
+            return None
+        try:
+            with track_supabase('user_data_versions', 'select'):
+                response = self.get_client().table('user_data_versions')\
+                    .select(', '.join(RESOURCES)).execute()
+        except Exception as e:
+            if self._missing(e):
+                SyncService._available = False
+                print("Data versions not deployed (migration 007); ETags and delta sync disabled")
+            else:
+                print(f"Error reading data versions: {e}")
+            return None
+        row = response.data[0] if response.data else {}
+        return {resource: int(row.get(resource) or 0) for resource in RESOURCES}
+
+    def get_changes(self, since: int, limit: int) -> Dict[str, Any]:
+        """
+        Transactions inserted, updated or deleted after watermark `since`, oldest
+        change first, at most `limit` of them. Returns {'inserted': [...],
+        'updated': [...], 'deleted': [ids], 'watermark': str, 'has_more': bool};
+        pass the watermark back as ?since= to continue.
+        Raises RuntimeError if delta sync isn't deployed.
+        """
+        versions = self.get_versions()
+        if versions is None:
+            raise RuntimeError("Delta sync is not available (apply migration 007)")
+
+        # Only read up to the version seen now: seqs are handed out in commit order,
+        # so everything at or below it is visible to both queries below
+        upto = versions['transactions']
+        client = self.get_client()
+        columns = ', '.join(list(FIELD_COLUMNS.values()) + ['change_seq', 'created_seq'])
+        with track_supabase('transactions', 'select_changes') as span:
+            rows = client.table('transactions').select(columns)\
+                .gt('change_seq', since).lte('change_seq', upto)\
+                .order('change_seq').limit(limit + 1).execute().data
+            span.rows = len(rows)
+            span.bytes = json_size(rows)
+
+        tombstones: List[Dict[str, Any]] = []
+        if since > 0:
+            # A first sync has nothing to delete
+            with track_supabase('transaction_tombstones', 'select') as span:
+                tombstones = client.table('transaction_tombstones')\
+                    .select('change_seq, transaction_id')\
+                    .gt('change_seq', since).lte('change_seq', upto)\
+                    .order('change_seq').limit(limit + 1).execute().data
+                span.rows = len(tombstones)
+
+        # Merge both streams in seq order and cut at `limit`
+        changes = sorted(
+            [(int(r['change_seq']), 'row', r) for r in rows]
+            + [(int(t['change_seq']), 'tombstone', t) for t in tombstones],
+            key=lambda change: change[0]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        result = {'inserted': [], 'updated': [], 'deleted': []}
+        for _, kind, item in changes:
+            if kind == 'tombstone':
+                result['deleted'].append(item['transaction_id'])
+            elif int(item.get('created_seq') or 0) > since:
+                result['inserted'].append(Transaction.row_to_dict(item))
+            else:
+                result['updated'].append(Transaction.row_to_dict(item))
+
+        # Later writes have higher seqs and are picked up by the next call
+        watermark = changes[-1][0] if has_more else max(upto, since)
+        result['watermark'] = encode_watermark(watermark)
+        result['has_more'] = has_more
+        return result
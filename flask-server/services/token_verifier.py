@@ -0,0 +1,158 @@
+"""
+Local verification of Supabase access tokens with a TTL cache.
+
+Tokens are checked against the project's JWT secret (HS256) or its published
+JWKS (RS256/ES256) without a network round trip; validated token -> user
+mappings are cached until the token expires or the cache TTL elapses.
+When neither a secret nor a JWKS key is available, verification falls back
+to Supabase's remote get_user call.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from utils.metrics import AUTH_VERIFICATIONS_TOTAL
+
+try:
+    import jwt
+except ImportError:  # PyJWT is optional; without it every token is verified remotely
+    jwt = None
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """The authenticated caller, as stored in g.user."""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    expires_at: Optional[float] = None  # JWT 'exp' (unix seconds), if known
+
+
+def unverified_expiry(token: str) -> Optional[float]:
+    """Read 'exp' from a token without checking its signature (only for cache bookkeeping)."""
+    if jwt is None:
+        return None
+    try:
+        exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens and caches the resulting AuthUser.
+    remote_verify: fallback callable(token) -> AuthUser or None, used when the
+    token can't be checked locally.
+    """
+
+    def __init__(self, jwt_secret: Optional[str] = None, jwks_url: Optional[str] = None,
+                 audience: Optional[str] = 'authenticated', cache_ttl: float = 300,
+                 max_entries: int = 1024, remote_verify: Optional[Callable[[str], Optional[AuthUser]]] = None,
+                 leeway: float = 10):
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self.remote_verify = remote_verify
+        self.leeway = leeway
+        self._jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True) if jwt is not None and jwks_url else None
+        self._cache: 'OrderedDict[str, tuple]' = OrderedDict()  # token digest -> (user, valid_until)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        # Don't keep raw bearer tokens around as dict keys
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def _cached(self, key: str) -> Optional[AuthUser]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _remember(self, key: str, user: AuthUser):
+        valid_until = time.time() + self.cache_ttl
+        if user.expires_at is not None:
+            valid_until = min(valid_until, user.expires_at)
+        with self._lock:
+            self._cache[key] = (user, valid_until)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def forget(self, token: str):
+        """Drop a token from the cache (e.g. after sign-out)."""
+        with self._lock:
+            self._cache.pop(self._digest(token), None)
+
+    def _signing_key(self, token: str):
+        """Key to check this token with, or None if it can't be verified locally."""
+        if jwt is None:
+            return None, None
+        algorithm = jwt.get_unverified_header(token).get('alg')
+        if algorithm == 'HS256' and self.jwt_secret:
+            return self.jwt_secret, algorithm
+        if algorithm in ASYMMETRIC_ALGORITHMS and self._jwks_client is not None:
+            try:
+                return self._jwks_client.get_signing_key_from_jwt(token).key, algorithm
+            except jwt.PyJWKClientError as e:
+                print(f"JWKS lookup failed, verifying remotely: {e}")
+        return None, None
+
+    def _verify_locally(self, token: str, key, algorithm: str) -> Optional[AuthUser]:
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=[algorithm], audience=self.audience,
+                leeway=self.leeway, options={'require': ['exp', 'sub'], 'verify_aud': bool(self.audience)}
+            )
+        except jwt.InvalidTokenError as e:
+            print(f"Auth Error: {e}")
+            return None
+        return AuthUser(
+            id=claims['sub'],
+            email=claims.get('email'),
+            role=claims.get('role'),
+            expires_at=float(claims['exp'])
+        )
+
+    def verify(self, token: str) -> Optional[AuthUser]:
+        """Return the token's user, or None if the token is invalid or expired."""
+        key = self._digest(token)
+        user = self._cached(key)
+        if user is not None:
+            AUTH_VERIFICATIONS_TOTAL.inc(method='cache', outcome='ok')
+            return user
+
+        try:
+            signing_key, algorithm = self._signing_key(token)
+        except Exception as e:
+            # Malformed token header
+            print(f"Auth Error: {e}")
+            AUTH_VERIFICATIONS_TOTAL.inc(method='local', outcome='rejected')
+            return None
+
+        if signing_key is not None:
+            method = 'local'
+            user = self._verify_locally(token, signing_key, algorithm)
+        elif self.remote_verify is not None:
+            method = 'remote'
+            user = self.remote_verify(token)
+        else:
+            method = 'none'
+            user = None
+
+        AUTH_VERIFICATIONS_TOTAL.inc(method=method, outcome='ok' if user else 'rejected')
+        if user is not None:
+            self._remember(key, user)
+        return user
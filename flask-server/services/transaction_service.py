@@ -1,17 +1,41 @@
 """
 Transaction service for handling transaction data operations via Supabase.
 """
-from typing import List, Dict, Any
+import time
+from dataclasses import replace
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import pandas as pd
 from flask import g
 from services.supabase_service import SupabaseService
-from models.transaction import Transaction
+from services.history_service import HistoryService
+from services.rollup_service import RollupService
+from models.transaction import Transaction, transaction_signature
+from models.transaction_query import TransactionQuery, encode_cursor
+from utils.metrics import track_supabase, json_size, add_timing
+from utils.rollups import rollup_frame, summarize_rollup
+from utils.dates import format_dates
+from utils.concurrency import BatchDispatcher, is_transient_error
+from config import (
+    TRANSACTIONS_PAGE_SIZE, BULK_UPDATE_CHUNK_SIZE, BULK_UPDATE_MAX_CONCURRENCY,
+    IMPORT_BATCH_SIZE, IMPORT_BATCH_MAX_BYTES, IMPORT_MAX_CONCURRENCY
+)
 
 class TransactionService:
     """Service for managing transaction data via Supabase."""
     
+    _rollup_rpc_available = True
+    _signature_upsert_available = True  # False once the signature key turns out not to be deployed
+    _bulk_rpc_available = True
+    _user_edited_available = True  # False once transactions.user_edited turns out not to be deployed
+    
     def __init__(self):
         # We no longer need file paths
-        pass
+        self.history_service = HistoryService()
+        self.rollup_service = RollupService()
+        # Per-row fallback for bulk updates; the client is captured up front since
+        # worker threads have no request context
+        self.bulk_dispatcher = BatchDispatcher(max_workers=BULK_UPDATE_MAX_CONCURRENCY, max_retries=2)
+        self.import_dispatcher = BatchDispatcher(max_workers=IMPORT_MAX_CONCURRENCY, max_retries=2)
     
     def get_client(self):
         """Get the authenticated Supabase client for the current user."""
@@ -22,42 +46,107 @@ class TransactionService:
             raise Exception("No authenticated user found")
         return SupabaseService.get_auth_client(g.token)
 
+    def _iter_pages(self, query: TransactionQuery, client=None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield pages of rows matching a TransactionQuery, newest first.
+        With query.limit, one page is fetched; otherwise pages of
+        TRANSACTIONS_PAGE_SIZE are followed by keyset until exhausted, so
+        results are never cut off at PostgREST's row cap and only one page
+        is held at a time.
+        client defaults to the current user's.
+        """
+        client = client or self.get_client()
+
+        def build(cursor):
+            request = client.table('transactions').select(query.columns)
+            if query.start_date:
+                request = request.gte('transaction_date', query.start_date)
+            if query.end_date:
+                request = request.lte('transaction_date', query.end_date)
+            if query.min_amount is not None:
+                request = request.gte('amount', query.min_amount)
+            if query.max_amount is not None:
+                request = request.lte('amount', query.max_amount)
+            if len(query.categories) == 1:
+                request = request.eq('category', query.categories[0])
+            elif query.categories:
+                request = request.in_('category', query.categories)
+            if cursor:
+                # Keyset: rows strictly after (date, id) in (date desc, id desc) order
+                last_date, last_id = cursor
+                request = request.or_(
+                    f"transaction_date.lt.{last_date},"
+                    f"and(transaction_date.eq.{last_date},id.lt.{last_id})"
+                )
+            return request.order('transaction_date', desc=True).order('id', desc=True)
+
+        page_size = query.limit or TRANSACTIONS_PAGE_SIZE
+        cursor = query.cursor
+        while True:
+            with track_supabase('transactions', 'select') as span:
+                response = build(cursor).limit(page_size).execute()
+                span.rows = len(response.data)
+                span.bytes = json_size(response.data)
+            page = response.data
+            if page:
+                cursor = (page[-1]['transaction_date'], page[-1]['id'])
+                yield page
+            if query.limit or len(page) < page_size:
+                break
+
+    def _fetch_rows(self, query: TransactionQuery) -> Dict[str, Any]:
+        """
+        Run a TransactionQuery against Supabase (see _iter_pages).
+        Returns {'rows': [...], 'next_cursor': str or None}.
+        """
+        rows = []
+        for page in self._iter_pages(query):
+            rows.extend(page)
+        full_page = query.limit is not None and len(rows) == query.limit
+        cursor = (rows[-1]['transaction_date'], rows[-1]['id']) if full_page else None
+        return {'rows': rows, 'next_cursor': encode_cursor(*cursor) if cursor else None}
+
+    def iter_transaction_pages(self, query: TransactionQuery) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Every transaction matching the query's filters and projection as pages
+        of API dicts (query.limit/cursor are ignored), for streaming exports.
+        The client is resolved on the first next(), so iterate inside the request context.
+        """
+        query = replace(query, limit=None, cursor=None)
+        for page in self._iter_pages(query):
+            yield [Transaction.row_to_dict(row, query.fields) for row in page]
+
+    def query_transactions(self, query: TransactionQuery) -> Dict[str, Any]:
+        """
+        Filtered, projected and optionally paginated transactions for the current user.
+        Returns {'transactions': [...], 'next_cursor': str or None}.
+        """
+        try:
+            result = self._fetch_rows(query)
+            return {
+                'transactions': [Transaction.row_to_dict(row, query.fields) for row in result['rows']],
+                'next_cursor': result['next_cursor']
+            }
+        except Exception as e:
+            print(f"Error querying transactions: {e}")
+            return {'transactions': [], 'next_cursor': None}
+
     def get_all_transactions(self) -> List[Transaction]:
         """
         Retrieve all transactions for the current user.
         """
         try:
-            client = self.get_client()
-            # Select all fields, order by transaction_date desc
-            response = client.table('transactions')\
-                .select('*')\
-                .order('transaction_date', desc=True)\
-                .execute()
-            
-            data = response.data
-            transactions = []
-            
-            for row in data:
-                # Map Supabase row to Transaction model
-                # Note: 'id' is the internal UUID, 'transaction_id' is the optional text ID
-                # The model uses 'transaction_id' to store... wait. 
-                # Model 'transaction_id' field maps to 'Transaction ID' in dict.
-                # In DB: 'id' (uuid), 'transaction_id' (text, legacy).
-                
-                # Let's map DB 'id' -> Model 'transaction_id' for consistency in identifying records
-                # OR use the 'transaction_id' field if we want to preserve legacy IDs?
-                # The frontend likely expects an ID to update.
-                
-                t = Transaction(
+            # Map DB 'id' -> Model 'transaction_id' (the Supabase UUID is the main ID)
+            return [
+                Transaction(
                     transaction_date=row['transaction_date'],
                     description=row['description'],
                     category=row['category'],
                     amount=row['amount'],
-                    transaction_id=row['id'] # Use the Supabase UUID as the main ID
+                    transaction_id=row['id']
                 )
-                transactions.append(t)
-                
-            return transactions
+                for row in self._fetch_rows(TransactionQuery())['rows']
+            ]
             
         except Exception as e:
             print(f"Error retrieving transactions: {e}")
@@ -104,39 +193,71 @@ class TransactionService:
             print(f"Error deleting category: {e}")
             return False
     
-    def get_transaction_stats(self) -> Dict[str, Any]:
-        """Get basic statistics about transactions."""
-        # We can do this with SQL aggregation or just fetch all (if not too many)
-        # Fetching all is easier for now to reuse logic
-        transactions = self.get_all_transactions()
-        
-        if not transactions:
-            return {
-                "total_transactions": 0,
-                "total_amount": 0.0,
-                "credit_count": 0,
-                "debit_count": 0,
-                "categories": []
-            }
-        
-        total_amount = sum(tx.amount for tx in transactions)
-        credit_count = sum(1 for tx in transactions if tx.is_credit)
-        debit_count = sum(1 for tx in transactions if tx.is_debit)
-        categories = list(set(tx.category for tx in transactions if tx.category))
+    def _rollup_groups(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """
+        Per (month, category) groups for the current user, computed in the
+        database by the transaction_rollup RPC. If the RPC isn't installed
+        (migration 003 not applied), the rows are fetched and grouped with pandas.
+        """
+        client = self.get_client()
+        if TransactionService._rollup_rpc_available:
+            try:
+                with track_supabase('transaction_rollup', 'rpc') as span:
+                    response = client.rpc('transaction_rollup', {'p_start': start_date, 'p_end': end_date}).execute()
+                    span.rows = len(response.data)
+                    span.bytes = json_size(response.data)
+                return response.data
+            except Exception as e:
+                message = str(e)
+                if 'PGRST202' in message or 'Could not find the function' in message:
+                    # Not deployed; stop asking until the process restarts
+                    TransactionService._rollup_rpc_available = False
+                print(f"transaction_rollup RPC failed, aggregating locally: {e}")
         
-        return {
-            "total_transactions": len(transactions),
-            "total_amount": total_amount,
-            "credit_count": credit_count,
-            "debit_count": debit_count,
-            "categories": sorted(categories)
-        }
-    
+        query = TransactionQuery(
+            start_date=start_date, end_date=end_date, fields=['Transaction Date', 'Category', 'Amount']
+        )
+        rows = self._fetch_rows(query)['rows']
+        return rollup_frame(pd.DataFrame(rows, columns=['transaction_date', 'category', 'amount']))
+
+    def get_monthly_rollup(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """
+        Per (month, category) groups, read from the maintained rollup table when
+        it can answer the window, otherwise aggregated on demand.
+        """
+        groups = self.rollup_service.get_groups(start_date, end_date)
+        if groups is None:
+            groups = self._rollup_groups(start_date, end_date)
+        return sorted(groups, key=lambda g: (str(g.get('month')), str(g.get('category'))))
+
+    def get_transaction_stats(self, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """
+        Totals, credit/debit counts, and per-category and per-month sums,
+        optionally limited to an inclusive ISO date window.
+        """
+        try:
+            stats = summarize_rollup(self.get_monthly_rollup(start_date, end_date))
+        except Exception as e:
+            print(f"Error computing transaction stats: {e}")
+            stats = summarize_rollup([])
+        stats['start_date'] = start_date
+        stats['end_date'] = end_date
+        return stats
     
-    def import_transactions(self, df: pd.DataFrame) -> dict:
+    def import_transactions(self, df: pd.DataFrame, account_type: str = None,
+                            timings: Dict[str, float] = None) -> dict:
         """
         Import transactions from a DataFrame.
-        Handles deduplication against existing data.
+        Rows already stored (same date, normalized description and amount) are
+        skipped by the database's (user_id, signature) unique key, so
+        overlapping or concurrent imports are safe. The signature uses the
+        statement's description (_raw_description, set by the transformer)
+        rather than a rule/LLM rename, so re-uploads match whatever the rules are now.
+        account_type: 'credit' or 'debit' upload the rows came from (lets typed rules find them later).
+        timings: optional dict filled with seconds spent in inserts.
+        Batches (IMPORT_BATCH_SIZE rows / IMPORT_BATCH_MAX_BYTES) are inserted
+        in parallel; a batch that fails is split until the bad rows are
+        isolated, and those rows are counted in 'errors'.
         Returns stats: {'imported': int, 'duplicates': int, 'errors': int}
         """
         results = {'imported': 0, 'duplicates': 0, 'errors': 0}
@@ -151,78 +272,86 @@ class TransactionService:
             # Clean dataframe
             df = df.where(pd.notnull(df), None)
             
-            # 1. Fetch existing transactions to verify duplicates
-            # Optimization: Fetch only transactions with matching amounts/dates?
-            # For now, let's fetch all (assuming < 10k transactions). 
-            # If large, we should filter by date range of the input DF.
-            
-            # Determine date range of input
-            df['Transaction Date'] = pd.to_datetime(df['Transaction Date'])
-            min_date = df['Transaction Date'].min().strftime('%Y-%m-%d')
-            max_date = df['Transaction Date'].max().strftime('%Y-%m-%d')
-            
-            # Fetch existing for this range
-            existing_response = client.table('transactions')\
-                .select('transaction_date, description, amount')\
-                .gte('transaction_date', min_date)\
-                .lte('transaction_date', max_date)\
-                .execute()
-                
-            existing = existing_response.data
-            
-            # Build set of existing signatures: (date, description, amount)
-            # Note: Amount comparison needs care (float vs decimal).
-            # Let's stringify amount to 2 decimal places for comparison?
-            existing_sigs = set()
-            for r in existing:
-                amt = float(r['amount']) if r['amount'] is not None else 0.0
-                sig = (
-                    r['transaction_date'], 
-                    r['description'].strip(), 
-                    round(amt, 2)
-                )
-                existing_sigs.add(sig)
+            # ISO strings, formatted once per distinct date (None where missing/unparseable)
+            dates = format_dates(df['Transaction Date'])
             
-            # 2. Filter new transactions
+            # 1. Build rows with their import signature (date | normalized description | cents).
+            # Duplicates against stored data are rejected by the (user_id, signature) unique
+            # index at insert time, so no pre-fetch of existing rows is needed.
             new_rows = []
+            seen_sigs = set()
+            raw_descriptions = df['_raw_description'] if '_raw_description' in df.columns else df['Description']
             
-            for _, row in df.iterrows():
+            for t_date, desc, raw_desc, amt, category in zip(dates, df['Description'], raw_descriptions,
+                                                             df['Amount'], df['Category']):
                 try:
-                    t_date = row['Transaction Date'].strftime('%Y-%m-%d')
-                    desc = str(row['Description']).strip()
-                    amt = float(row['Amount']) if row['Amount'] is not None else 0.0
+                    if t_date is None:
+                        raise ValueError("missing or unparseable transaction date")
+                    desc = str(desc).strip()
+                    amt = float(amt) if amt is not None else 0.0
                     
-                    sig = (t_date, desc, round(amt, 2))
+                    sig = transaction_signature(t_date, raw_desc if raw_desc is not None else desc, amt)
                     
-                    if sig in existing_sigs:
+                    # Duplicates WITHIN the import file
+                    if sig in seen_sigs:
                         results['duplicates'] += 1
                         continue
+                    seen_sigs.add(sig)
                     
                     # Prepare for insert
-                    new_rows.append({
+                    new_row = {
                         'user_id': user_id,
                         'transaction_date': t_date,
                         'description': desc,
-                        'category': row['Category'] if row['Category'] else 'Uncategorized',
+                        'category': category if category else 'Uncategorized',
                         'amount': amt,
+                        'signature': sig,
                         # 'transaction_id': row.get('Transaction ID') # Optional legacy ID
-                    })
-                    
-                    # Add to sigs to prevent duplicates WITHIN the import file
-                    existing_sigs.add(sig)
+                    }
+                    if account_type:
+                        new_row['account_type'] = account_type
+                    new_rows.append(new_row)
                     
                 except Exception as row_e:
                     print(f"Error processing row for import: {row_e}")
                     results['errors'] += 1
             
-            # 3. Bulk Insert
-            if new_rows:
-                # Supabase batch insert
-                batch_size = 100
-                for i in range(0, len(new_rows), batch_size):
-                    batch = new_rows[i:i+batch_size]
-                    client.table('transactions').insert(batch).execute()
-                    results['imported'] += len(batch)
+            if new_rows and not TransactionService._signature_upsert_available:
+                new_rows = self._drop_existing(client, new_rows, results, timings)
+            
+            # 2. Bulk Insert (insert-or-ignore on the signature key)
+            inserted = []
+            try:
+                started = time.perf_counter()
+                batches = self._plan_batches(new_rows)
+                if batches and TransactionService._signature_upsert_available:
+                    # The first batch goes alone: it tells us whether the signature key exists
+                    rows, failed = self._insert_isolating(client, batches[0])
+                    if rows is None:
+                        # Signature column/index not deployed: dedupe the old way
+                        new_rows = self._drop_existing(client, new_rows, results, timings)
+                        batches = self._plan_batches(new_rows)
+                    else:
+                        self._tally(results, inserted, batches[0], rows, failed)
+                        batches = batches[1:]
+                
+                # Worker threads have no request context, so the client is captured here
+                outcomes = self.import_dispatcher.run(
+                    lambda batch: self._insert_isolating(client, batch), batches
+                )
+                add_timing(timings, 'load.insert', time.perf_counter() - started)
+                for batch, outcome in zip(batches, outcomes):
+                    if outcome.ok:
+                        rows, failed = outcome.value
+                        self._tally(results, inserted, batch, rows or [], failed)
+                    else:
+                        print(f"Error inserting {len(batch)} transactions: {outcome.error}")
+                        results['errors'] += len(batch)
+            finally:
+                # Batches that made it in count even if a later one failed.
+                # New labels feed the user's history categorizer.
+                self.history_service.record(inserted)
+                self.rollup_service.apply(added=inserted)
                     
             return results
             
@@ -232,52 +361,338 @@ class TransactionService:
             traceback.print_exc()
             return results
 
-    def update_transaction(self, transaction_id: str, updates: dict) -> bool:
+    @staticmethod
+    def _plan_batches(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Split rows into insert batches of at most IMPORT_BATCH_SIZE rows and about
+        IMPORT_BATCH_MAX_BYTES (rows share one shape, so the size per row is
+        estimated once from a sample rather than by encoding every row).
+        """
+        if not rows:
+            return []
+        row_bytes = max(1, json_size(rows) // len(rows))
+        per_batch = max(1, min(IMPORT_BATCH_SIZE, IMPORT_BATCH_MAX_BYTES // row_bytes))
+        return [rows[start:start + per_batch] for start in range(0, len(rows), per_batch)]
+
+    @staticmethod
+    def _tally(results: dict, inserted: list, batch: List[Dict[str, Any]],
+               rows: List[Dict[str, Any]], failed: int):
+        results['imported'] += len(rows)
+        results['errors'] += failed
+        if TransactionService._signature_upsert_available:
+            # Rows neither inserted nor failed were ignored by the signature key
+            results['duplicates'] += len(batch) - len(rows) - failed
+        inserted.extend(rows)
+
+    def _insert_isolating(self, client, batch: List[Dict[str, Any]],
+                          timings: Dict[str, float] = None) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """
+        Insert a batch, retrying transient errors. A batch the database rejects
+        is split in half and each half retried, down to single rows, so one bad
+        row doesn't take the rest of the batch with it.
+        Returns (inserted rows or None if the signature key isn't deployed, failed row count).
+        """
+        outcome = self.import_dispatcher.call_with_retry(
+            lambda rows: self._insert_batch(client, rows, timings), batch
+        )
+        if outcome.ok:
+            return outcome.value, 0
+        if is_transient_error(outcome.error) or len(batch) == 1:
+            # Out of retries, or a single bad row: splitting won't help
+            print(f"Skipping {len(batch)} transaction(s) starting at {batch[0].get('transaction_date')} "
+                  f"'{batch[0].get('description')}': {outcome.error}")
+            return [], len(batch)
+        
+        middle = len(batch) // 2
+        inserted, failed = [], 0
+        for half in (batch[:middle], batch[middle:]):
+            rows, half_failed = self._insert_isolating(client, half, timings)
+            inserted.extend(rows or [])
+            failed += half_failed
+        return inserted, failed
+
+    def _insert_batch(self, client, batch: List[Dict[str, Any]], timings: Dict[str, float] = None):
+        """
+        Insert a batch, silently skipping rows whose signature already exists.
+        Returns the inserted rows, or None if the signature key isn't deployed
+        (after which plain inserts are used for this process).
+        """
+        if TransactionService._signature_upsert_available:
+            try:
+                with track_supabase('transactions', 'upsert', timings, 'load.insert') as span:
+                    span.rows = len(batch)
+                    span.bytes = json_size(batch)
+                    response = client.table('transactions')\
+                        .upsert(batch, on_conflict='user_id,signature', ignore_duplicates=True)\
+                        .execute()
+                return response.data
+            except Exception as e:
+                message = str(e)
+                if not any(marker in message for marker in ('42P10', 'PGRST204', "'signature'")):
+                    raise
+                TransactionService._signature_upsert_available = False
+                print(f"Signature key not deployed (migration 005), falling back to pre-fetch dedupe: {e}")
+                return None
+        
+        batch = [{k: v for k, v in row.items() if k != 'signature'} for row in batch]
+        with track_supabase('transactions', 'insert', timings, 'load.insert') as span:
+            span.rows = len(batch)
+            span.bytes = json_size(batch)
+            response = client.table('transactions').insert(batch).execute()
+        return response.data
+
+    def _drop_existing(self, client, rows: List[Dict[str, Any]], results: dict,
+                       timings: Dict[str, float] = None) -> List[Dict[str, Any]]:
+        """
+        Legacy dedupe: drop rows whose signature matches a stored row in the same
+        date range. The range is paged through, so ranges holding more rows than
+        PostgREST returns per request are still fully checked.
+        Without stored signatures only the stored (possibly renamed) description
+        is known, so rows are also compared by their own description.
+        """
+        dates = [r['transaction_date'] for r in rows]
+        query = TransactionQuery(
+            start_date=min(dates), end_date=max(dates),
+            fields=['Transaction Date', 'Description', 'Amount']
+        )
+        started = time.perf_counter()
+        existing = set()
+        for page in self._iter_pages(query, client):
+            existing.update(
+                transaction_signature(r['transaction_date'], r['description'], r['amount'])
+                for r in page
+            )
+        add_timing(timings, 'load.dedupe_fetch', time.perf_counter() - started)
+        kept = [
+            r for r in rows
+            if r['signature'] not in existing
+            and transaction_signature(r['transaction_date'], r['description'], r['amount']) not in existing
+        ]
+        results['duplicates'] += len(rows) - len(kept)
+        return kept
+
+    @staticmethod
+    def _db_updates(updates: dict) -> dict:
+        """Map frontend keys to DB keys."""
+        # updates keys are likely 'Category', 'Description' (capitalized) logic from frontend?
+        # Or 'category', 'description'.
+        db_updates = {}
+        if 'category' in updates: db_updates['category'] = updates['category']
+        if 'Category' in updates: db_updates['category'] = updates['Category']
+        if 'description' in updates: db_updates['description'] = updates['description']
+        if 'Description' in updates: db_updates['description'] = updates['Description']
+        if 'amount' in updates: db_updates['amount'] = updates['amount']
+        if 'Amount' in updates: db_updates['amount'] = updates['Amount']
+        return db_updates
+
+    @staticmethod
+    def _mark_user_edit(db_updates: dict) -> dict:
+        """Flag a hand edit of the category or description, so rule changes leave the row alone."""
+        if TransactionService._user_edited_available and ('category' in db_updates or 'description' in db_updates):
+            return {**db_updates, 'user_edited': True}
+        return db_updates
+
+    @staticmethod
+    def _send_update(send, db_updates: dict) -> List[Dict[str, Any]]:
+        """Run send(db_updates), retrying without user_edited if migration 008 isn't applied."""
+        try:
+            return send(db_updates)
+        except Exception as e:
+            if 'user_edited' not in db_updates or 'user_edited' not in str(e):
+                raise
+            TransactionService._user_edited_available = False
+            print("transactions.user_edited not deployed (migration 008); hand edits aren't protected from rule changes")
+            return send({k: v for k, v in db_updates.items() if k != 'user_edited'})
+
+    @staticmethod
+    def _affects_rollups(db_updates: dict) -> bool:
+        return 'category' in db_updates or 'amount' in db_updates
+
+    def _fetch_for_rollup(self, client, ids: List[str]) -> List[Dict[str, Any]]:
+        """Current (date, category, amount) of rows about to change, for rollup deltas."""
+        if not ids or not RollupService._available:
+            return []
+        rows = []
+        for i in range(0, len(ids), 200):
+            chunk = ids[i:i + 200]
+            with track_supabase('transactions', 'select_rollup') as span:
+                response = client.table('transactions')\
+                    .select('id, transaction_date, category, amount')\
+                    .in_('id', chunk)\
+                    .execute()
+                span.rows = len(response.data)
+            rows.extend(response.data)
+        return rows
+
+    def _update_rows(self, client, transaction_id: str, db_updates: dict) -> List[Dict[str, Any]]:
+        """Apply one update and return the updated rows (empty if nothing matched)."""
+        def send(values):
+            with track_supabase('transactions', 'update') as span:
+                span.rows = 1
+                return client.table('transactions').update(values).eq('id', transaction_id).execute().data
+        rows = self._send_update(send, db_updates)
+        if 'category' in db_updates or 'description' in db_updates:
+            self.history_service.record(rows)
+        return rows
+
+    def _apply_rollups(self, before: List[Dict[str, Any]], after: List[Dict[str, Any]]):
+        """Move updated rows between rollup groups (only rows the update actually touched)."""
+        updated_ids = {row.get('id') for row in after}
+        self.rollup_service.apply(added=after, removed=[r for r in before if r.get('id') in updated_ids])
+
+    def update_transaction(self, transaction_id: str, updates: dict, user_edit: bool = True) -> bool:
         """
         Update a single transaction.
+        user_edit: the user made this edit (marks the row user_edited).
         """
         try:
             client = self.get_client()
             
-            # Map frontend keys to DB keys
-            # updates keys are likely 'Category', 'Description' (capitalized) logic from frontend?
-            # Or 'category', 'description'.
-            db_updates = {}
-            if 'category' in updates: db_updates['category'] = updates['category']
-            if 'Category' in updates: db_updates['category'] = updates['Category']
-            if 'description' in updates: db_updates['description'] = updates['description']
-            if 'Description' in updates: db_updates['description'] = updates['Description']
-            if 'amount' in updates: db_updates['amount'] = updates['amount']
-            if 'Amount' in updates: db_updates['amount'] = updates['Amount']
-            
+            db_updates = self._db_updates(updates)
             if not db_updates:
                 return False
+            if user_edit:
+                db_updates = self._mark_user_edit(db_updates)
             
-            client.table('transactions').update(db_updates).eq('id', transaction_id).execute()
+            track_rollups = self._affects_rollups(db_updates)
+            before = self._fetch_for_rollup(client, [transaction_id]) if track_rollups else []
+            after = self._update_rows(client, transaction_id, db_updates)
+            if track_rollups:
+                self._apply_rollups(before, after)
             return True
             
         except Exception as e:
             print(f"Error updating transaction {transaction_id}: {e}")
             return False
     
-    def bulk_update_transactions(self, updates: list) -> bool:
+    def _update_in(self, client, ids: List[str], db_updates: dict) -> List[Dict[str, Any]]:
+        """Apply one payload to many rows with a single IN-filtered update."""
+        def send(values):
+            with track_supabase('transactions', 'update_in') as span:
+                span.rows = len(ids)
+                return client.table('transactions').update(values).in_('id', ids).execute().data
+        return self._send_update(send, db_updates)
+
+    def _update_rpc(self, client, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Apply heterogeneous updates ([{'id', ...fields}]) in one bulk_update_transactions
+        RPC call. Returns the updated rows, or None if the RPC isn't deployed.
+        """
+        if not TransactionService._bulk_rpc_available:
+            return None
+        try:
+            with track_supabase('transactions', 'update_rpc') as span:
+                span.rows = len(items)
+                span.bytes = json_size(items)
+                response = client.rpc('bulk_update_transactions', {'p_updates': items}).execute()
+            return response.data
+        except Exception as e:
+            message = str(e)
+            if 'PGRST202' not in message and 'Could not find the function' not in message:
+                raise
+            TransactionService._bulk_rpc_available = False
+            print("bulk_update_transactions RPC not deployed (migration 006); updating rows individually")
+            return None
+
+    def bulk_update_transactions(self, updates: list, user_edit: bool = True) -> Dict[str, Any]:
         """
         Update multiple transactions.
-        Updates: list of dicts with 'id' and 'updates'.
+        Updates: list of dicts with 'id' and 'updates' (entries for the same id are merged).
+        user_edit: the user made these edits (marks the rows user_edited).
+        
+        Rows sharing an identical payload are updated together with IN-filtered
+        requests; the remaining one-off payloads go through a single RPC call
+        (or, without it, individual updates on a bounded thread pool).
+        Returns per-id outcomes: {'updated': [ids], 'not_found': [ids],
+        'failed': {id: error}, 'requests': int}.
         """
+        result = {'updated': [], 'not_found': [], 'failed': {}, 'requests': 0}
         try:
-            # Supabase doesn't support bulk update with different values per row easily in one call
-            # unless we use upsert with all data specified.
-            # Since we are patching potentially partial updates, loop is safer for now.
-            # Performance note: For huge lists this is slow. 
-            count = 0
+            # Merge per id (the UI sends one entry per edited cell), keeping first-seen order
+            merged: Dict[str, dict] = {}
             for update_item in updates:
                 tx_id = update_item.get('id')
                 tx_updates = update_item.get('updates')
                 if tx_id and tx_updates:
-                    if self.update_transaction(tx_id, tx_updates):
-                        count += 1
-            return count > 0
+                    merged.setdefault(str(tx_id), {}).update(self._db_updates(tx_updates))
+            merged = {tx_id: db_updates for tx_id, db_updates in merged.items() if db_updates}
+            if not merged:
+                return result
+            if user_edit:
+                merged = {tx_id: self._mark_user_edit(db_updates) for tx_id, db_updates in merged.items()}
+            
+            client = self.get_client()
+            # One read of the old values for the rollup deltas
+            before = self._fetch_for_rollup(
+                client, [tx_id for tx_id, db_updates in merged.items() if self._affects_rollups(db_updates)]
+            )
+            
+            # Group ids by identical payload
+            groups: Dict[tuple, List[str]] = {}
+            for tx_id, db_updates in merged.items():
+                groups.setdefault(tuple(sorted(db_updates.items())), []).append(tx_id)
+            
+            after = []
+            singles = []
+            for payload, ids in groups.items():
+                if len(ids) == 1:
+                    singles.append(ids[0])
+                    continue
+                for i in range(0, len(ids), BULK_UPDATE_CHUNK_SIZE):
+                    chunk = ids[i:i + BULK_UPDATE_CHUNK_SIZE]
+                    result['requests'] += 1
+                    try:
+                        after.extend(self._update_in(client, chunk, dict(payload)))
+                    except Exception as e:
+                        print(f"Error updating {len(chunk)} transactions: {e}")
+                        for tx_id in chunk:
+                            result['failed'][tx_id] = str(e)
+            
+            if singles:
+                rows = None
+                if TransactionService._bulk_rpc_available:
+                    result['requests'] += 1
+                    try:
+                        rows = self._update_rpc(client, [{'id': tx_id, **merged[tx_id]} for tx_id in singles])
+                    except Exception as e:
+                        print(f"Error in bulk update RPC: {e}")
+                        for tx_id in singles:
+                            result['failed'][tx_id] = str(e)
+                        rows = []
+                if rows is None:
+                    # RPC not deployed: individual updates on a bounded thread pool
+                    result['requests'] += len(singles)
+                    outcomes = self.bulk_dispatcher.run(
+                        lambda tx_id: self._update_in(client, [tx_id], merged[tx_id]), singles
+                    )
+                    for tx_id, outcome in zip(singles, outcomes):
+                        if outcome.ok:
+                            after.extend(outcome.value)
+                        else:
+                            result['failed'][tx_id] = str(outcome.error)
+                else:
+                    after.extend(rows)
+            
+            updated = {str(row.get('id')) for row in after}
+            for tx_id in merged:
+                if tx_id in updated:
+                    result['updated'].append(tx_id)
+                elif tx_id not in result['failed']:
+                    # RLS hides other users' rows, so "not yours" also lands here
+                    result['not_found'].append(tx_id)
+            
+            # Side effects run here, in the request context
+            self.history_service.record([
+                row for row in after
+                if {'category', 'description'} & set(merged.get(str(row.get('id')), {}))
+            ])
+            self._apply_rollups(before, [
+                row for row in after if self._affects_rollups(merged.get(str(row.get('id')), {}))
+            ])
+            return result
         except Exception as e:
             print(f"Error bulk updating transactions: {e}")
-            return False
+            for tx_id in (str(u.get('id')) for u in updates if u.get('id')):
+                if tx_id not in result['updated']:
+                    result['failed'].setdefault(tx_id, str(e))
+            return result
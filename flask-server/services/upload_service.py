@@ -1,13 +1,48 @@
 """
 Upload service for handling file uploads and ETL processing via Supabase Pipeline.
 """
+import gzip
 import os
 import shutil
+import tempfile
+import uuid
+import zipfile
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 from services.pipeline_service import PipelineService
-from config import ALLOWED_EXTENSIONS, UPLOADS_DIR
+from config import ALLOWED_EXTENSIONS, UPLOADS_DIR, JOBS_UPLOADS_DIR, BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_MAX_BYTES
+
+ARCHIVE_EXTENSIONS = {'zip', 'gz'}
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadLimitError(ValueError):
+    """A batch upload exceeds BATCH_UPLOAD_MAX_FILES or BATCH_UPLOAD_MAX_BYTES."""
+
+
+class _Budget:
+    """Running totals for one batch, checked while bytes are written (not from archive headers)."""
+    
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+    
+    def add_file(self):
+        self.files += 1
+        if self.files > BATCH_UPLOAD_MAX_FILES:
+            raise UploadLimitError(f"Too many files (limit {BATCH_UPLOAD_MAX_FILES})")
+    
+    def copy(self, source, target: Path):
+        with open(target, 'wb') as out:
+            while True:
+                chunk = source.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    return
+                self.bytes += len(chunk)
+                if self.bytes > BATCH_UPLOAD_MAX_BYTES:
+                    raise UploadLimitError(f"Upload too large (limit {BATCH_UPLOAD_MAX_BYTES // (1024 * 1024)} MB uncompressed)")
+                out.write(chunk)
 
 class UploadService:
     """Service for handling file uploads and triggering pipeline."""
@@ -58,7 +93,9 @@ class UploadService:
                     
                 return True, message, {
                     'filename': filename,
-                    'stats': stats
+                    'stats': stats,
+                    'categorization': result.get('categorization', {}),
+                    'timings': result.get('timings', {})
                 }
             else:
                 return False, f"Processing failed: {result.get('error')}", {}
@@ -66,6 +103,110 @@ class UploadService:
         except Exception as e:
             return False, f"Upload failed: {str(e)}", {}
     
+    def queue_file(self, file, upload_type: str, job_service) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Save a CSV file and queue it for background processing.
+        Returns the queued job (see JobService.get_job) as data. Raises
+        JobQueueFull when the job queue is at capacity.
+        """
+        if upload_type not in ['credit', 'debit']:
+            return False, "Invalid upload type. Must be 'credit' or 'debit'.", {}
+        if not file or file.filename == '':
+            return False, "No file selected.", {}
+        if not self.is_allowed_file(file.filename):
+            return False, "Only CSV files are allowed.", {}
+        
+        filename = secure_filename(file.filename)
+        # Unique name: the file waits on disk until a worker picks the job up
+        filepath = JOBS_UPLOADS_DIR / f"{uuid.uuid4().hex}_{filename}"
+        try:
+            file.save(str(filepath))
+            job = job_service.submit(filepath, upload_type, filename)
+        except Exception:
+            if filepath.exists():
+                filepath.unlink()
+            raise
+        return True, "File accepted for processing.", job
+    
+    @staticmethod
+    def _extension(filename: str) -> str:
+        return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    
+    def _stage_upload(self, file, work_dir: Path, budget: _Budget) -> List[Tuple[str, Path]]:
+        """Write one uploaded CSV, or the CSVs inside a .zip/.gz, into work_dir. Returns (name, path) pairs."""
+        filename = secure_filename(file.filename or '')
+        extension = self._extension(filename)
+        if extension not in ALLOWED_EXTENSIONS | ARCHIVE_EXTENSIONS:
+            raise ValueError(f"{file.filename}: only CSV files or .zip/.gz archives of CSVs are allowed")
+        
+        staged = []
+        def target(name: str) -> Path:
+            budget.add_file()
+            return work_dir / f"{budget.files:04d}_{secure_filename(name) or 'statement.csv'}"
+        
+        if extension == 'gz':
+            inner = filename[:-3]
+            if self._extension(inner) not in ALLOWED_EXTENSIONS:
+                raise ValueError(f"{file.filename}: only gzipped CSV files are allowed")
+            path = target(inner)
+            budget.copy(gzip.GzipFile(fileobj=file.stream), path)
+            staged.append((inner, path))
+        elif extension == 'zip':
+            archive_path = work_dir / f"upload_{budget.files}_{filename}"
+            file.save(str(archive_path))
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    member = info.filename
+                    if info.is_dir() or member.startswith('__MACOSX/') or \
+                            self._extension(member) not in ALLOWED_EXTENSIONS:
+                        continue
+                    name = f"{filename}/{Path(member).name}"
+                    path = target(Path(member).name)
+                    with archive.open(info) as source:
+                        budget.copy(source, path)
+                    staged.append((name, path))
+            archive_path.unlink()
+        else:
+            path = target(filename)
+            budget.copy(file.stream, path)
+            staged.append((filename, path))
+        return staged
+    
+    def queue_batch(self, files: List[Any], upload_type: str, job_service) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Stage several CSVs and/or .zip/.gz archives of CSVs and queue them as
+        one background batch job (parallel extraction, cross-file
+        de-duplication, one categorization pass and one load).
+        Returns the queued job (see JobService.get_job) as data. Raises
+        JobQueueFull when the job queue is at capacity.
+        """
+        if upload_type not in ['credit', 'debit']:
+            return False, "Invalid upload type. Must be 'credit' or 'debit'.", {}
+        files = [f for f in files if f and f.filename]
+        if not files:
+            return False, "No files selected.", {}
+        
+        # The job owns the directory once submitted and removes it when done
+        work_dir = Path(tempfile.mkdtemp(prefix='batch_', dir=JOBS_UPLOADS_DIR))
+        try:
+            budget = _Budget()
+            staged = []
+            for file in files:
+                staged.extend(self._stage_upload(file, work_dir, budget))
+            if not staged:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                return False, "No CSV files found in the upload.", {}
+            
+            filename = staged[0][0] if len(staged) == 1 else f"{len(staged)} files"
+            job = job_service.submit(work_dir, upload_type, filename, files=staged)
+        except (ValueError, zipfile.BadZipFile, gzip.BadGzipFile, EOFError) as e:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return False, f"Upload rejected: {str(e)}", {}
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        return True, "Files accepted for processing.", job
+    
     def list_uploaded_files(self, upload_type: str) -> Dict[str, Any]:
         """List uploaded files (Deprecated/Empty since we don't store them)."""
         return {'files': []}
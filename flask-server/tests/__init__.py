@@ -0,0 +1,3 @@
+"""
+Unit tests for the FinSight Flask server (run from flask-server/ with `python -m pytest`).
+"""
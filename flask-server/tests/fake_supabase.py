@@ -0,0 +1,176 @@
+"""
+An in-memory stand-in for the supabase-py query builder, covering the
+calls the services make (filters, keyset or_, order, limit, insert/upsert/update).
+"""
+import operator
+import re
+from types import SimpleNamespace
+
+OPS = {'eq': operator.eq, 'lt': operator.lt, 'gt': operator.gt, 'lte': operator.le, 'gte': operator.ge}
+
+
+def _split(expression):
+    """Split a PostgREST or/and list on top-level commas."""
+    parts, depth, current = [], 0, ''
+    for char in expression:
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        depth += (char == '(') - (char == ')')
+        current += char
+    return parts + [current] if current else parts
+
+
+def _condition(term):
+    if term.startswith('and(') or term.startswith('or('):
+        combine = all if term.startswith('and(') else any
+        inner = [_condition(t) for t in _split(term[term.index('(') + 1:-1])]
+        return lambda row: combine(c(row) for c in inner)
+    column, op, value = term.split('.', 2)
+    return lambda row: row.get(column) is not None and OPS[op](str(row[column]), value)
+
+
+class Query:
+    def __init__(self, table):
+        self.table = table
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.offset = 0
+        self.columns = None
+        self.action = 'select'
+        self.payload = None
+
+    def select(self, columns='*'):
+        self.columns = None if columns == '*' else [c.strip() for c in columns.split(',')]
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append(lambda row: row.get(column) is not None and op(row[column], value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, operator.eq, value)
+
+    def lt(self, column, value):
+        return self._filter(column, operator.lt, value)
+
+    def lte(self, column, value):
+        return self._filter(column, operator.le, value)
+
+    def gt(self, column, value):
+        return self._filter(column, operator.gt, value)
+
+    def gte(self, column, value):
+        return self._filter(column, operator.ge, value)
+
+    def in_(self, column, values):
+        return self._filter(column, lambda a, b: a in b, list(values))
+
+    def filter(self, column, op, value):
+        if op != 'imatch':
+            raise NotImplementedError(op)
+        return self._filter(column, lambda a, b: re.search(b, str(a), re.IGNORECASE) is not None, value)
+
+    def or_(self, expression):
+        self.filters.append(_condition(f"or({expression})"))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.offset, self.row_limit = start, end - start + 1
+        return self
+
+    def update(self, values):
+        self.action, self.payload = 'update', values
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict, ignore_duplicates=False):
+        if not ignore_duplicates:
+            raise NotImplementedError('upsert without ignore_duplicates')
+        self.action, self.payload, self.conflict = 'upsert', rows, on_conflict.split(',')
+        return self
+
+    def execute(self):
+        self.table.client.calls.append((self.table.name, self.action))
+        rows = self.table.rows
+        if self.action in ('insert', 'upsert'):
+            added = [dict(r) for r in (self.payload if isinstance(self.payload, list) else [self.payload])]
+            if self.action == 'upsert':
+                # Insert-or-ignore on the conflict columns; only new rows are returned
+                seen = {tuple(r.get(c) for c in self.conflict) for r in rows}
+                fresh = []
+                for row in added:
+                    key = tuple(row.get(c) for c in self.conflict)
+                    if key not in seen:
+                        seen.add(key)
+                        fresh.append(row)
+                added = fresh
+            rows.extend(added)
+            return SimpleNamespace(data=[dict(r) for r in added])
+        matched = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.action == 'update':
+            for row in matched:
+                row.update(self.payload)
+            return SimpleNamespace(data=[dict(r) for r in matched])
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda r: r[column], reverse=desc)
+        matched = matched[self.offset:]
+        for cap in (self.row_limit, self.table.client.max_rows):
+            if cap is not None:
+                matched = matched[:cap]
+        if self.columns:
+            matched = [{c: r.get(c) for c in self.columns} for r in matched]
+        return SimpleNamespace(data=[dict(r) for r in matched])
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.rows = client.tables.setdefault(name, [])
+
+    def __getattr__(self, name):
+        return getattr(Query(self), name)
+
+
+class FakeClient:
+    """
+    client.tables maps table name -> list of row dicts; client.calls logs
+    (table, action). max_rows mimics PostgREST's cap on rows per response.
+    client.functions maps RPC names to callables taking the params dict;
+    other RPCs fail as not deployed.
+    """
+
+    def __init__(self, max_rows=None, **tables):
+        self.max_rows = max_rows
+        self.functions = {}
+        self.tables = {name: list(rows) for name, rows in tables.items()}
+        self.calls = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, name, params):
+        client = self
+
+        class Call:
+            def execute(self):
+                client.calls.append((name, 'rpc'))
+                if name not in client.functions:
+                    raise Exception(f"PGRST202: Could not find the function public.{name}")
+                return SimpleNamespace(data=client.functions[name](params))
+
+        return Call()
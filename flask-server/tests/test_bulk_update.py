@@ -0,0 +1,91 @@
+"""
+Tests for TransactionService.bulk_update_transactions request grouping.
+"""
+import pytest
+
+from services.transaction_service import TransactionService
+from tests.fake_supabase import FakeClient
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def record(self, rows):
+        self.calls.append(rows)
+
+    def apply(self, added=(), removed=()):
+        self.calls.append((list(added), list(removed)))
+
+
+def bulk_update_rpc(client):
+    def run(params):
+        rows = client.tables['transactions']
+        updated = []
+        for item in params['p_updates']:
+            for row in rows:
+                if row['id'] == item['id']:
+                    row.update({k: v for k, v in item.items() if k != 'id'})
+                    updated.append(dict(row))
+        return updated
+    return run
+
+
+@pytest.fixture
+def service(monkeypatch):
+    client = FakeClient(transactions=[
+        {'id': str(n), 'transaction_date': '2025-01-10', 'description': f"Shop {n}",
+         'category': 'Uncategorized', 'amount': float(n)}
+        for n in range(1, 7)
+    ])
+    monkeypatch.setattr(TransactionService, '_bulk_rpc_available', True)
+    monkeypatch.setattr('services.transaction_service.RollupService._available', True)
+    svc = TransactionService()
+    svc.get_client = lambda: client
+    svc.history_service = Recorder()
+    svc.rollup_service = Recorder()
+    svc.client = client
+    return svc
+
+
+def test_shared_payloads_use_one_in_update_and_singles_one_rpc(service):
+    service.client.functions['bulk_update_transactions'] = bulk_update_rpc(service.client)
+    result = service.bulk_update_transactions([
+        {'id': '1', 'updates': {'Category': 'Food'}},
+        {'id': '2', 'updates': {'category': 'Food'}},
+        {'id': '3', 'updates': {'Category': 'Food'}},
+        {'id': '4', 'updates': {'Description': 'Renamed'}},
+        {'id': '5', 'updates': {'Category': 'Travel'}},
+        {'id': '5', 'updates': {'Amount': 9.5}},
+        {'id': '999', 'updates': {'Category': 'Food'}},
+        {'id': '6', 'updates': {'unknown': 'ignored'}},
+    ])
+    assert result['requests'] == 2
+    assert sorted(result['updated']) == ['1', '2', '3', '4', '5']
+    assert result['not_found'] == ['999']
+    assert result['failed'] == {}
+    writes = [call for call in service.client.calls if call[1] != 'select']
+    assert writes == [('transactions', 'update'), ('bulk_update_transactions', 'rpc')]
+    row5 = next(r for r in service.client.tables['transactions'] if r['id'] == '5')
+    assert (row5['category'], row5['amount']) == ('Travel', 9.5)
+
+
+def test_without_the_rpc_singles_are_updated_individually(service):
+    result = service.bulk_update_transactions([
+        {'id': '1', 'updates': {'Category': 'Food'}},
+        {'id': '2', 'updates': {'Category': 'Travel'}},
+    ])
+    assert sorted(result['updated']) == ['1', '2']
+    assert TransactionService._bulk_rpc_available is False
+    assert service.client.calls.count(('transactions', 'update')) == 2
+
+
+def test_rollups_move_only_rows_whose_category_or_amount_changed(service):
+    service.client.functions['bulk_update_transactions'] = bulk_update_rpc(service.client)
+    service.bulk_update_transactions([
+        {'id': '1', 'updates': {'Category': 'Food'}},
+        {'id': '2', 'updates': {'Description': 'Renamed'}},
+    ])
+    added, removed = service.rollup_service.calls[-1]
+    assert [r['id'] for r in added] == ['1'] and added[0]['category'] == 'Food'
+    assert [r['id'] for r in removed] == ['1'] and removed[0]['category'] == 'Uncategorized'
@@ -0,0 +1,117 @@
+"""
+Tests for the persistent categorization cache.
+"""
+import time
+
+from etl.categorization_cache import CategorizationCache, amount_bucket, normalize_description
+
+
+def test_normalize_description_collapses_case_and_whitespace():
+    assert normalize_description('  Tim   Hortons\t#123 ') == 'TIM HORTONS #123'
+
+
+def test_amount_bucket():
+    assert amount_bucket(12.35, exact=True) == '1235'
+    assert amount_bucket(0, exact=False) == '0'
+    assert amount_bucket(45.0, exact=False) == '+1'
+    assert amount_bucket(-450.0, exact=False) == '-2'
+
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = CategorizationCache(tmp_path / 'cache.json', max_entries=2)
+    cache.put('a', 'Food')
+    cache.put('b', 'Travel')
+    assert cache.get('a')['category'] == 'Food'  # 'a' is now most recently used
+    cache.put('c', 'Shopping')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = CategorizationCache(tmp_path / 'cache.json', ttl_days=1)
+    cache.put('a', 'Food')
+    cache._entries['a']['ts'] = time.time() - 2 * 24 * 3600
+    assert cache.get('a') is None
+
+
+def test_invalidate_scope(tmp_path):
+    cache = CategorizationCache(tmp_path / 'cache.json')
+    cache.put('a', 'Food', scope='user-1')
+    cache.put('b', 'Food', scope='user-2')
+    cache.invalidate(scope='user-1')
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+
+def test_save_and_reload(tmp_path):
+    path = tmp_path / 'cache.json'
+    cache = CategorizationCache(path)
+    cache.put('a', 'Food', renamed='Tim Hortons')
+    cache.save()
+    reloaded = CategorizationCache(path)
+    assert reloaded.get('a')['renamed'] == 'Tim Hortons'
+    assert list(tmp_path.glob('*.tmp')) == []
+
+
+def test_concurrent_writers_keep_each_others_entries(tmp_path):
+    path = tmp_path / 'cache.json'
+    first = CategorizationCache(path)
+    second = CategorizationCache(path)
+    first.put('a', 'Food')
+    second.put('b', 'Travel')
+    first.save()
+    second.save()
+    merged = CategorizationCache(path)
+    assert merged.get('a')['category'] == 'Food'
+    assert merged.get('b')['category'] == 'Travel'
+
+
+def test_newer_entry_wins_on_merge(tmp_path):
+    path = tmp_path / 'cache.json'
+    first = CategorizationCache(path)
+    second = CategorizationCache(path)
+    first.put('a', 'Food')
+    second.put('a', 'Travel')
+    second.save()
+    first._entries['a']['ts'] -= 10  # first's answer is older
+    first._dirty = True
+    first.save()
+    assert CategorizationCache(path).get('a')['category'] == 'Travel'
+
+
+def test_invalidation_is_not_undone_by_merge(tmp_path):
+    path = tmp_path / 'cache.json'
+    writer = CategorizationCache(path)
+    writer.put('a', 'Food', scope='user-1')
+    writer.put('b', 'Food', scope='user-2')
+    writer.save()
+
+    other = CategorizationCache(path)
+    other.invalidate(scope='user-1')
+    other.save()
+    reloaded = CategorizationCache(path)
+    assert reloaded.get('a') is None
+    assert reloaded.get('b') is not None
+
+
+def test_save_picks_up_other_writers_entries(tmp_path):
+    path = tmp_path / 'cache.json'
+    first = CategorizationCache(path)
+    second = CategorizationCache(path)
+    second.put('b', 'Travel')
+    second.save()
+    first.put('a', 'Food')
+    first.save()
+    assert set(first._entries) == {'a', 'b'}
+
+
+def test_lookups_see_entries_saved_by_another_process(tmp_path):
+    path = tmp_path / 'cache.json'
+    reader = CategorizationCache(path)
+    writer = CategorizationCache(path)
+    writer.put('a', 'Food', scope='user-1')
+    writer.put('b', 'Food', scope='user-2')
+    reader.invalidate(scope='user-1')  # not saved yet, but still applies to older entries
+    writer.save()
+    assert reader.get('b')['category'] == 'Food'
+    assert reader.get('a') is None
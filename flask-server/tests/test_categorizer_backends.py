@@ -0,0 +1,42 @@
+"""
+Tests for the offline categorizer backends.
+"""
+import pytest
+
+from etl.categorizer_backends import FakeBackend, RecordReplayBackend
+from etl.prompt_codec import encode_batch, parse_response
+
+CATEGORIES = ['Food & Drink', 'Shopping', 'Travel']
+
+
+def prompt_for(descriptions):
+    rows = [{'_temp_id': i * 10, 'Transaction Date': '2025-01-05', 'Amount': 5, 'Description': d}
+            for i, d in enumerate(descriptions)]
+    text, id_map = encode_batch(rows)
+    return f"Categorize:\n{text}", id_map
+
+
+def test_fake_backend_answers_every_row_deterministically():
+    prompt, id_map = prompt_for(['TIM HORTONS', 'AMAZON', 'tim hortons'])
+    answers = parse_response(FakeBackend(CATEGORIES).generate(prompt).text, id_map)
+    assert [a[0] for a in answers] == [0, 10, 20]
+    assert all(a[1] in CATEGORIES for a in answers)
+    # Same description (any case) -> same category, on every call
+    assert answers[0][1] == answers[2][1]
+    assert answers == parse_response(FakeBackend(CATEGORIES).generate(prompt).text, id_map)
+
+
+def test_fake_backend_error_rate():
+    backend = FakeBackend(CATEGORIES, error_rate=1.0)
+    with pytest.raises(Exception) as info:
+        backend.generate(prompt_for(['X'])[0])
+    assert getattr(info.value, 'code', None) == 503
+
+
+def test_record_then_replay(tmp_path):
+    prompt, _ = prompt_for(['TIM HORTONS'])
+    recorded = RecordReplayBackend(tmp_path, FakeBackend(CATEGORIES), mode='record').generate(prompt)
+    replayed = RecordReplayBackend(tmp_path, mode='replay').generate(prompt)
+    assert replayed == recorded
+    with pytest.raises(LookupError):
+        RecordReplayBackend(tmp_path, mode='replay').generate(prompt + ' changed')
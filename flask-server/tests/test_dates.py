@@ -0,0 +1,38 @@
+"""
+Tests for date parsing and formatting.
+"""
+import pandas as pd
+
+from utils.dates import format_dates, parse_dates
+
+
+def as_iso(series):
+    return format_dates(series).tolist()
+
+
+def test_declared_format_falls_back_per_value_without_inference():
+    parsed = parse_dates(pd.Series(['03/04/2025', '13/04/2025', '2025-01-02']), '%m/%d/%Y')
+    assert as_iso(parsed) == ['2025-03-04', None, '2025-01-02']
+
+
+def test_declared_format_wins_over_common_formats():
+    parsed = parse_dates(pd.Series(['03/04/2025', '03/04/2025', '2025-05-06']), '%d/%m/%Y')
+    assert as_iso(parsed) == ['2025-04-03', '2025-04-03', '2025-05-06']
+
+
+def test_undeclared_formats_try_common_formats_then_infer():
+    parsed = parse_dates(pd.Series(['2025-01-02', '03/04/2025', 'March 5, 2025', 'soon', None, '']))
+    assert as_iso(parsed) == ['2025-01-02', '2025-03-04', '2025-03-05', None, None, None]
+
+
+def test_repeated_values_and_index_are_kept():
+    values = pd.Series(['2025-01-02', None, '2025-01-02'], index=[10, 11, 12], name='Transaction Date')
+    parsed = parse_dates(values)
+    assert parsed.dtype == 'datetime64[ns]'
+    assert list(parsed.index) == [10, 11, 12] and parsed.name == 'Transaction Date'
+    assert as_iso(parsed) == ['2025-01-02', None, '2025-01-02']
+
+
+def test_parsed_columns_pass_through():
+    dates = pd.Series(pd.to_datetime(['2025-01-02']))
+    assert parse_dates(dates) is dates
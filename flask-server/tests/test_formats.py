@@ -0,0 +1,60 @@
+"""
+Tests for bank format detection and parsing, on the bronze sample statements.
+"""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from etl.formats import detect_format, iter_statement, read_statement
+
+BRONZE = Path(__file__).resolve().parent.parent / 'data' / 'bronze'
+
+
+@pytest.mark.parametrize('upload_type, name, rows, first', [
+    ('credit', 'credit_td.csv', 57, ('2025-09-21', 'Juniper Cafe', 19.5)),
+    ('credit', 'credit_Sept-Aug20.csv', 47, ('2025-10-18', 'CHIPOTLE #2922', 14.07)),
+    # Chequing exports quote every field and use ISO dates
+    ('debit', 'debit_td.csv', 31, ('2025-06-30', 'INTEREST CREDIT', -0.32)),
+    ('debit', 'debit_Aug-Nov4.csv', 33, ('2025-08-08', 'SEND E-TFR ***FdY', 1020.0)),
+])
+def test_bronze_statements(upload_type, name, rows, first):
+    path = BRONZE / upload_type / name
+    bank_format, _ = detect_format(path, upload_type)
+    assert bank_format.name == 'td'
+
+    df = read_statement(path, upload_type)
+    assert list(df.columns) == ['Transaction Date', 'Description', 'Amount']
+    assert len(df) == rows
+    assert df['Transaction Date'].notna().all()
+    date, description, amount = first
+    assert df['Transaction Date'].iloc[0] == pd.Timestamp(date)
+    assert df['Description'].iloc[0] == description
+    assert df['Amount'].iloc[0] == pytest.approx(amount)
+
+    chunked = pd.concat(iter_statement(path, upload_type, chunk_rows=10), ignore_index=True)
+    pd.testing.assert_frame_equal(chunked, df)
+
+
+def test_header_formats(tmp_path):
+    chase = tmp_path / 'chase.csv'
+    chase.write_text('Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #\n'
+                     'DEBIT,01/15/2025,GROCER,-42.10,DEBIT_CARD,100.00,,\n')
+    assert detect_format(chase, 'debit')[0].name == 'chase_checking'
+    df = read_statement(chase, 'debit')
+    assert (df['Transaction Date'].iloc[0], df['Amount'].iloc[0]) == (pd.Timestamp('2025-01-15'), -42.10)
+    # Chase checking is debit-only, and generic has no 'Posting Date' role
+    with pytest.raises(ValueError, match='Unrecognized statement format'):
+        detect_format(chase, 'credit')
+
+    generic = tmp_path / 'generic.csv'
+    generic.write_text('Date,Memo,Value\n2025-02-01,Coffee,3.5\n')
+    assert detect_format(generic)[0].name == 'generic'
+    assert read_statement(generic)['Description'].tolist() == ['Coffee']
+
+
+def test_unrecognized_format(tmp_path):
+    path = tmp_path / 'notes.csv'
+    path.write_text('hello,world\n')
+    with pytest.raises(ValueError, match='first row: hello, world'):
+        detect_format(path)
@@ -0,0 +1,21 @@
+"""
+Tests for the metrics helpers.
+"""
+from utils.json_utils import dumps
+from utils.metrics import json_size
+
+
+def test_json_size_is_exact_for_small_payloads():
+    rows = [{'id': i, 'description': 'TIM HORTONS'} for i in range(10)]
+    assert json_size(rows) == len(dumps(rows))
+    assert json_size({'a': 1}) == len(dumps({'a': 1}))
+
+
+def test_json_size_estimates_long_lists_from_a_sample():
+    rows = [{'id': i, 'description': 'MERCHANT ' + 'X' * (i % 40)} for i in range(5000)]
+    actual = len(dumps(rows))
+    assert abs(json_size(rows) - actual) / actual < 0.05
+
+
+def test_json_size_of_unserializable_data_is_zero():
+    assert json_size({'a': object()}) == 0
@@ -0,0 +1,74 @@
+"""
+Tests for batch imports: cross-file de-duplication and batch jobs.
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+from flask import Flask, g
+
+from services.job_service import JobService
+from services.pipeline_service import PipelineService
+
+
+def frame(rows):
+    return pd.DataFrame({
+        'Transaction Date': pd.to_datetime([r[0] for r in rows]),
+        'Description': [r[1] for r in rows],
+        'Amount': [r[2] for r in rows],
+    })
+
+
+def test_cross_file_duplicates_keep_the_first_files_copy():
+    september = frame([('2025-09-29', 'Coffee', 4.5), ('2025-09-30', 'Rent', 1500.0),
+                       ('2025-09-30', 'Rent', 1500.0)])
+    overlap = frame([('2025-09-30', ' rent ', '1500.00'), ('2025-10-01', 'Coffee', 4.5)])
+    merged, dropped = PipelineService._drop_cross_file_duplicates([september, overlap])
+    assert dropped == 1
+    # Duplicates within one file are left for import_transactions to count
+    assert merged['Description'].tolist() == ['Coffee', 'Rent', 'Rent', 'Coffee']
+    assert list(merged.index) == [0, 1, 2, 3]
+
+
+def test_rows_without_a_date_are_never_cross_file_duplicates():
+    undated = frame([('2025-09-29', 'Coffee', 4.5)])
+    undated['Transaction Date'] = pd.NaT
+    merged, dropped = PipelineService._drop_cross_file_duplicates([undated, undated.copy()])
+    assert (len(merged), dropped) == (2, 0)
+
+
+class FakePipeline:
+    def __init__(self):
+        self.calls = []
+
+    def process_files(self, paths, upload_type, names=None, progress=None):
+        self.calls.append(([p.read_text() for p in paths], upload_type, names))
+        progress(stage='extract', rows_read=3)
+        return {
+            'success': True,
+            'stats': {'imported': 2, 'duplicates': 1, 'cross_file_duplicates': 1},
+            'files': [{'file': n, 'success': n != 'bad.csv', 'rows': 1} for n in names],
+        }
+
+
+def test_batch_job_processes_the_staged_files_and_removes_them(tmp_path):
+    pipeline = FakePipeline()
+    service = JobService(Flask(__name__), pipeline, db_path=tmp_path / 'jobs.sqlite3', workers=1)
+    work_dir = tmp_path / 'batch'
+    work_dir.mkdir()
+    staged = []
+    for name in ('a.csv', 'bad.csv'):
+        (work_dir / name).write_text(name)
+        staged.append((name, work_dir / name))
+
+    with Flask(__name__).test_request_context():
+        g.user = SimpleNamespace(id='user-1', expires_at=None)
+        g.token = 'token'
+        queued = service.submit(work_dir, 'debit', '2 files', files=staged)
+        service.executor.shutdown(wait=True)
+        job = service.get_job(queued['id'])
+
+    assert pipeline.calls == [(['a.csv', 'bad.csv'], 'debit', ['a.csv', 'bad.csv'])]
+    assert (job['status'], job['filename'], job['rows_read']) == ('succeeded', '2 files', 3)
+    assert job['result']['message'] == '1 of 2 files processed. Imported: 2, Duplicates: 1'
+    assert [f['file'] for f in job['result']['files']] == ['a.csv', 'bad.csv']
+    assert not work_dir.exists()
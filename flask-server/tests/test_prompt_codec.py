@@ -0,0 +1,53 @@
+"""
+Tests for the compact LLM prompt encoding and batching.
+"""
+from etl.prompt_codec import (
+    ROW_HEADER, decode_rows, encode_batch, pack_batches, parse_response, short_id
+)
+
+
+def row(temp_id, description, amount=12.5, date='2025-01-05'):
+    return {'_temp_id': temp_id, 'Transaction Date': date, 'Amount': amount, 'Description': description}
+
+
+def test_short_ids_are_unique_base36():
+    ids = [short_id(i) for i in range(1000)]
+    assert ids[:3] == ['0', '1', '2'] and short_id(36) == '10'
+    assert len(set(ids)) == 1000
+    assert max(len(i) for i in ids) == 2
+
+
+def test_encode_decode_round_trip():
+    rows = [row(7, 'TIM HORTONS #12'), row(9, 'Pipe | and\nnewline', amount=-3.1)]
+    text, id_map = encode_batch(rows)
+    assert text.splitlines()[0] == ROW_HEADER
+    assert id_map == {'0': 7, '1': 9}
+
+    decoded = decode_rows(f"Categorize these:\n{text}\nThanks")
+    assert [r['id'] for r in decoded] == ['0', '1']
+    assert decoded[0] == {'id': '0', 'date': '2025-01-05', 'amount': '12.5', 'description': 'TIM HORTONS #12'}
+    # Delimiters inside values can't break the line format
+    assert decoded[1]['description'].split() == ['Pipe', 'and', 'newline']
+    assert decoded[1]['amount'] == '-3.1'
+
+
+def test_parse_response_line_format():
+    id_map = {'0': 7, '1': 9}
+    text = "```\nid|category|renamed\n0|Food & Drink|Tim Hortons\n1|Shopping|\n5|Travel|\n```"
+    assert parse_response(text, id_map) == [(7, 'Food & Drink', 'Tim Hortons'), (9, 'Shopping', '')]
+
+
+def test_parse_response_json_fallback():
+    text = 'Sure! [{"id": "1", "Category": "Travel", "RenamedDescription": "Air Canada"}]'
+    assert parse_response(text, {'0': 7, '1': 9}) == [(9, 'Travel', 'Air Canada')]
+
+
+def test_pack_batches_respects_row_and_token_limits():
+    rows = [row(i, 'MERCHANT ' + 'X' * 20) for i in range(10)]
+    assert [len(b) for b in pack_batches(rows, token_budget=10000, max_rows=4)] == [4, 4, 2]
+
+    batches = pack_batches(rows, token_budget=40, max_rows=100)
+    assert sum(len(b) for b in batches) == 10
+    assert all(len(b) >= 1 for b in batches) and len(batches) > 1
+    # An oversized row still gets a batch of its own
+    assert len(pack_batches([row(0, 'Y' * 1000)], token_budget=10, max_rows=5)) == 1
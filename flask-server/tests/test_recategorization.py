@@ -0,0 +1,164 @@
+"""
+Tests for recategorizing stored transactions after a rule change.
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from flask import Flask, g
+
+from models.rule import Rule
+from services.recategorization_service import RecategorizationService
+from services.transaction_service import TransactionService
+from tests.fake_supabase import FakeClient
+
+
+def stored(tx_id, description, amount=10.0, category='Uncategorized', account_type='credit', user_edited=False):
+    return {'id': tx_id, 'transaction_date': '2025-03-01', 'description': description, 'amount': amount,
+            'category': category, 'account_type': account_type, 'user_edited': user_edited}
+
+
+def frame(*rows):
+    return pd.DataFrame(list(rows))
+
+
+def test_structured_rule_matches_pattern_amount_and_rename_target():
+    rule = Rule(content='', pattern='uber', max_amount=50, category='Transport', rename='Uber')
+    df = frame(stored('1', 'UBER *TRIP', 12), stored('2', 'UBER *TRIP', 80), stored('3', 'Uber', 99),
+               stored('4', 'Lyft', 12))
+    assert RecategorizationService._matches(rule, df).tolist() == [True, False, True, False]
+
+
+def test_typed_and_free_text_rules():
+    df = frame(stored('1', 'STARBUCKS 123'), stored('2', 'STAR-BUCKS', account_type='debit'),
+               stored('3', 'Grocer'))
+    rule = Rule(content='Starbucks', rule_type='credit')
+    assert RecategorizationService._matches(rule, df).tolist() == [True, False, False]
+    # A free-text rule naming no merchant can apply to any row
+    assert RecategorizationService._matches(Rule(content='under $1'), df).all()
+
+
+def test_free_text_rules_match_merchant_words_not_categories():
+    df = frame(stored('1', 'STARBUCKS #123'), stored('2', 'COFFEE CORNER'), stored('3', "JOE'S BAR 22"),
+               stored('4', 'BARNES & NOBLE'), stored('5', 'PAYPAL *SPOTIFY'))
+    categories = ['Coffee', 'Dining']
+    matches = lambda content: RecategorizationService._matches(Rule(content=content), df, categories).tolist()
+    assert matches('Starbucks is Coffee') == [True, False, False, False, False]
+    assert matches("Joe's Bar is Dining") == [False, False, True, False, False]
+    # Naming only a category leaves no merchant: the rule can apply anywhere
+    assert all(matches('Everything under $5 is Coffee'))
+
+
+class FakeTransformer:
+    """Categorizes anything mentioning UBER as Transport."""
+
+    categories = ['Transport', 'Groceries']
+
+    def __init__(self):
+        self.history_used = []
+
+    def categorize(self, df, transaction_type, scope, use_history):
+        self.history_used.append((list(df['Description']), use_history))
+        result = df.copy()
+        result['Category'] = ['Transport' if 'UBER' in d.upper() else 'Uncategorized' for d in df['Description']]
+        return result
+
+
+class BulkRecorder:
+    def __init__(self):
+        self.calls = []
+
+    def bulk_update_transactions(self, updates, user_edit=True):
+        self.calls.append((updates, user_edit))
+        return {'updated': [u['id'] for u in updates], 'failed': {}}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(TransactionService, '_user_edited_available', True)
+    client = FakeClient(transactions=[
+        stored('1', 'UBER *TRIP', 12),
+        stored('2', 'UBER EATS', 80),                                         # outside the amount range
+        stored('3', 'UBER *TRIP', 15, category='Work travel', user_edited=True),  # edited by hand
+        stored('4', 'Groceries', 12),
+    ])
+    svc = RecategorizationService()
+    svc.get_client = lambda: client
+    svc.transformer = FakeTransformer()
+    svc.transaction_service = BulkRecorder()
+    with Flask(__name__).test_request_context():
+        g.user = SimpleNamespace(id='user-1')
+        yield svc
+
+
+def test_rule_change_only_writes_matched_rows_that_were_not_edited_by_hand(service):
+    progress = []
+    rule = Rule(content='', pattern='uber', max_amount=50, category='Transport')
+    stats = service.on_rule_changed(None, rule, progress=lambda **kw: progress.append(kw))
+    assert service.transaction_service.calls == [([{'id': '1', 'updates': {'category': 'Transport'}}], False)]
+    assert (stats['affected'], stats['unmatched'], stats['updated']) == (1, 0, 1)
+    assert {'stage': 'recategorize', 'rows_read': 1} in progress
+
+
+def test_unmatched_rows_from_a_widened_query_are_dropped(service):
+    rule = Rule(content='', pattern='uber', category='Transport')
+    original = service._fetch_pages
+    calls = []
+
+    def fetch_pages(build):
+        calls.append(build)
+        if len(calls) == 1:
+            raise Exception('invalid regular expression')  # e.g. a construct Postgres can't compile
+        return original(build)
+
+    service._fetch_pages = fetch_pages
+    stats = service.on_rule_changed(rule, None)
+    # The retry fetches rows 1, 2 and 4 (3 is user_edited); row 4 doesn't match the rule
+    assert (stats['affected'], stats['unmatched']) == (2, 1)
+    assert [u['id'] for u in service.transaction_service.calls[0][0]] == ['1', '2']
+
+
+def test_hand_edits_are_flagged_but_recategorization_writes_are_not(monkeypatch):
+    monkeypatch.setattr(TransactionService, '_user_edited_available', True)
+    assert TransactionService._mark_user_edit({'category': 'Food'}) == {'category': 'Food', 'user_edited': True}
+    assert TransactionService._mark_user_edit({'amount': 5}) == {'amount': 5}
+    monkeypatch.setattr(TransactionService, '_user_edited_available', False)
+    assert TransactionService._mark_user_edit({'category': 'Food'}) == {'category': 'Food'}
+
+
+def test_missing_user_edited_column_falls_back(monkeypatch):
+    monkeypatch.setattr(TransactionService, '_user_edited_available', True)
+    sent = []
+
+    def send(values):
+        sent.append(values)
+        if 'user_edited' in values:
+            raise Exception("PGRST204: Could not find the 'user_edited' column of 'transactions'")
+        return [values]
+
+    assert TransactionService._send_update(send, {'category': 'Food', 'user_edited': True}) == [{'category': 'Food'}]
+    assert TransactionService._user_edited_available is False
+    assert len(sent) == 2
+
+
+def test_rule_changes_are_queued_as_jobs(service):
+    queued = []
+    job_service = SimpleNamespace(submit_task=lambda *args: queued.append(args) or {'id': 'job-1'})
+    rule = Rule(content='Uber rides', pattern='uber', max_amount=50, category='Transport')
+    assert service.queue_rule_change(None, rule, job_service) == {'id': 'job-1'}
+    assert service.transaction_service.calls == []  # nothing runs in the request
+
+    job_type, label, task = queued[0]
+    assert (job_type, label) == ('recategorize', 'Rule added: Uber rides')
+    succeeded, result, error = task(lambda **_: None)
+    assert succeeded and error is None
+    assert result['message'] == 'Recategorized 1 of 1 matching transactions'
+
+
+def test_only_rows_a_rule_names_skip_the_history_model(service):
+    service.on_rule_changed(None, Rule(content='Uber is Transport'))
+    assert service.transformer.history_used == [(['UBER *TRIP', 'UBER EATS'], False)]
+
+    service.transformer.history_used.clear()
+    service.on_rule_changed(None, Rule(content='Anything under $20 is Groceries'))
+    assert service.transformer.history_used == [(['UBER *TRIP', 'UBER EATS', 'Groceries'], True)]
@@ -0,0 +1,49 @@
+"""
+Tests for rollup deltas.
+"""
+from services.rollup_service import RollupService, compute_deltas
+
+
+def row(amount, category='Food', transaction_date='2025-01-15'):
+    return {'transaction_date': transaction_date, 'category': category, 'amount': amount}
+
+
+def by_group(deltas):
+    return {(d['month'], d['category'], d['sign']): d for d in deltas}
+
+
+def test_added_rows_group_by_month_category_and_sign():
+    deltas = by_group(compute_deltas(added=[row(10), row(5.5), row(-20), row(3, category='  ')]))
+    food = deltas[('2025-01-01', 'Food', 1)]
+    assert (food['count'], food['total'], food['min'], food['max']) == (2, 15.5, 5.5, 10)
+    assert food['removed_min'] is None
+    assert deltas[('2025-01-01', 'Food', -1)]['total'] == -20
+    assert ('2025-01-01', 'Uncategorized', 1) in deltas
+
+
+def test_recategorization_moves_a_row_between_groups():
+    deltas = by_group(compute_deltas(added=[row(10, 'Travel')], removed=[row(10, 'Food')]))
+    assert deltas[('2025-01-01', 'Travel', 1)]['count'] == 1
+    food = deltas[('2025-01-01', 'Food', 1)]
+    assert (food['count'], food['total'], food['removed_min'], food['removed_max']) == (-1, -10, 10, 10)
+
+
+def test_amount_edit_within_a_group_reports_the_removed_extreme():
+    # Net count is zero, but the old amount may have been the group's max
+    (delta,) = compute_deltas(added=[row(12)], removed=[row(99)])
+    assert delta['count'] == 0
+    assert delta['total'] == -87
+    assert (delta['min'], delta['max']) == (12, 12)
+    assert (delta['removed_min'], delta['removed_max']) == (99, 99)
+
+
+def test_rows_without_a_date_are_skipped():
+    assert compute_deltas(added=[row(10, transaction_date='not a date')]) == []
+    assert compute_deltas() == []
+
+
+def test_covers_only_month_aligned_windows():
+    assert RollupService.covers(None, None)
+    assert RollupService.covers('2025-01-01', '2025-03-31')
+    assert not RollupService.covers('2025-01-02', None)
+    assert not RollupService.covers(None, '2025-02-27')
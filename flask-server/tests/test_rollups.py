@@ -0,0 +1,52 @@
+"""
+Tests for rollup grouping and the /stats summary.
+"""
+import pandas as pd
+
+from utils.rollups import rollup_frame, summarize_rollup
+
+
+def test_rollup_frame_groups_by_month_and_category():
+    df = pd.DataFrame({
+        'transaction_date': ['2025-01-03', '2025-01-20', '2025-02-01', '2025-01-05'],
+        'category': ['Food', 'Food', 'Food', None],
+        'amount': [10.0, -4.0, 7.5, 'bad'],
+    })
+    groups = {(g['month'], g['category']): g for g in rollup_frame(df)}
+    jan = groups[('2025-01', 'Food')]
+    assert (jan['txn_count'], jan['credit_count'], jan['debit_count']) == (2, 1, 1)
+    assert (jan['total'], jan['credits'], jan['debits']) == (6.0, 10.0, -4.0)
+    assert groups[('2025-02', 'Food')]['total'] == 7.5
+    # Missing category -> Uncategorized, unparseable amount -> 0
+    assert groups[('2025-01', 'Uncategorized')]['total'] == 0.0
+
+
+def test_rollup_frame_empty():
+    assert rollup_frame(pd.DataFrame(columns=['transaction_date', 'category', 'amount'])) == []
+
+
+def test_summarize_rollup_totals_and_breakdowns():
+    groups = [
+        {'month': '2025-01', 'category': 'Food', 'txn_count': 2, 'credit_count': 1, 'debit_count': 1,
+         'total': 6.0, 'credits': 10.0, 'debits': -4.0},
+        {'month': '2025-02', 'category': 'Food', 'txn_count': 1, 'credit_count': 1, 'debit_count': 0,
+         'total': 7.5, 'credits': 7.5, 'debits': 0.0},
+        {'month': '2025-01', 'category': 'Travel', 'txn_count': 1, 'credit_count': 1, 'debit_count': 0,
+         'total': 0.1 + 0.2, 'credits': 0.3, 'debits': 0.0},
+    ]
+    stats = summarize_rollup(groups)
+    assert stats['total_transactions'] == 4
+    assert stats['total_amount'] == 13.8
+    assert (stats['credit_count'], stats['debit_count']) == (3, 1)
+    assert stats['categories'] == ['Food', 'Travel']
+    assert stats['by_category'] == [
+        {'category': 'Travel', 'count': 1, 'total': 0.3},
+        {'category': 'Food', 'count': 3, 'total': 13.5},
+    ]
+    assert [m['month'] for m in stats['by_month']] == ['2025-01', '2025-02']
+    assert stats['by_month'][0] == {'month': '2025-01', 'count': 3, 'total': 6.3, 'credits': 10.3, 'debits': -4.0}
+
+
+def test_summarize_empty():
+    stats = summarize_rollup([])
+    assert stats['total_transactions'] == 0 and stats['by_month'] == []
@@ -0,0 +1,79 @@
+"""
+Tests for the structured rule engine.
+"""
+import pandas as pd
+
+from etl.rule_engine import RuleEngine
+from models.rule import Rule
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['Transaction Date', 'Description', 'Amount'])
+
+
+ROWS = frame([
+    ('2025-01-05', 'UBER TRIP 123', 12.5),
+    ('2025-01-20', 'UBER EATS 456', 40.0),
+    ('2025-02-03', 'Amazon.ca*AB12', 250.0),
+    ('2025-02-10', 'PAYROLL', -2000.0),
+])
+
+
+def mask(rule, rows=ROWS):
+    engine = RuleEngine([rule])
+    dates = pd.to_datetime(rows['Transaction Date'])
+    return engine.build_mask(rule, rows['Description'], rows['Amount'], dates).tolist()
+
+
+def test_pattern_is_case_insensitive_regex():
+    assert mask(Rule('', pattern='uber (trip|eats)', category='Transport')) == [True, True, False, False]
+
+
+def test_invalid_regex_matches_literally():
+    rows = frame([('2025-01-01', 'STORE (MAIN', 1.0), ('2025-01-01', 'STORE MAIN', 1.0)])
+    assert mask(Rule('', pattern='(MAIN', category='Shopping'), rows) == [True, False]
+
+
+def test_amount_bounds_are_inclusive():
+    assert mask(Rule('', min_amount=12.5, max_amount=40, category='Misc')) == [True, True, False, False]
+
+
+def test_date_window_is_inclusive():
+    rule = Rule('', start_date='2025-01-20', end_date='2025-02-03', category='Misc')
+    assert mask(rule) == [False, True, True, False]
+
+
+def test_unstructured_rules_are_ignored():
+    assert not RuleEngine([Rule('Anything from Uber is transport')])
+
+
+def test_first_categorizing_rule_wins():
+    rules = [
+        Rule('', pattern='UBER EATS', category='Food & Drink'),
+        Rule('', pattern='UBER', category='Transport'),
+    ]
+    _, categories = RuleEngine(rules).apply(ROWS.copy())
+    assert categories.iloc[0] == 'Transport'
+    assert categories.iloc[1] == 'Food & Drink'
+    assert pd.isna(categories.iloc[2])
+
+
+def test_rename_only_rule_does_not_block_later_category():
+    rules = [
+        Rule('', pattern='AMAZON', rename='Amazon'),
+        Rule('', pattern='AMAZON', category='Shopping'),
+    ]
+    df, categories = RuleEngine(rules).apply(ROWS.copy())
+    assert df['Description'].iloc[2] == 'Amazon'
+    assert categories.iloc[2] == 'Shopping'
+
+
+def test_first_rename_wins_and_renames_do_not_rematch():
+    rules = [
+        Rule('', pattern='UBER', rename='Uber'),
+        Rule('', pattern='UBER EATS', rename='Uber Eats', category='Food & Drink'),
+    ]
+    df, categories = RuleEngine(rules).apply(ROWS.copy())
+    assert df['Description'].tolist()[:2] == ['Uber', 'Uber']
+    assert categories.iloc[1] == 'Food & Drink'
+    assert pd.isna(categories.iloc[0])
@@ -0,0 +1,65 @@
+"""
+Tests for the per-token Supabase client pool.
+"""
+from services.supabase_service import AuthClientPool
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_pool(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr('services.supabase_service.time.time', clock)
+    closed = []
+    pool = AuthClientPool(lambda token: {'token': token}, closer=closed.append, **kwargs)
+    return pool, clock, closed
+
+
+def test_clients_are_reused_per_token(monkeypatch):
+    pool, _, _ = make_pool(monkeypatch)
+    assert pool.get('a') is pool.get('a')
+    assert pool.get('a') is not pool.get('b')
+
+
+def test_expired_token_gets_a_new_client(monkeypatch):
+    pool, clock, _ = make_pool(monkeypatch)
+    first = pool.get('a', expires_at=clock.now + 10)
+    clock.now += 11
+    assert pool.get('a', expires_at=clock.now + 10) is not first
+
+
+def test_evicted_clients_are_closed_after_the_grace_period(monkeypatch):
+    pool, clock, closed = make_pool(monkeypatch, max_size=1, close_grace=60)
+    first = pool.get('a')
+    pool.get('b')  # evicts 'a'
+    assert len(pool) == 1 and closed == []
+
+    clock.now += 30
+    pool.get('b')
+    assert closed == []  # may still be in use
+
+    clock.now += 31
+    pool.get('b')
+    assert closed == [first]
+    pool.get('b')
+    assert closed == [first]  # closed once
+
+
+def test_close_client_closes_each_component_session_once():
+    from types import SimpleNamespace
+    from services.supabase_service import _close_client
+
+    closed = []
+
+    def session(name):
+        return SimpleNamespace(close=lambda: closed.append(name))
+
+    auth = SimpleNamespace(_http_client=session('auth'))
+    client = SimpleNamespace(_postgrest=SimpleNamespace(session=session('postgrest')), _auth=auth, auth=auth)
+    _close_client(client)
+    assert sorted(closed) == ['auth', 'postgrest']
@@ -0,0 +1,68 @@
+"""
+Tests for transaction delta sync (merging rows and tombstones by seq).
+"""
+import pytest
+
+from services.sync_service import SyncService, decode_watermark
+from tests.fake_supabase import FakeClient
+
+
+def txn(tx_id, change_seq, created_seq):
+    return {'id': tx_id, 'transaction_date': '2025-01-10', 'description': f"Shop {tx_id}",
+            'category': 'Food', 'amount': 1.0, 'change_seq': change_seq, 'created_seq': created_seq}
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    monkeypatch.setattr(SyncService, '_available', True)
+    client = FakeClient(
+        user_data_versions=[{'transactions': 7, 'categories': 0, 'rules': 0}],
+        transactions=[txn('a', 1, 1), txn('b', 5, 2), txn('c', 6, 6), txn('late', 8, 8)],
+        transaction_tombstones=[{'change_seq': 3, 'transaction_id': 'gone'},
+                                {'change_seq': 7, 'transaction_id': 'c-old'}],
+    )
+    service = SyncService()
+    service.get_client = lambda: client
+    return service
+
+
+def ids(transactions):
+    return [t['Transaction ID'] for t in transactions]
+
+
+def test_first_sync_returns_rows_up_to_the_current_version(sync):
+    changes = sync.get_changes(0, limit=100)
+    assert ids(changes['inserted']) == ['a', 'b', 'c']
+    assert changes['updated'] == [] and changes['deleted'] == []
+    assert (changes['watermark'], changes['has_more']) == ('7', False)
+
+
+def test_incremental_sync_splits_inserts_updates_and_deletes(sync):
+    changes = sync.get_changes(2, limit=100)
+    assert ids(changes['updated']) == ['b']
+    assert ids(changes['inserted']) == ['c']
+    assert changes['deleted'] == ['gone', 'c-old']
+    assert changes['watermark'] == '7'
+
+
+def test_limit_cuts_the_merged_stream_in_seq_order(sync):
+    changes = sync.get_changes(2, limit=2)
+    assert changes['deleted'] == ['gone'] and ids(changes['updated']) == ['b']
+    assert (changes['watermark'], changes['has_more']) == ('5', True)
+    rest = sync.get_changes(5, limit=2)
+    assert ids(rest['inserted']) == ['c'] and rest['deleted'] == ['c-old']
+    assert (rest['watermark'], rest['has_more']) == ('7', False)
+
+
+def test_unavailable_sync_raises(sync, monkeypatch):
+    monkeypatch.setattr(SyncService, '_available', False)
+    with pytest.raises(RuntimeError):
+        sync.get_changes(0, limit=10)
+
+
+def test_decode_watermark():
+    assert decode_watermark(None) == decode_watermark('') == 0
+    assert decode_watermark('42') == 42
+    for bad in ('-1', 'abc'):
+        with pytest.raises(ValueError):
+            decode_watermark(bad)
@@ -0,0 +1,124 @@
+"""
+Tests for import-side dedupe in TransactionService.
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from flask import Flask, g
+
+from etl.categorization_cache import CategorizationCache
+from etl.categorizer_backends import FakeBackend
+from etl.transformers import TransactionTransformer
+from models.rule import Rule
+from models.transaction import transaction_signature
+from services.recategorization_service import RecategorizationService
+from services.supabase_service import SupabaseService
+from services.transaction_service import TransactionService
+from tests.fake_supabase import FakeClient
+
+
+def stored(n):
+    return {'id': f"{n:04d}", 'transaction_date': f"2025-01-{n % 28 + 1:02d}",
+            'description': f"Shop {n}", 'amount': float(n)}
+
+
+def new_row(transaction_date, description, amount):
+    return {'transaction_date': transaction_date, 'description': description, 'amount': amount,
+            'signature': transaction_signature(transaction_date, description, amount)}
+
+
+def test_drop_existing_pages_through_the_whole_range(monkeypatch):
+    monkeypatch.setattr('services.transaction_service.TRANSACTIONS_PAGE_SIZE', 7)
+    client = FakeClient(max_rows=7, transactions=[stored(n) for n in range(50)])
+    last = stored(49)
+    rows = [
+        new_row(last['transaction_date'], 'shop 49', 49),  # stored, but past the first page
+        new_row('2025-01-02', 'Shop 1', 1),
+        new_row('2025-01-02', 'Something new', 1),
+    ]
+    results = {'duplicates': 0}
+    kept = TransactionService()._drop_existing(client, rows, results)
+    assert [r['description'] for r in kept] == ['Something new']
+    assert results['duplicates'] == 2
+    assert client.calls.count(('transactions', 'select')) > 1
+
+
+class Rules:
+    def __init__(self, *rules):
+        self.rules = list(rules)
+
+    def get_rules(self):
+        return self.rules
+
+
+@pytest.fixture(params=[True, False], ids=['upsert', 'prefetch'])
+def importer(request, monkeypatch, tmp_path):
+    monkeypatch.setattr(TransactionService, '_signature_upsert_available', request.param)
+    monkeypatch.setattr(TransactionService, '_bulk_rpc_available', False)
+    monkeypatch.setattr(TransactionService, '_user_edited_available', True)
+    client = FakeClient(transactions=[])
+    monkeypatch.setattr(SupabaseService, 'get_auth_client', staticmethod(lambda token: client))
+    service = TransactionService()
+    service.history_service = SimpleNamespace(record=lambda rows: None)
+    service.rollup_service = SimpleNamespace(apply=lambda *args, **kwargs: None)
+    rules = Rules()
+    transformer = TransactionTransformer(
+        tmp_path / 'categories.json', rule_service=rules,
+        cache=CategorizationCache(tmp_path / 'cache.json'), backend=FakeBackend(['Shopping', 'Food'])
+    )
+
+    def run(df):
+        stats = service.import_transactions(transformer.transform(df, 'credit', scope='user-1'), 'credit')
+        # Column defaults the database would fill in
+        for n, row in enumerate(client.tables['transactions']):
+            row.setdefault('id', f"{n:04d}")
+            row.setdefault('user_edited', False)
+        return stats
+
+    recategorizer = RecategorizationService()
+    recategorizer.get_client = lambda: client
+    recategorizer.transformer = transformer
+    recategorizer.transaction_service = service
+
+    with Flask(__name__).test_request_context():
+        g.token, g.user = 'token', SimpleNamespace(id='user-1')
+        yield SimpleNamespace(run=run, rules=rules, client=client, recategorizer=recategorizer)
+
+
+def statement():
+    return pd.DataFrame({
+        'Transaction Date': ['2025-03-01', '2025-03-01', '2025-03-02'],
+        'Description': ['AMZN MKTP US*1A2B', 'AMAZON.COM*9Z8Y', 'Corner Cafe'],
+        'Amount': [25.0, 25.0, 4.5],
+    })
+
+
+def test_reupload_after_rename_rule_inserts_nothing(importer):
+    assert importer.run(statement())['imported'] == 3
+    importer.rules.rules.append(Rule(content='', pattern='amzn|amazon', rename='Amazon', category='Shopping'))
+    stats = importer.run(statement())
+    assert stats['imported'] == 0
+    assert stats['duplicates'] == 3
+    assert len(importer.client.tables['transactions']) == 3
+
+
+def test_merchants_renamed_to_the_same_label_are_both_kept(importer):
+    importer.rules.rules.append(Rule(content='', pattern='amzn|amazon', rename='Amazon', category='Shopping'))
+    assert importer.run(statement())['imported'] == 3
+    stored_rows = importer.client.tables['transactions']
+    assert [r['description'] for r in stored_rows].count('Amazon') == 2
+    assert len(stored_rows) == 3
+
+
+def test_reupload_after_recategorization_renamed_stored_rows_inserts_nothing(importer):
+    assert importer.run(statement())['imported'] == 3
+    rule = Rule(content='', pattern='amzn|amazon', rename='Amazon', category='Shopping')
+    importer.rules.rules.append(rule)
+    assert importer.recategorizer.on_rule_changed(None, rule)['updated'] == 2
+    stored_rows = importer.client.tables['transactions']
+    assert [r['description'] for r in stored_rows].count('Amazon') == 2
+
+    stats = importer.run(statement())
+    assert (stats['imported'], stats['duplicates']) == (0, 3)
+    assert len(stored_rows) == 3
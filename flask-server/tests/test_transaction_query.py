@@ -0,0 +1,58 @@
+"""
+Tests for GET /transactions query parsing and cursors.
+"""
+import pytest
+
+from models.transaction_query import TransactionQuery, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('2025-03-04', 'a1b2-c3')
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2025-03-04', 'a1b2-c3')
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', encode_cursor('yesterday', 'x'), 'WzFd'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
+
+
+def test_from_args_parses_filters():
+    query = TransactionQuery.from_args({
+        'start_date': '2025-01-01',
+        'end_date': '2025-01-31',
+        'min_amount': '-50',
+        'max_amount': '',
+        'category': 'Food, Travel,,',
+        'cursor': encode_cursor('2025-01-15', 'abc'),
+    }, max_limit=500)
+    assert (query.start_date, query.end_date) == ('2025-01-01', '2025-01-31')
+    assert (query.min_amount, query.max_amount) == (-50.0, None)
+    assert query.categories == ['Food', 'Travel']
+    assert query.cursor == ('2025-01-15', 'abc')
+    assert query.limit is None
+
+
+def test_fields_accept_aliases_and_always_select_cursor_columns():
+    query = TransactionQuery.from_args({'fields': 'amount, Category,category,description'}, max_limit=500)
+    assert query.fields == ['Amount', 'Category', 'Description']
+    assert query.columns == 'amount, category, description, transaction_date, id'
+    assert TransactionQuery().columns == 'transaction_date, description, category, amount, id'
+
+
+def test_limit_is_capped():
+    assert TransactionQuery.from_args({'limit': '10'}, max_limit=500).limit == 10
+    assert TransactionQuery.from_args({'limit': '10000'}, max_limit=500).limit == 500
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'start_date': '01/02/2025'}, 'start_date must be an ISO date'),
+    ({'min_amount': 'ten'}, 'min_amount must be a number'),
+    ({'fields': 'amount,merchant'}, 'Unknown field: merchant'),
+    ({'limit': 'ten'}, 'limit must be an integer'),
+    ({'limit': '0'}, 'limit must be positive'),
+])
+def test_from_args_errors(args, message):
+    with pytest.raises(ValueError, match=message):
+        TransactionQuery.from_args(args, max_limit=500)
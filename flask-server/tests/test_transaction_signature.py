@@ -0,0 +1,30 @@
+"""
+Tests for transaction_signature. The expected values are what the
+transaction_signature SQL function (migrations/005) returns for the same
+input: whitespace runs collapsed to one space and trimmed, upper-cased, and
+the amount rounded half away from zero to whole cents.
+"""
+import pytest
+
+from models.transaction import transaction_signature
+
+
+@pytest.mark.parametrize('description, amount, expected', [
+    ('Coffee Shop', 4.5, '2025-03-04|COFFEE SHOP|450'),
+    ('  coffee   shop ', '4.50', '2025-03-04|COFFEE SHOP|450'),
+    ('\tcoffee\nshop\t', 4.5, '2025-03-04|COFFEE SHOP|450'),
+    ('Refund', -12.34, '2025-03-04|REFUND|-1234'),
+    ('Half cent', 0.005, '2025-03-04|HALF CENT|1'),
+    ('Half cent', -0.005, '2025-03-04|HALF CENT|-1'),
+    ('Float noise', 0.1 + 0.2, '2025-03-04|FLOAT NOISE|30'),
+    (None, None, '2025-03-04||0'),
+])
+def test_signature_matches_sql(description, amount, expected):
+    assert transaction_signature('2025-03-04', description, amount) == expected
+
+
+def test_signature_distinguishes_dates_and_amounts():
+    base = transaction_signature('2025-03-04', 'Coffee', 4.5)
+    assert transaction_signature('2025-03-05', 'Coffee', 4.5) != base
+    assert transaction_signature('2025-03-04', 'Coffee', 4.51) != base
+    assert transaction_signature('2025-03-04', 'Coffee', -4.5) != base
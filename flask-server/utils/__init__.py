@@ -1,6 +1,12 @@
 """
 Utility functions for the FinSight application.
 """
-from .json_utils import clean_for_json, transactions_to_json
+from .json_utils import clean_for_json, transactions_to_json, frame_to_records, dumps, json_response
+from .concurrency import BatchDispatcher, BatchResult, is_transient_error, prefetch
+from .metrics import REGISTRY, Counter, Histogram, track, track_stage, track_supabase
 
-__all__ = ['clean_for_json', 'transactions_to_json']
+__all__ = [
+    'clean_for_json', 'transactions_to_json', 'frame_to_records', 'dumps', 'json_response',
+    'BatchDispatcher', 'BatchResult', 'is_transient_error', 'prefetch',
+    'REGISTRY', 'Counter', 'Histogram', 'track', 'track_stage', 'track_supabase'
+]
@@ -0,0 +1,155 @@
+"""
+Bounded-concurrency dispatch with retries for network-bound batch work.
+"""
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+RETRYABLE_ERROR_NAMES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+    'DeadlineExceeded', 'GatewayTimeout', 'BadGateway', 'ConnectTimeout', 'ReadTimeout',
+    'ConnectError', 'RemoteProtocolError',
+}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Best-effort check for errors that are worth retrying (429/5xx/timeouts)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    response = getattr(error, 'response', None)
+    for status in (getattr(error, 'code', None), getattr(error, 'status_code', None),
+                   getattr(response, 'status_code', None)):
+        try:
+            if status is not None and int(status) in RETRYABLE_STATUS_CODES:
+                return True
+        except (TypeError, ValueError):
+            continue
+    return False
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one dispatched item."""
+    index: int
+    value: Any = None
+    error: Optional[Exception] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BatchDispatcher:
+    """
+    Runs a function over many items on a bounded thread pool.
+    Transient failures are retried with jittered exponential backoff and
+    results are returned in the same order as the input.
+    """
+
+    def __init__(self, max_workers: int = 4, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 is_retryable: Callable[[Exception], bool] = is_transient_error):
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.is_retryable = is_retryable
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter backoff so concurrent workers don't retry in lockstep."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call_with_retry(self, fn: Callable[[Any], Any], item: Any, index: int = 0) -> BatchResult:
+        """Call fn(item), retrying transient errors. Never raises."""
+        attempt = 0
+        while True:
+            try:
+                return BatchResult(index=index, value=fn(item), attempts=attempt + 1)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    return BatchResult(index=index, error=e, attempts=attempt + 1)
+                delay = self._backoff(attempt)
+                print(f"Transient error ({e}); retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1} of {self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+
+    def run(self, fn: Callable[[Any], Any], items: Sequence[Any],
+            on_result: Optional[Callable[[BatchResult], None]] = None) -> List[BatchResult]:
+        """
+        Apply fn to every item with bounded parallelism; results keep input order.
+        on_result: called on the calling thread with each result as it completes.
+        """
+        if not items:
+            return []
+        if self.max_workers == 1 or len(items) == 1:
+            results = []
+            for i, item in enumerate(items):
+                results.append(self.call_with_retry(fn, item, i))
+                if on_result is not None:
+                    on_result(results[-1])
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            futures = [executor.submit(self.call_with_retry, fn, item, i) for i, item in enumerate(items)]
+            if on_result is not None:
+                for future in as_completed(futures):
+                    on_result(future.result())
+            return [f.result() for f in futures]
+
+
+_DONE = object()
+
+
+def prefetch(items: Iterable[Any], depth: int = 2) -> Iterator[Any]:
+    """
+    Iterate `items` on a background thread, at most `depth` items ahead of the
+    consumer, so producing the next item overlaps with processing this one
+    while memory stays bounded. Producer exceptions are re-raised here;
+    closing the generator early stops the producer.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    producer = threading.Thread(target=produce, name='prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join(timeout=1)
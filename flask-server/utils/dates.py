@@ -0,0 +1,64 @@
+"""
+Date parsing and formatting for the ETL path.
+
+Statements repeat the same few hundred dates across thousands of rows, so
+both directions work on the unique values only and map the result back
+with the factorized codes: cost grows with distinct dates, not rows.
+Transaction dates travel between stages as datetime64[ns]; strings are only
+produced at the edges (prompts, cache keys, the database).
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+# Tried in order when a source declares no format; inference is the last resort
+COMMON_DATE_FORMATS = (ISO_DATE_FORMAT, '%m/%d/%Y')
+
+
+def _parse_unique(values: pd.Index, formats: Sequence[str], infer: bool) -> pd.DatetimeIndex:
+    """
+    Parse with each format in turn, each one only filling the values the
+    previous ones left unparsed; inference (if allowed) takes what remains.
+    """
+    text = pd.Series(values.astype(str).str.strip())
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in formats:
+        missing = parsed.isna() & (text != '')
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+    missing = parsed.isna() & (text != '')
+    if infer and missing.any():
+        parsed[missing] = pd.to_datetime(text[missing], errors='coerce')
+    return pd.DatetimeIndex(parsed)
+
+
+def parse_dates(values: pd.Series, date_format: Optional[str] = None) -> pd.Series:
+    """
+    Parse a column of dates to datetime64[ns] (unparseable values become NaT).
+    date_format: the source's declared strptime format. Values it doesn't fit
+    are tried against COMMON_DATE_FORMATS one value at a time; only sources
+    without a declared format fall back to inference.
+    Already-parsed columns are returned as is.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    formats = tuple(dict.fromkeys(((date_format,) if date_format else ()) + COMMON_DATE_FORMATS))
+    parsed = _parse_unique(pd.Index(uniques), formats, infer=date_format is None).as_unit('ns')
+    result = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def format_dates(values: pd.Series, date_format: str = ISO_DATE_FORMAT) -> pd.Series:
+    """Format a date column as strings (None for missing), parsing it first if needed."""
+    dates = parse_dates(values)
+    codes, uniques = pd.factorize(dates, use_na_sentinel=True)
+    formatted = np.append(pd.DatetimeIndex(uniques).strftime(date_format).to_numpy(dtype=object), None)
+    # code -1 (NaT) picks the trailing None
+    return pd.Series(formatted[codes], index=values.index, name=values.name)
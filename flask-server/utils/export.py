@@ -0,0 +1,96 @@
+"""
+Streaming encoders for transaction exports.
+
+Each encoder takes an iterable of pages (lists of API-shaped transaction
+dicts) and yields bytes chunks, so a response can be streamed while only one
+page is held in memory.
+"""
+import csv
+import io
+from typing import Any, Dict, Iterable, Iterator, List
+
+from utils.json_utils import dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; parquet exports are unavailable without it
+    pa = None
+    pq = None
+
+Pages = Iterable[List[Dict[str, Any]]]
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def format_available(fmt: str) -> bool:
+    return fmt in EXPORT_FORMATS and (fmt != 'parquet' or pq is not None)
+
+
+def ndjson_chunks(pages: Pages) -> Iterator[bytes]:
+    """One JSON object per line; one chunk per page."""
+    for page in pages:
+        yield b''.join(dumps(row) + b'\n' for row in page)
+
+
+def csv_chunks(pages: Pages, fields: List[str]) -> Iterator[bytes]:
+    """CSV with a header row of API field names; one chunk per page."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator instead of keeping them."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_chunks(pages: Pages, fields: List[str]) -> Iterator[bytes]:
+    """Parquet file with one row group per page (requires pyarrow)."""
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    types = {'Amount': pa.float64()}
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for page in pages:
+            columns = {name: [row.get(name) for row in page] for name in fields}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
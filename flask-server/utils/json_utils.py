@@ -1,8 +1,32 @@
 """
 JSON utility functions.
+
+dumps() encodes straight to bytes with orjson when it's installed (NaN/NaT
+become null, numpy and datetime values are handled natively) and falls back
+to the stdlib encoder otherwise. json_response() builds the Flask response,
+compressed with brotli or gzip when the client accepts it.
 """
+import datetime
+import decimal
+import gzip
+import json
+import math
 import pandas as pd
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from flask import Response, request
+
+from config import JSON_COMPRESS_MIN_BYTES
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip only without it
+    brotli = None
 
 
 def clean_for_json(data: Any) -> Any:
@@ -19,6 +43,10 @@ def clean_for_json(data: Any) -> Any:
         return {key: clean_for_json(value) for key, value in data.items()}
     elif isinstance(data, list):
         return [clean_for_json(item) for item in data]
+    elif isinstance(data, float):
+        return None if math.isnan(data) else data
+    elif isinstance(data, (str, int, bool)) or data is None:
+        return data
     elif pd.isna(data):
         return None
     else:
@@ -30,11 +58,14 @@ def transactions_to_json(transactions: List[Any]) -> List[Dict[str, Any]]:
     Convert list of transactions to JSON-serializable format.
     
     Args:
-        transactions: List of Transaction objects or dictionaries
+        transactions: List of Transaction objects or dictionaries, or a DataFrame
         
     Returns:
         List of dictionaries ready for JSON serialization
     """
+    if isinstance(transactions, pd.DataFrame):
+        return frame_to_records(transactions)
+    
     result = []
     
     for transaction in transactions:
@@ -50,3 +81,74 @@ def transactions_to_json(transactions: List[Any]) -> List[Dict[str, Any]]:
         result.append(clean_dict)
     
     return result
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """DataFrame rows as dicts with NaN/NaT replaced by None in one vectorized pass."""
+    if df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _default(value: Any) -> Any:
+    """Encoder fallback for values neither encoder handles natively."""
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, 'tolist'):
+        # numpy scalar or array
+        value = value.tolist()
+        return None if isinstance(value, float) and math.isnan(value) else value
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Encode data as compact UTF-8 JSON. NaN becomes null (invalid JSON otherwise)."""
+    if orjson is not None:
+        # Datetimes go through _default so NaT (a datetime subclass) becomes null
+        return orjson.dumps(data, default=_default, option=(
+            orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        ))
+    try:
+        text = json.dumps(data, default=_default, separators=(',', ':'), allow_nan=False)
+    except ValueError:
+        # Only pay for the recursive clean when there is actually a NaN somewhere
+        text = json.dumps(clean_for_json(data), default=_default, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def _accepted_encoding() -> Optional[str]:
+    """Best compression the current request accepts ('br', 'gzip' or None)."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    """
+    JSON response encoded with dumps(), compressed per Accept-Encoding once
+    the body reaches JSON_COMPRESS_MIN_BYTES.
+    """
+    body = dumps(data)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) < JSON_COMPRESS_MIN_BYTES:
+        return response
+    
+    encoding = _accepted_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=4))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=5))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,281 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters and histograms are registered once at import time and updated from
+any thread. `track()` times a block of work, records it in a histogram and
+optional row/byte counters, and can also add the elapsed seconds to a
+per-request `timings` dict so callers get a breakdown for a single upload.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans quick Supabase calls up to slow multi-batch LLM runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    """Shared label handling for counters and histograms."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(sum(state[:-1])) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together for a /metrics scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    'finsight_pipeline_stage_seconds', 'Time spent in each upload pipeline stage.', ['stage'])
+PIPELINE_STAGE_ROWS = REGISTRY.counter(
+    'finsight_pipeline_stage_rows_total', 'Rows processed by each upload pipeline stage.', ['stage'])
+PIPELINE_STAGE_BYTES = REGISTRY.counter(
+    'finsight_pipeline_stage_bytes_total', 'Bytes read or sent by each upload pipeline stage.', ['stage'])
+
+LLM_BATCH_SECONDS = REGISTRY.histogram(
+    'finsight_llm_batch_seconds', 'Duration of each categorizer backend call (one per attempt).',
+    ['backend', 'outcome'])
+LLM_BATCH_ROWS = REGISTRY.counter(
+    'finsight_llm_batch_rows_total', 'Rows sent to the categorizer backend.', ['backend'])
+LLM_BATCH_BYTES = REGISTRY.counter(
+    'finsight_llm_batch_bytes_total', 'Prompt and response bytes exchanged with the categorizer backend.',
+    ['backend', 'direction'])
+
+SUPABASE_REQUEST_SECONDS = REGISTRY.histogram(
+    'finsight_supabase_request_seconds', 'Duration of Supabase requests.', ['table', 'operation', 'outcome'])
+SUPABASE_REQUEST_ROWS = REGISTRY.counter(
+    'finsight_supabase_request_rows_total', 'Rows sent to or returned by Supabase.', ['table', 'operation'])
+SUPABASE_REQUEST_BYTES = REGISTRY.counter(
+    'finsight_supabase_request_bytes_total', 'Approximate JSON bytes sent to or returned by Supabase.',
+    ['table', 'operation'])
+
+AUTH_VERIFICATIONS_TOTAL = REGISTRY.counter(
+    'finsight_auth_verifications_total', 'Bearer token checks by method (cache, local, remote) and outcome.',
+    ['method', 'outcome'])
+
+SUPABASE_CLIENT_POOL_TOTAL = REGISTRY.counter(
+    'finsight_supabase_client_pool_total', 'Authenticated client lookups by result (hit, miss, expired).',
+    ['result'])
+
+UPLOADS_TOTAL = REGISTRY.counter(
+    'finsight_uploads_total', 'Processed uploads by type and outcome.', ['type', 'outcome'])
+
+
+# Lists longer than this are sized from a sample of their items
+JSON_SIZE_SAMPLE = 32
+
+
+def json_size(data: Any, sample: int = JSON_SIZE_SAMPLE) -> int:
+    """
+    Approximate wire size of a JSON payload, for byte counters.
+    Long lists are extrapolated from `sample` evenly spaced items instead of
+    being encoded in full, so metrics don't double the serialization cost.
+    """
+    from utils.json_utils import dumps  # Lazy: json_utils pulls in Flask and config
+    try:
+        if isinstance(data, list) and len(data) > sample:
+            step = len(data) / sample
+            picked = [data[int(i * step)] for i in range(sample)]
+            # Items plus their separators, scaled up to the whole list
+            return int((len(dumps(picked)) - 2) * len(data) / sample) + 2
+        return len(dumps(data))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Span:
+    """Mutable result of a tracked block: callers fill in rows/bytes as they learn them."""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.outcome = 'ok'
+        self.seconds = 0.0
+
+
+def add_timing(timings: Optional[Dict[str, float]], key: str, seconds: float):
+    """Accumulate seconds under key in a per-request timings dict (no-op when None)."""
+    if timings is not None:
+        timings[key] = round(timings.get(key, 0.0) + seconds, 4)
+
+
+@contextmanager
+def track(seconds_metric: Histogram, labels: Dict[str, Any], rows_metric: Optional[Counter] = None,
+          bytes_metric: Optional[Counter] = None, count_labels: Optional[Dict[str, Any]] = None,
+          timings: Optional[Dict[str, float]] = None, timing_key: Optional[str] = None) -> Iterator[Span]:
+    """
+    Time the enclosed block. If seconds_metric has an 'outcome' label it is set
+    to 'error' when the block raises (the exception is re-raised).
+    rows_metric/bytes_metric use count_labels (default: labels).
+    """
+    span = Span()
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.outcome = 'error'
+        raise
+    finally:
+        span.seconds = time.perf_counter() - started
+        observed = dict(labels)
+        if 'outcome' in seconds_metric.label_names:
+            observed['outcome'] = span.outcome
+        seconds_metric.observe(span.seconds, **observed)
+        count_labels = labels if count_labels is None else count_labels
+        if rows_metric is not None and span.rows:
+            rows_metric.inc(span.rows, **count_labels)
+        if bytes_metric is not None and span.bytes:
+            bytes_metric.inc(span.bytes, **count_labels)
+        if timing_key:
+            add_timing(timings, timing_key, span.seconds)
+
+
+def track_stage(stage: str, timings: Optional[Dict[str, float]] = None):
+    """Track one pipeline stage (e.g. 'extract', 'transform.llm', 'load.insert')."""
+    return track(PIPELINE_STAGE_SECONDS, {'stage': stage}, PIPELINE_STAGE_ROWS, PIPELINE_STAGE_BYTES,
+                 timings=timings, timing_key=stage)
+
+
+def track_supabase(table: str, operation: str, timings: Optional[Dict[str, float]] = None,
+                   timing_key: Optional[str] = None):
+    """Track one Supabase request; set span.rows/span.bytes from the payload or response."""
+    return track(SUPABASE_REQUEST_SECONDS, {'table': table, 'operation': operation},
+                 SUPABASE_REQUEST_ROWS, SUPABASE_REQUEST_BYTES, timings=timings, timing_key=timing_key)
@@ -0,0 +1,85 @@
+"""
+Transaction rollups: per (month, category) groups and the stats derived from them.
+
+The database computes the groups with the transaction_rollup RPC; rollup_frame
+produces the same groups with pandas when only raw rows are available.
+"""
+from typing import Any, Dict, List
+
+import pandas as pd
+
+GROUP_FIELDS = ('month', 'category', 'txn_count', 'credit_count', 'debit_count', 'total', 'credits', 'debits')
+
+
+def rollup_frame(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Group raw rows (columns transaction_date, category, amount) into
+    per (month, category) rollup rows.
+    """
+    if df.empty:
+        return []
+    amount = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+    category = df['category'].fillna('').astype(str).str.strip()
+    frame = pd.DataFrame({
+        'month': pd.to_datetime(df['transaction_date'], errors='coerce').dt.strftime('%Y-%m').fillna('unknown'),
+        'category': category.mask(category == '', 'Uncategorized'),
+        'txn_count': 1,
+        'credit_count': (amount > 0).astype(int),
+        'debit_count': (amount < 0).astype(int),
+        'total': amount,
+        'credits': amount.where(amount > 0, 0.0),
+        'debits': amount.where(amount < 0, 0.0),
+    })
+    grouped = frame.groupby(['month', 'category'], sort=False).sum().reset_index()
+    return grouped.to_dict('records')
+
+
+def summarize_rollup(groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the /stats payload from rollup groups: overall totals plus
+    by_category and by_month breakdowns (O(groups) work).
+    """
+    by_category: Dict[str, Dict[str, Any]] = {}
+    by_month: Dict[str, Dict[str, Any]] = {}
+    totals = {'count': 0, 'credit_count': 0, 'debit_count': 0, 'total': 0.0}
+
+    for group in groups:
+        count = int(group.get('txn_count') or 0)
+        credit_count = int(group.get('credit_count') or 0)
+        debit_count = int(group.get('debit_count') or 0)
+        total = float(group.get('total') or 0)
+        credits = float(group.get('credits') or 0)
+        debits = float(group.get('debits') or 0)
+
+        totals['count'] += count
+        totals['credit_count'] += credit_count
+        totals['debit_count'] += debit_count
+        totals['total'] += total
+
+        category = by_category.setdefault(group['category'], {'category': group['category'], 'count': 0, 'total': 0.0})
+        category['count'] += count
+        category['total'] += total
+
+        month_key = group.get('month') or 'unknown'
+        month = by_month.setdefault(month_key, {
+            'month': month_key, 'count': 0, 'total': 0.0, 'credits': 0.0, 'debits': 0.0
+        })
+        month['count'] += count
+        month['total'] += total
+        month['credits'] += credits
+        month['debits'] += debits
+
+    for entry in list(by_category.values()) + list(by_month.values()):
+        for key in ('total', 'credits', 'debits'):
+            if key in entry:
+                entry[key] = round(entry[key], 2)
+
+    return {
+        'total_transactions': totals['count'],
+        'total_amount': round(totals['total'], 2),
+        'credit_count': totals['credit_count'],
+        'debit_count': totals['debit_count'],
+        'categories': sorted(by_category),
+        'by_category': sorted(by_category.values(), key=lambda c: c['total']),
+        'by_month': sorted(by_month.values(), key=lambda m: m['month']),
+    }